@@ -1,20 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify
 from flask_cors import CORS
 import os
 import json
 import logging
 import random
-import google.generativeai as genai
+import threading
 from datetime import datetime
 
-from practice import chat_with_ai, logger, clear_history,llm
+import metrics
+from quiz_pool import QuizPool
+from singleflight import SingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from calculators import calculate_batch
+from practice import chat_with_ai, clear_chat_history, get_session_id, sse_response, init_resources, configure_logging
 from dotenv import load_dotenv
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS to allow your React frontend to communicate with this API
+# Routes are registered on a blueprint; create_app() at the bottom builds the app
+api = Blueprint("api", __name__)
 
-@app.route('/chat', methods=['POST'])
+@api.before_app_request
+def start_logging():
+    # Starts the logging thread on the first request instead of at import
+    configure_logging()
+
+@api.route('/chat', methods=['POST'])
 def chat_api():
     try:
         data = request.get_json()
@@ -26,27 +36,64 @@ def chat_api():
         logger.info(f"Received chat request: {user_input[:50]}...")
         
         # Use the chat_with_ai function from practice.py to generate a response
-        response_text = chat_with_ai(user_input)
+        response_text = chat_with_ai(user_input, get_session_id(data))
         return jsonify({"message": response_text})
     except Exception as e:
         logger.error(f"Error in chat API: {str(e)}")
         return jsonify({"error": "An error occurred processing your request"}), 500
 
-@app.route('/clear_history', methods=['POST'])
+@api.route('/chat/stream', methods=['POST'])
+def chat_stream_api():
+    data = request.get_json(silent=True) or {}
+    user_input = data.get("message")
+    if not user_input:
+        return jsonify({"error": "No message provided"}), 400
+
+    logger.info(f"Received streaming chat request: {user_input[:50]}...")
+    return sse_response(user_input, get_session_id(data))
+
+@api.route('/calculate', methods=['POST'])
+def calculate_api():
+    try:
+        return jsonify(calculate_batch(request.get_json(silent=True) or {}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in calculate API: {str(e)}")
+        return jsonify({"error": "An error occurred processing your request"}), 500
+
+@api.route('/metrics', methods=['GET'])
+def metrics_api():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/clear_history', methods=['POST'])
 def clear_history_api():
     try:
-        clear_history()
+        clear_chat_history(get_session_id(request.get_json(silent=True)))
         return jsonify({"message": "Chat history cleared successfully"}), 200
     except Exception as e:
         logger.error(f"Error clearing history: {str(e)}")
         return jsonify({"error": "Failed to clear history"}), 500
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Quiz logs go through the chatbot's queued pipeline (see log_pipeline.py), which
+# configure_logging() starts on preload or on the first request - not at import
+logger = logging.getLogger("finance_chatbot.quiz")
+
+def create_quiz_model():
+    """Create the model used for quiz generation ("fake" LLM_BACKEND: see fakes.py)"""
+    if os.getenv("LLM_BACKEND", "gemini") == "fake":
+        from fakes import FakeGenerativeModel
+        return FakeGenerativeModel(delay=float(os.getenv("FAKE_QUIZ_DELAY", 0.5)))
+    # The Gemini SDK takes about a second to import, so it is loaded on first use
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai.GenerativeModel('gemini-2.0-flash')
 
-# Initialize Gemini API
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Deadline and circuit breaker for quiz generation (see circuit_breaker.py); while
+# the circuit is open, /quiz serves the fallback bank straight away
+quiz_breaker = CircuitBreaker("quiz", int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5)),
+                              float(os.getenv("BREAKER_RESET_S", 30)),
+                              deadline=float(os.getenv("QUIZ_DEADLINE_S", 20)))
 
 # List of financial categories to randomize prompts
 FINANCE_CATEGORIES = [
@@ -81,18 +128,19 @@ def extract_json(text):
         logger.error(f"JSON extraction failed: {str(e)}")
         return None
 
-def generate_quiz_questions():
-    """Generate quiz questions using Google's Gemini API with randomization"""
-    try:
-        # Configure the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        # Create a randomized prompt
-        categories = random.sample(FINANCE_CATEGORIES, k=3)  # Pick 3 random categories
-        difficulty = random.choice(DIFFICULTY_LEVELS)
-        current_time = datetime.now().isoformat()
-        
-        prompt = f"""Generate 3 simple and clear multiple-choice quiz questions about {', '.join(categories)} at a {difficulty} level.
+QUIZ_GENERATION_CONFIG = dict(temperature=0.7, top_p=0.95, top_k=40)
+
+def quiz_stage(stage, path="quiz"):
+    """Time one step of the quiz path into the stage histogram"""
+    return metrics.stage_seconds.time(path=path, stage=stage)
+
+def build_quiz_prompt(categories=None, difficulty=None, count=3):
+    """Create a randomized quiz generation prompt"""
+    categories = categories or random.sample(FINANCE_CATEGORIES, k=3)  # Pick 3 random categories
+    difficulty = difficulty or random.choice(DIFFICULTY_LEVELS)
+    current_time = datetime.now().isoformat()
+
+    return f"""Generate {count} simple and clear multiple-choice quiz questions about {', '.join(categories)} at a {difficulty} level.
 Avoid technical jargon and keep the language easy to understand for beginners. Make each question straightforward and educational.
 
 Return the questions as a JSON array. Each question object must have:
@@ -114,21 +162,70 @@ Example format:
 Current timestamp for uniqueness: {current_time}
 Return ONLY the JSON array without any explanation or markdown:"""
 
+def generate_quiz_questions():
+    """Generate quiz questions using Google's Gemini API with randomization"""
+    try:
+        # Configure the model
+        model = create_quiz_model()
+
         # Generate content with temperature > 0 for more randomness
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40
+        with quiz_stage("llm"):
+            response = quiz_breaker.call(
+                model.generate_content,
+                build_quiz_prompt(),
+                generation_config=QUIZ_GENERATION_CONFIG
             )
-        )
         response_text = response.text
         logger.info(f"Gemini Raw Response: {response_text}")
         
-        return extract_json(response_text)
+        with quiz_stage("json_extraction"):
+            return extract_json(response_text)
+    except CircuitOpenError:
+        metrics.fallbacks.inc(path="quiz", reason="circuit_open")
+        return None
+    except Exception as e:
+        logger.error(f"Question generation error: {str(e)}")
+        metrics.errors.inc(path="quiz", stage="generation")
+        return None
+
+def generate_quiz_batch(category, difficulty, count):
+    """Generate a batch of questions for one pool bucket"""
+    try:
+        model = create_quiz_model()
+        with quiz_stage("llm", path="quiz_refill"):
+            response = quiz_breaker.call(
+                model.generate_content,
+                build_quiz_prompt([category], difficulty, count),
+                generation_config=QUIZ_GENERATION_CONFIG
+            )
+        with quiz_stage("json_extraction", path="quiz_refill"):
+            return extract_json(response.text)
+    except Exception as e:
+        logger.error(f"Quiz batch generation error: {str(e)}")
+        metrics.errors.inc(path="quiz_refill", stage="generation")
+        return None
+
+async def agenerate_quiz_questions():
+    """Async version of generate_quiz_questions for the asyncio serving mode"""
+    try:
+        model = create_quiz_model()
+        with quiz_stage("llm"):
+            response = await quiz_breaker.acall(
+                model.generate_content_async,
+                build_quiz_prompt(),
+                generation_config=QUIZ_GENERATION_CONFIG
+            )
+        response_text = response.text
+        logger.info(f"Gemini Raw Response: {response_text}")
+
+        with quiz_stage("json_extraction"):
+            return extract_json(response_text)
+    except CircuitOpenError:
+        metrics.fallbacks.inc(path="quiz", reason="circuit_open")
+        return None
     except Exception as e:
         logger.error(f"Question generation error: {str(e)}")
+        metrics.errors.inc(path="quiz", stage="generation")
         return None
 
 # Larger bank of fallback questions
@@ -189,42 +286,130 @@ FALLBACK_QUESTIONS = [
     }
 ]
 
-@app.route('/quiz', methods=['GET'])
+def fallback_quiz():
+    """Pick random fallback questions, renumbered from 1"""
+    questions = [dict(q) for q in random.sample(FALLBACK_QUESTIONS, k=min(3, len(FALLBACK_QUESTIONS)))]
+    
+    # Renumber the questions from 1 to match expected format
+    for i, q in enumerate(questions, 1):
+        q["id"] = i
+    
+    logger.warning("Using fallback questions due to generation failure")
+    metrics.fallbacks.inc(path="quiz", reason="generation_failed")
+    return questions
+
+def validate_questions(questions):
+    """Return an error message if the questions are malformed, else None"""
+    required_keys = {'id', 'question', 'options', 'correctAnswer'}
+    for idx, q in enumerate(questions):
+        if not all(key in q for key in required_keys):
+            logger.error(f"Question {idx} missing keys: {q}")
+            return "Invalid question format"
+        if not isinstance(q['options'], list) or len(q['options']) != 4:
+            logger.error(f"Invalid options in question {idx}: {q['options']}")
+            return "Options must be 4 elements"
+        if not 0 <= q['correctAnswer'] <= 3:
+            logger.error(f"Invalid correctAnswer in question {idx}: {q['correctAnswer']}")
+            return "correctAnswer must be 0-3"
+    return None
+
+# Pool of pre-generated questions, refilled in the background as buckets run low.
+# It is created on first use (or by create_app(preload=True)) so its refill
+# threads start in the serving process, never in a preforking master.
+quiz_pool = None
+quiz_pool_lock = threading.Lock()
+
+def get_quiz_pool():
+    """Return the quiz pool, creating it on first use (None if disabled)
+
+    Buckets fill as /quiz touches them, so starting a worker costs no Gemini calls.
+    """
+    global quiz_pool
+    if quiz_pool is not None or os.getenv("QUIZ_POOL_ENABLED", "1") != "1":
+        return quiz_pool
+    with quiz_pool_lock:
+        if quiz_pool is None:
+            pool = QuizPool(generate_quiz_batch, validate_questions, FINANCE_CATEGORIES, DIFFICULTY_LEVELS,
+                            path=os.getenv("QUIZ_POOL_PATH", "quiz_pool.json"),
+                            target_size=int(os.getenv("QUIZ_POOL_TARGET", 6)),
+                            low_watermark=int(os.getenv("QUIZ_POOL_LOW_WATERMARK", 2)),
+                            refills_per_minute=float(os.getenv("QUIZ_POOL_REFILLS_PER_MIN", 12)))
+            register_quiz_pool_metrics(pool)
+            quiz_pool = pool
+    return quiz_pool
+
+def register_quiz_pool_metrics(pool):
+    """Export the pool's counters and size on /metrics"""
+    def quiz_pool_events():
+        stats = pool.stats()
+        for event in pool.counters:
+            yield {"event": event}, stats[event]
+
+    metrics.registry.collector("finverse_quiz_pool_events_total", "Quiz pool lookups, refills and drops.",
+                               "counter", quiz_pool_events)
+    metrics.registry.collector("finverse_quiz_pool_questions", "Questions currently pooled.",
+                               "gauge", lambda: [({}, pool.stats()["pooled"])])
+
+# When the pool runs dry under a burst, concurrent /quiz requests share one live
+# generation instead of each sending its own prompt to Gemini
+quiz_flights = SingleFlight("quiz")
+
+@api.route('/quiz', methods=['GET'])
+@metrics.in_flight.track_inprogress(path="quiz")
+@metrics.request_seconds.time(path="quiz")
 def get_dynamic_quiz():
     try:
-        questions = generate_quiz_questions()
+        # Serve from the pool; only generate live when it can't supply a full quiz
+        pool = get_quiz_pool()
+        with quiz_stage("pool_take"):
+            questions = pool.take(3) if pool else None
+        if not questions:
+            questions, _ = quiz_flights.do("quiz", generate_quiz_questions)
         
         if not questions:
             # If questions couldn't be generated properly, use random fallback questions
-            questions = random.sample(FALLBACK_QUESTIONS, k=min(3, len(FALLBACK_QUESTIONS)))
-            
-            # Renumber the questions from 1 to match expected format
-            for i, q in enumerate(questions, 1):
-                q["id"] = i
-                
-            logger.warning("Using fallback questions due to generation failure")
+            questions = fallback_quiz()
 
         # Validate questions structure before returning
-        required_keys = {'id', 'question', 'options', 'correctAnswer'}
-        for idx, q in enumerate(questions):
-            if not all(key in q for key in required_keys):
-                logger.error(f"Question {idx} missing keys: {q}")
-                return jsonify({"error": "Invalid question format"}), 500
-            if not isinstance(q['options'], list) or len(q['options']) != 4:
-                logger.error(f"Invalid options in question {idx}: {q['options']}")
-                return jsonify({"error": "Options must be 4 elements"}), 500
-            if not 0 <= q['correctAnswer'] <= 3:
-                logger.error(f"Invalid correctAnswer in question {idx}: {q['correctAnswer']}")
-                return jsonify({"error": "correctAnswer must be 0-3"}), 500
+        with quiz_stage("validation"):
+            error = validate_questions(questions)
+        if error:
+            return jsonify({"error": error}), 500
 
         return jsonify({"questions": questions})
 
     except Exception as e:
         logger.error(f"Quiz Generation Error: {str(e)}")
+        metrics.errors.inc(path="quiz", stage="handler")
         return jsonify({"error": "Failed to generate quiz"}), 500
 
+@api.route('/quiz/stats', methods=['GET'])
+def quiz_pool_stats():
+    pool = get_quiz_pool()
+    if not pool:
+        return jsonify({"error": "Quiz pool is disabled"}), 404
+    return jsonify(pool.stats())
+
+def create_app(preload=False):
+    """Build the Flask app.
+
+    Nothing heavy happens here: the chat resources and the quiz pool are
+    created on first use, or up front with preload=True (or from the server
+    hooks in gunicorn.conf.py).
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS to allow your React frontend to communicate with this API
+    app.register_blueprint(api)
+    if preload:
+        init_resources()
+        get_quiz_pool()
+    return app
+
+app = create_app()
+
 
 
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_PORT", 5000))
+    app = create_app(preload=True)
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# ------------------------------------
+# Asyncio Serving Mode
+# ------------------------------------
+# Quart (the asyncio re-implementation of the Flask API) app serving /chat,
+# /quiz, /clear_history and /metrics on the async retriever and LLM paths. A slow
+# Gemini call only parks a coroutine instead of holding a worker thread, so
+# one process can keep hundreds of chats in flight. Concurrency is bounded by
+# a semaphore and every request has a deadline, which includes the wait for a
+# free slot: a chat that doesn't get one in time is answered with a 503.
+#
+# Run with:  hypercorn async_app:app --bind 0.0.0.0:5000
+import os
+import time
+import asyncio
+
+from quart import Quart, Response, request, jsonify
+
+import metrics
+from singleflight import AsyncSingleFlight
+from practice import achat_with_ai, clear_chat_history, get_session_id, init_resources, logger
+from app import agenerate_quiz_questions, fallback_quiz, validate_questions, get_quiz_pool, quiz_stage
+
+max_inflight = int(os.getenv("ASYNC_MAX_INFLIGHT", 256))
+chat_timeout = float(os.getenv("ASYNC_CHAT_TIMEOUT", 30))
+quiz_timeout = float(os.getenv("ASYNC_QUIZ_TIMEOUT", 20))
+
+app = Quart(__name__)
+inflight = asyncio.Semaphore(max_inflight)
+# Concurrent live generations (pool empty) share one Gemini call; a request that
+# hits its deadline stops waiting without cancelling it for the others
+quiz_flights = AsyncSingleFlight("quiz_async")
+
+
+@app.before_serving
+async def load_resources():
+    # Load before the first request, off the event loop
+    await asyncio.to_thread(init_resources)
+    await asyncio.to_thread(get_quiz_pool)
+
+
+@app.after_request
+async def add_cors_headers(response):
+    # Same permissive CORS policy as CORS(app) in the Flask apps
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Session-ID"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    return response
+
+
+@app.route('/chat', methods=['POST'])
+async def chat_api():
+    data = await request.get_json(silent=True) or {}
+    user_input = data.get("message")
+    if not user_input:
+        return jsonify({"error": "No message provided"}), 400
+
+    logger.info(f"Received chat request: {user_input[:50]}...")
+    deadline = time.monotonic() + chat_timeout
+    try:
+        # Waiting for a slot counts toward the request's deadline
+        await asyncio.wait_for(inflight.acquire(), chat_timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"No chat slot free within {chat_timeout}s ({max_inflight} in flight)")
+        metrics.errors.inc(path="chat", stage="overloaded")
+        return jsonify({"error": "The server is busy. Please try again."}), 503
+    try:
+        response_text = await asyncio.wait_for(achat_with_ai(user_input, get_session_id(data, request.headers)),
+                                               max(0.0, deadline - time.monotonic()))
+        return jsonify({"message": response_text})
+    except asyncio.TimeoutError:
+        logger.error(f"Chat request timed out after {chat_timeout}s")
+        metrics.errors.inc(path="chat", stage="timeout")
+        return jsonify({"error": "The request took too long. Please try again."}), 504
+    except Exception as e:
+        logger.error(f"Error in chat API: {str(e)}")
+        return jsonify({"error": "An error occurred processing your request"}), 500
+    finally:
+        inflight.release()
+
+
+@app.route('/quiz', methods=['GET'])
+async def get_dynamic_quiz():
+    with metrics.in_flight.track_inprogress(path="quiz"), metrics.request_seconds.time(path="quiz"):
+        return await dynamic_quiz()
+
+
+async def generate_quiz():
+    # The shared generation gives up on a slot when its askers would (they get the fallback quiz)
+    await asyncio.wait_for(inflight.acquire(), quiz_timeout)
+    try:
+        return await agenerate_quiz_questions()
+    finally:
+        inflight.release()
+
+
+async def dynamic_quiz():
+    try:
+        pool = get_quiz_pool()
+        with quiz_stage("pool_take"):
+            questions = pool.take(3) if pool else None
+        if not questions:
+            try:
+                questions, _ = await asyncio.wait_for(quiz_flights.do("quiz", generate_quiz), quiz_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Quiz generation timed out after {quiz_timeout}s")
+                metrics.errors.inc(path="quiz", stage="timeout")
+                questions = None
+
+        if not questions:
+            questions = fallback_quiz()
+
+        with quiz_stage("validation"):
+            error = validate_questions(questions)
+        if error:
+            return jsonify({"error": error}), 500
+
+        return jsonify({"questions": questions})
+    except Exception as e:
+        logger.error(f"Quiz Generation Error: {str(e)}")
+        metrics.errors.inc(path="quiz", stage="handler")
+        return jsonify({"error": "Failed to generate quiz"}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_api():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/clear_history', methods=['POST'])
+async def clear_history_api():
+    try:
+        data = await request.get_json(silent=True)
+        await asyncio.to_thread(clear_chat_history, get_session_id(data, request.headers))
+        return jsonify({"message": "Chat history cleared successfully"}), 200
+    except Exception as e:
+        logger.error(f"Error clearing history: {str(e)}")
+        return jsonify({"error": "Failed to clear history"}), 500
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("FLASK_PORT", 5000))
+    app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,235 @@
+# ------------------------------------
+# Batch Question Answering
+# ------------------------------------
+# Answers every question in a JSONL file through the chat pipeline's
+# retrieval and LLM steps, for pre-answering the FAQ list or checking answer
+# quality after re-indexing the books. Each question is answered on an empty
+# history: nothing is read from or written to the chat history, and the
+# response cache is only written with --warm-cache.
+#
+# Questions are read in batches; the vector queries of a batch are embedded
+# in one backend call, then retrieval and the LLM run on a bounded thread
+# pool. Answers are appended to the output JSONL as they finish, so an
+# interrupted run picks up where it stopped. Questions that failed go to a
+# sidecar file (<output>.errors.jsonl) instead, which each run replaces, so
+# they are retried on the next run without piling up in the output. Input
+# lines are {"id": ..., "question": ...}; "message" works too, and the line
+# number stands in for a missing id.
+#
+#   python batch_qa.py questions.jsonl answers.jsonl [--concurrency 8] [--batch-size 32]
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+import practice
+from query_embedding_cache import embed_query_batch
+
+logger = logging.getLogger("finance_chatbot")
+
+REPORT_EVERY = 50
+
+
+def errors_path(output_path):
+    return output_path + ".errors.jsonl"
+
+
+def load_done(output_path):
+    """IDs already answered in the output file.
+
+    A partial last line left by an interrupted run is cut off. Unreadable
+    lines, error records (written to the output by older versions) and
+    repeated IDs are compacted away, so the output holds one answer per
+    question.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb") as f:
+        data = f.read()
+    kept, dropped = [], 0
+    for line in data[:data.rfind(b"\n") + 1].splitlines(keepends=True):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict) or "error" in record or str(record.get("id")) in done:
+            dropped += line.strip() != b""
+            continue
+        done.add(str(record["id"]))
+        kept.append(line)
+    if dropped or not data.endswith(b"\n") and data:
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(kept)
+        os.replace(tmp_path, output_path)
+        if dropped:
+            logger.info(f"Dropped {dropped} failed or repeated record(s) from {output_path}")
+    return done
+
+
+def iter_questions(input_path, done):
+    """Yield (id, question) for every input line not answered yet."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping unreadable line {line_number} of {input_path}")
+                continue
+            question_id = str(record.get("id", line_number))
+            question = record.get("question") or record.get("message")
+            if question and question_id not in done:
+                yield question_id, question
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batch(questions):
+    """Query vectors for the questions that go through vector retrieval.
+
+    Returns (vectors, embedding backend calls made). Calculator and keyword
+    (lexical fast path) questions get None, as does every question if the
+    embedding call fails - they fall back to the lexical index like a chat
+    request would.
+    """
+    vectors = [None] * len(questions)
+    if practice.retrieval_mode == "lexical":
+        return vectors, 0
+    pending = [idx for idx, question in enumerate(questions)
+               if not practice.extract_financial_parameters(question) and not practice.use_lexical_only(question)]
+    if not pending:
+        return vectors, 0
+    embeddings = practice.retriever.vectorstore.embeddings
+    texts = [questions[idx] for idx in pending]
+    try:
+        if hasattr(embeddings, "embed_queries"):
+            # Only the questions missing from the query embedding cache reach the backend
+            results, calls = embeddings.embed_queries(texts, return_calls=True)
+        else:
+            results, calls = embed_query_batch(embeddings, texts), 1
+    except Exception as e:
+        logger.warning(f"Batch embedding failed ({str(e)}). Using lexical retrieval for this batch.")
+        metrics.fallbacks.inc(path="batch", reason="embedding_error")
+        return vectors, 0
+    for idx, vector in zip(pending, results):
+        vectors[idx] = vector
+    return vectors, calls
+
+
+def retrieve(question, query_vector):
+    k = practice.retriever.search_kwargs["k"]
+    if query_vector is not None:
+        return "vector", practice.search_by_vector(question, query_vector)
+    if practice.lexical_index is not None:
+        return "lexical", practice.lexical_index.search(question, k)
+    return "vector", practice.retriever.vectorstore.similarity_search(question, k=k)
+
+
+def answer_question(question_id, question, query_vector, warm_cache=False):
+    """Answer one question on an empty history and return its output record."""
+    start = time.perf_counter()
+    record = {"id": question_id, "question": question}
+    calculation_result = practice.extract_financial_parameters(question)
+    if calculation_result:
+        record.update(answer=calculation_result, intent="calculator", retrieval="none", sources=[])
+    else:
+        intent = practice.detect_finance_intent(question)
+        chat_request = practice.new_chat_request(question, intent, practice.get_intent_chain(intent), [],
+                                                 (0, 0), {})
+        mode, docs = retrieve(question, query_vector)
+        practice.set_context(chat_request, docs)
+        # Shares the chat path's breaker: an outage opens it for both
+        response = practice.llm_breaker.call(chat_request["chain"].invoke, chat_request["input"])
+        answer = response if isinstance(response, str) else response.content
+        if warm_cache and practice.response_cache is not None:
+            practice.response_cache.put(question, intent, [], answer, query_vector)
+        record.update(answer=answer, intent=intent, retrieval=mode,
+                      sources=[{key: doc.metadata.get(key) for key in ("source", "page", "chunk_id")}
+                               for doc in chat_request["input"]["context"]])
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def run(input_path, output_path, concurrency=8, batch_size=32, warm_cache=False):
+    """Answer every pending question and return the run summary."""
+    practice.init_resources()
+    done = load_done(output_path)
+    if done:
+        logger.info(f"Resuming: {len(done)} question(s) already answered in {output_path}")
+
+    counts = {"answered": 0, "failed": 0, "embed_calls": 0}
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, \
+            open(errors_path(output_path), "w", encoding="utf-8") as errors, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-qa") as pool:
+
+        def collect(futures):
+            for future in futures:
+                question_id, question = pending_questions.pop(future)
+                try:
+                    record, target = future.result(), out
+                    counts["answered"] += 1
+                except Exception as e:
+                    logger.error(f"Question {question_id} failed: {str(e)}")
+                    record, target = {"id": question_id, "question": question, "error": str(e)}, errors
+                    counts["failed"] += 1
+                target.write(json.dumps(record, ensure_ascii=False) + "\n")
+                target.flush()
+                finished = counts["answered"] + counts["failed"]
+                if finished % REPORT_EVERY == 0:
+                    logger.info(f"Batch QA: {finished} done, {finished / (time.perf_counter() - start):.2f} questions/s")
+
+        pending_questions = {}
+        for batch in batches(iter_questions(input_path, done), batch_size):
+            vectors, calls = embed_batch([question for _, question in batch])
+            counts["embed_calls"] += calls
+            for (question_id, question), vector in zip(batch, vectors):
+                # Keep the number of queued questions bounded
+                while len(pending_questions) >= 2 * concurrency:
+                    finished, _ = wait(pending_questions, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                future = pool.submit(answer_question, question_id, question, vector, warm_cache)
+                pending_questions[future] = (question_id, question)
+        collect(list(pending_questions))
+
+    elapsed = time.perf_counter() - start
+    total = counts["answered"] + counts["failed"]
+    summary = {**counts, "skipped": len(done), "elapsed_s": round(elapsed, 2),
+               "questions_per_s": round(total / elapsed, 2) if elapsed else None,
+               "concurrency": concurrency, "batch_size": batch_size}
+    logger.info(f"Batch QA finished: {json.dumps(summary)}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with the chat pipeline.")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("output", help="JSONL file to append answers to (resumed if it exists); "
+                                       "failures go to <output>.errors.jsonl")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_QA_CONCURRENCY", 8)))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("BATCH_QA_BATCH_SIZE", 32)),
+                        help="questions per embedding call")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="store the answers in the response cache for first questions in a session")
+    args = parser.parse_args()
+    practice.configure_logging()
+    print(json.dumps(run(args.input, args.output, args.concurrency, args.batch_size, args.warm_cache), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Chat and quiz latency through a simulated provider incident, with and without the breakers.
+
+Runs against the local fakes in fakes.py with their fault injector: a
+healthy phase, an incident phase in which every chat model, embedding and
+quiz call stalls (or errors, with --fault-mode error), and a recovery phase
+after the faults stop and one probe request per path has closed the
+circuits again. Each mode
+runs in a fresh interpreter, in a scratch working directory that links to
+the PDF folder:
+
+- guarded: per-call deadlines (--deadline) and circuit breakers
+- unguarded: BREAKER_FAILURE_THRESHOLD=0 and no deadlines, the old behaviour
+
+For every phase it reports chat and quiz p50/p99 latency and the share of
+degraded answers (extractive chat answers, fallback-bank quizzes). Run from
+GDGbackend/:
+
+    python benchmarks/bench_breaker.py [--requests 40] [--concurrency 4] [--stall 5] [--deadline 1]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUERIES = [
+    "How should I start investing with a small salary?",
+    "How do I create a monthly budget?",
+    "What's a good strategy to pay off credit card debt?",
+    "How much should I save for retirement in my 30s?",
+    "Is term life insurance worth it?",
+    "What is diversification and why does it matter?",
+]
+
+
+def run_phase(phase, client, requests, concurrency, fallback_ids):
+    def chat(i):
+        start = time.perf_counter()
+        # A distinct question per request, so nothing is coalesced or cached
+        response = client.post("/chat", json={"message": f"{QUERIES[i % len(QUERIES)]} ({phase} #{i})",
+                                              "session_id": f"bench-breaker-{i}"})
+        text = response.get_json().get("message", "")
+        return time.perf_counter() - start, text.startswith("Our AI assistant is temporarily unavailable")
+
+    def quiz(_):
+        start = time.perf_counter()
+        questions = client.get("/quiz").get_json().get("questions", [])
+        return time.perf_counter() - start, {question["question"] for question in questions} <= fallback_ids
+
+    results = {}
+    for name, fn in (("chat", chat), ("quiz", quiz)):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fn, range(requests)))
+        latencies = np.array([latency for latency, _ in samples]) * 1000
+        results[name] = {"p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                         "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+                         "degraded": round(sum(degraded for _, degraded in samples) / len(samples), 3)}
+    return results
+
+
+def child(args):
+    """Run the three phases in this process and print the results as JSON."""
+    import app
+    import fakes
+    import practice
+    import circuit_breaker
+    practice.init_resources()
+    client = app.app.test_client()
+    fallback_ids = {question["question"] for question in app.FALLBACK_QUESTIONS}
+
+    results = {"healthy": run_phase("healthy", client, args.requests, args.concurrency, fallback_ids)}
+    fakes.faults.configure(rate=1.0, mode=args.fault_mode, stall=args.stall)
+    results["incident"] = run_phase("incident", client, args.requests, args.concurrency, fallback_ids)
+    fakes.faults.configure(rate=0.0)
+    time.sleep(args.reset + 0.5)
+    # One request per path carries the half-open trial calls that close the circuits;
+    # requests arriving during a trial are still answered in degraded mode
+    client.post("/chat", json={"message": QUERIES[0], "session_id": "bench-breaker-probe"})
+    client.get("/quiz")
+    results["recovery"] = run_phase("recovery", client, args.requests, args.concurrency, fallback_ids)
+    results["breakers"] = {breaker.name: breaker.stats() for breaker in circuit_breaker.breakers}
+    print("BENCH " + json.dumps(results))
+    sys.stdout.flush()
+    # Stalled calls abandoned on the deadline pool would otherwise keep the process alive
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--requests", type=int, default=40, help="chat and quiz requests per phase")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fault-mode", choices=("stall", "error"), default="stall")
+    parser.add_argument("--stall", type=float, default=5.0, help="seconds a stalled provider call takes")
+    parser.add_argument("--deadline", type=float, default=1.0, help="per-call deadline in guarded mode")
+    parser.add_argument("--reset", type=float, default=2.0, help="seconds before an open circuit is retried")
+    parser.add_argument("--books", default=os.path.join(BACKEND_DIR, "books"))
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="finverse-breaker-")
+    os.makedirs(workdir, exist_ok=True)
+    if not os.path.exists(os.path.join(workdir, "books")):
+        os.symlink(os.path.abspath(args.books), os.path.join(workdir, "books"))
+    base_env = dict(os.environ, **{
+        "PYTHONPATH": BACKEND_DIR,
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "offline"),
+        "LLM_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": "0.2",
+        "FAKE_LLM_TOKEN_DELAY": "0",
+        "FAKE_EMBED_DELAY": "0.05",
+        "FAKE_QUIZ_DELAY": "0.3",
+        "RESPONSE_CACHE_ENABLED": "0",
+        "QUERY_EMBED_CACHE_PATH": "",
+        "QUIZ_POOL_ENABLED": "0",
+        "COALESCE_ENABLED": "0",
+        "MEMORY_SUMMARY_TOKENS": "0",
+        "BREAKER_RESET_S": str(args.reset),
+    })
+    modes = {
+        "guarded": {"LLM_DEADLINE_S": str(args.deadline), "EMBED_DEADLINE_S": str(args.deadline),
+                    "QUIZ_DEADLINE_S": str(args.deadline), "LLM_FIRST_TOKEN_S": str(args.deadline),
+                    "LLM_CHUNK_S": str(args.deadline)},
+        "unguarded": {"BREAKER_FAILURE_THRESHOLD": "0", "LLM_DEADLINE_S": "0", "EMBED_DEADLINE_S": "0",
+                      "QUIZ_DEADLINE_S": "0", "LLM_FIRST_TOKEN_S": "0", "LLM_CHUNK_S": "0"},
+    }
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests),
+               "--concurrency", str(args.concurrency), "--fault-mode", args.fault_mode,
+               "--stall", str(args.stall), "--reset", str(args.reset)]
+    results = {}
+    for mode, env in modes.items():
+        result = subprocess.run(command, cwd=workdir, env=dict(base_env, **env), capture_output=True, text=True,
+                                timeout=7200)
+        lines = [line for line in result.stdout.splitlines() if line.startswith("BENCH ")]
+        if not lines:
+            raise RuntimeError(f"{mode} run failed:\n{result.stderr[-2000:]}")
+        results[mode] = json.loads(lines[0][len("BENCH "):])
+
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, "fault_mode": args.fault_mode,
+                      "stall_s": args.stall, "deadline_s": args.deadline, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark: vectorized calculators vs. the scalar functions in practice.py.
+
+Evaluates a rate x term grid both ways and checks the results agree. Run
+from GDGbackend/:
+
+    python benchmarks/bench_calculators.py [--rates 200] [--terms 40]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculators
+
+
+# Scalar reference implementations, as in practice.py (importing practice
+# would start the whole chatbot)
+def compound_interest_calculator(principal, rate, time, compounds_per_year=1):
+    rate = rate / 100
+    return principal * (1 + rate/compounds_per_year)**(compounds_per_year*time)
+
+
+def loan_payment_calculator(principal, rate, years):
+    rate = rate / 100 / 12
+    n = years * 12
+    if rate == 0:
+        return principal / n
+    return principal * (rate * (1 + rate)**n) / ((1 + rate)**n - 1)
+
+
+def retirement_calculator(current_savings, monthly_contribution, years, annual_return):
+    monthly_return = annual_return / 100 / 12
+    months = years * 12
+    future_value = current_savings * (1 + monthly_return)**months
+    if monthly_return == 0:
+        return future_value + monthly_contribution * months
+    return future_value + monthly_contribution * ((1 + monthly_return)**months - 1) / monthly_return
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=40)
+    args = parser.parse_args()
+
+    rates = np.linspace(0, 15, args.rates)
+    terms = np.arange(1, args.terms + 1, dtype=np.float64)
+    rate_grid, term_grid = (g.ravel() for g in np.meshgrid(rates, terms, indexing="ij"))
+    scenarios = rate_grid.size
+    report = {"scenarios": int(scenarios)}
+
+    cases = {
+        "compound_interest": (
+            lambda: [compound_interest_calculator(10000, r, t) for r, t in zip(rate_grid, term_grid)],
+            lambda: calculators.compound_interest(10000, rate_grid, term_grid)),
+        "loan_payment": (
+            lambda: [loan_payment_calculator(250000, r, t) for r, t in zip(rate_grid, term_grid)],
+            lambda: calculators.loan_payment(250000, rate_grid, term_grid)),
+        "retirement": (
+            lambda: [retirement_calculator(10000, 500, t, r) for r, t in zip(rate_grid, term_grid)],
+            lambda: calculators.retirement_savings(10000, 500, term_grid, rate_grid)),
+    }
+    for name, (scalar_fn, vector_fn) in cases.items():
+        scalar, scalar_s = timed(scalar_fn)
+        vector, vector_s = timed(vector_fn)
+        report[name] = {
+            "scalar_ms": round(scalar_s * 1000, 3),
+            "vectorized_ms": round(vector_s * 1000, 3),
+            "speedup": round(scalar_s / vector_s, 1),
+            "max_abs_diff": float(np.max(np.abs(np.asarray(scalar) - vector))),
+        }
+
+    # Schedules are capped at MAX_SCHEDULE_CELLS, so time as many scenarios as fit
+    fit = max(1, min(scenarios, calculators.MAX_SCHEDULE_CELLS // int(term_grid.max() * 12)))
+    _, schedule_s = timed(lambda: calculators.amortization_schedule(250000, rate_grid[:fit], term_grid[:fit]))
+    report["amortization_schedule"] = {"scenarios": int(fit), "ms": round(schedule_s * 1000, 3)}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""End-to-end offline benchmark of the ingestion, retriever, chat and quiz paths.
+
+Runs against the local fakes in fakes.py (LLM_BACKEND=fake,
+EMBEDDING_BACKEND=fake), so no network or API key is needed, inside a
+scratch working directory that links to the PDF folder. Every scenario
+reports throughput, p50/p95/p99 latency and peak RSS; the results are
+written as JSON so runs from different commits can be compared (use
+--output: PyMuPDF can print warnings to stdout). Run from GDGbackend/:
+
+    python benchmarks/bench_e2e.py [--requests 200] [--concurrency 16] [--output results.json]
+    python benchmarks/bench_e2e.py --compare baseline.json --output current.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUERIES = [
+    "What is a stock?",
+    "How should I start investing with a small salary?",
+    "How do I create a monthly budget?",
+    "What's a good strategy to pay off credit card debt?",
+    "How much should I save for retirement in my 30s?",
+    "Do I pay capital gains tax on ETF returns?",
+    "Is term life insurance worth it?",
+    "What is diversification and why does it matter?",
+    "How does compound interest work over decades?",
+    "What is an emergency fund?",
+    "Should I pay off my mortgage early or invest?",
+    "What is an index fund?",
+]
+
+
+class PeakRSS:
+    """Sample the resident set size in the background and keep the peak (MB)."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+        except (OSError, ValueError):
+            # No /proc (macOS): fall back to the process-lifetime peak
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / 1e6 if sys.platform == "darwin" else maxrss / 1e3
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def summarize(latencies, wall, rss, errors=0):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "requests": int(len(latencies)),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+
+
+def run_load(fn, requests, concurrency):
+    """Call fn(i) `requests` times over `concurrency` threads."""
+    latencies = [0.0] * requests
+    errors = [0]
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            if fn(i) is False:
+                errors[0] += 1
+        except Exception:
+            errors[0] += 1
+        latencies[i] = time.perf_counter() - start
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall, rss, errors[0])
+
+
+def run_repeated(fn, repeat):
+    """Call fn sequentially `repeat` times."""
+    return run_load(lambda i: fn(), repeat, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline):
+    """Per-scenario ratios against a baseline run (>1 means slower/bigger)."""
+    report = {}
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        report[name] = {key: round(result[key] / base[key], 3)
+                        for key in ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+                        if result.get(key) and base.get(key)}
+        if result.get("throughput_rps") and base.get("throughput_rps"):
+            report[name]["throughput_rps"] = round(result["throughput_rps"] / base["throughput_rps"], 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the sequential scenarios")
+    parser.add_argument("--books", default=os.path.join(BACKEND_DIR, "books"))
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.2)
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--embed-delay", type=float, default=0.05)
+    parser.add_argument("--quiz-delay", type=float, default=0.5)
+    parser.add_argument("--response-cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    args = parser.parse_args()
+
+    output, baseline = (os.path.abspath(path) if path else None for path in (args.output, args.compare))
+    workdir = args.workdir or tempfile.mkdtemp(prefix="finverse-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    if not os.path.exists(os.path.join(workdir, "books")):
+        os.symlink(os.path.abspath(args.books), os.path.join(workdir, "books"))
+    os.chdir(workdir)
+    os.environ.update({
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "offline"),
+        "HF_TOKEN": os.getenv("HF_TOKEN", "offline"),
+        "LLM_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.llm_first_token_delay),
+        "FAKE_LLM_TOKEN_DELAY": str(args.llm_token_delay),
+        "FAKE_EMBED_DELAY": str(args.embed_delay),
+        "FAKE_QUIZ_DELAY": str(args.quiz_delay),
+        "RESPONSE_CACHE_ENABLED": "1" if args.response_cache else "0",
+        "QUERY_EMBED_CACHE_PATH": "",
+    })
+    scenarios = {}
+
+    # The first init builds everything from scratch: extraction, chunking and the vector index
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        import practice
+        import_wall = time.perf_counter() - start
+        practice.init_resources()
+        wall = time.perf_counter() - start
+    scenarios["import"] = summarize([import_wall], import_wall, rss)
+    scenarios["cold_start_import"] = summarize([wall], wall, rss)
+    practice.logger.setLevel("WARNING")
+
+    scenarios["extract_pdfs_warm"] = run_repeated(practice.extract_pdfs, args.repeat)
+
+    def extract_cold():
+        shutil.rmtree(practice.ingestion.extract_dir, ignore_errors=True)
+        os.remove(practice.ingestion.manifest_file)
+        return practice.extract_pdfs()
+    scenarios["extract_pdfs_cold"] = run_repeated(extract_cold, 1)
+
+    scenarios["initialize_retriever_lazy"] = run_repeated(practice.initialize_retriever, args.repeat)
+
+    def build_retriever():
+        # Build into a fresh store so the serving store stays untouched
+        store_dir = tempfile.mkdtemp(prefix="store-", dir=workdir)
+        saved = (practice.persist_directory_gemini, practice.retriever_meta_file, practice.embedding_checkpoint_file)
+        practice.persist_directory_gemini = store_dir
+        practice.retriever_meta_file = os.path.join(store_dir, "finverse_meta.json")
+        practice.embedding_checkpoint_file = os.path.join(store_dir, "embedding_checkpoint.jsonl")
+        try:
+            return practice.initialize_retriever() is not None
+        finally:
+            (practice.persist_directory_gemini, practice.retriever_meta_file,
+             practice.embedding_checkpoint_file) = saved
+    scenarios["initialize_retriever_build"] = run_repeated(build_retriever, 1)
+
+    scenarios["chat_with_ai"] = run_load(
+        lambda i: practice.chat_with_ai(QUERIES[i % len(QUERIES)], f"bench-{i}") != practice.fallback_answer,
+        args.requests, args.concurrency)
+
+    import app
+    app.logger.setLevel("WARNING")
+    client = app.app.test_client()
+
+    def post_chat(i):
+        response = client.post("/chat", json={"message": QUERIES[i % len(QUERIES)], "session_id": f"http-{i}"})
+        return response.status_code == 200
+    scenarios["http_chat"] = run_load(post_chat, args.requests, args.concurrency)
+
+    scenarios["http_quiz"] = run_load(lambda i: client.get("/quiz").status_code == 200,
+                                      args.requests, args.concurrency)
+    if app.quiz_pool:
+        stats = app.quiz_pool.stats()
+        scenarios["http_quiz"]["pool_hit_rate"] = stats["hit_rate"]
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workdir": workdir,
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    sys.stdout.flush()
+    # Background refill and retrieval threads would otherwise keep the process alive
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
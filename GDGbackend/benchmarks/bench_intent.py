@@ -0,0 +1,102 @@
+"""Micro-benchmark: precompiled intent classifier vs. the original regex loop.
+
+Queries are taken from the "Processing query" lines in logs/*.log and the
+human messages in chat_history.json. Run from GDGbackend/:
+
+    python benchmarks/bench_intent.py [--repeat 200]
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import IntentClassifier
+
+SAMPLE_QUERIES = [
+    "What is a stock?",
+    "How should I start investing?",
+    "How to create a budget?",
+    "What's a good debt repayment strategy?",
+    "Calculate compound interest on $10000 at 7% for 10 years",
+    "How much should I put in my 401k before I retire?",
+    "Do I need to pay capital gain tax on my ETF returns?",
+    "Is term life insurance coverage worth the premium?",
+    "How do I reach financial freedom and grow my net worth?",
+    "Hii",
+]
+
+
+def legacy_detect_finance_intent(user_input):
+    """The original detect_finance_intent, minus its logging."""
+    intents = {
+        "investment_advice": r'\b(invest|stock|bond|etf|portfolio|dividend|market|return|risk|asset)\b',
+        "budgeting": r'\b(budget|spend|saving|expense|income|track|money|financial plan|cash flow)\b',
+        "debt": r'\b(debt|loan|credit|mortgage|interest|payment|borrow|lend|finance|leverage)\b',
+        "retirement": r'\b(retire|401k|ira|pension|social security|annuity|future|nest egg)\b',
+        "tax": r'\b(tax|deduction|filing|return|irs|write-off|capital gain|liability|exemption)\b',
+        "insurance": r'\b(insurance|policy|coverage|premium|deductible|claim|risk management|protection)\b',
+        "financial_planning": r'\b(plan|goal|future|strategy|wealth|net worth|financial freedom|independence)\b',
+        "calculator": r'\b(calculate|computation|formula|interest|payment|return|yield|rate|compound)\b',
+        "general": r'.*'
+    }
+    for intent, pattern in intents.items():
+        if re.search(pattern, user_input.lower()):
+            return intent
+    return "general"
+
+
+def load_queries():
+    """Collect logged user queries, falling back to a built-in sample."""
+    queries = []
+    for log_path in glob.glob(os.path.join("logs", "*.log")):
+        with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                match = re.search(r"Processing query with intent '[^']*'(?: \([^)]*\))?: (.*)$", line)
+                if match:
+                    queries.append(match.group(1))
+    if os.path.exists("chat_history.json"):
+        with open("chat_history.json", "r") as f:
+            queries.extend(msg["content"] for msg in json.load(f) if msg.get("type") == "human")
+    return queries or SAMPLE_QUERIES
+
+
+def bench(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(query)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(queries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    queries = load_queries()
+    classifier = IntentClassifier()
+
+    legacy_us = bench(legacy_detect_finance_intent, queries, args.repeat)
+    new_us = bench(classifier.classify, queries, args.repeat)
+    # The legacy loop stops at the first pattern; compare against the top-priority match
+    agree = sum(legacy_detect_finance_intent(q) == min(
+        classifier.scores(q) or {"general": 0}, key=lambda i: classifier.priority.get(i, len(classifier.priority)))
+        for q in queries)
+
+    print(json.dumps({
+        "queries": len(queries),
+        "legacy_us_per_query": round(legacy_us, 2),
+        "compiled_us_per_query": round(new_us, 2),
+        "speedup": round(legacy_us / new_us, 2),
+        "first_match_agreement": f"{agree}/{len(queries)}",
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Per-call cost of logging on a request thread: synchronous handlers vs the queue.
+
+Replays the log lines of one chat request and one quiz request (including a
+full user query and a raw LLM response) from several threads, first through
+the old synchronous FileHandler + StreamHandler setup, then through the
+queued pipeline in log_pipeline.py with truncation on and off. Reports the
+time spent inside the logging calls per request (what the request thread
+pays, with --gap-ms of idle time between requests) and the log volume
+written. Console output goes to a file so both setups do the same I/O.
+Run from GDGbackend/:
+
+    python benchmarks/bench_logging.py [--requests 2000] [--threads 8]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import log_pipeline  # noqa: E402
+
+QUERY = "How should I balance paying off my student loans against investing for retirement? " * 3
+RAW_RESPONSE = json.dumps([{"id": i, "question": f"Question {i}: what does compound interest do?" * 4,
+                            "options": [f"Option {i}{c} " * 8 for c in "abcd"], "correctAnswer": 1}
+                           for i in range(3)])
+
+
+def request_log_lines(logger, i):
+    """The INFO lines one chat and one quiz request write."""
+    logger.info(f"Received chat request: {QUERY[:50]}...")
+    logger.info(f"Processing query with intent 'investment_advice' (chain setup 0.004ms): {QUERY} #{i}")
+    logger.info("Prompt size (est. tokens): 1421 -> 980 (context 5 chunks/1201 -> 3/860, history 4 messages/120)")
+    logger.info("Stage timings (ms): calculator=0.3, intent=0.0, history=0.2, retrieval=48.1, llm=812.5, persist=1.1")
+    logger.info("Generated response in 0.86s")
+    logger.info(f"Gemini Raw Response: {RAW_RESPONSE}")
+
+
+def run(logger, requests, threads, gap):
+    latencies = [0.0] * requests
+
+    def one(i):
+        start = time.perf_counter()
+        request_log_lines(logger, i)
+        latencies[i] = time.perf_counter() - start
+        # Real requests spend most of their time waiting on retrieval and the LLM
+        time.sleep(gap)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    latencies = np.asarray(latencies) * 1e6
+    return {
+        "wall_s": round(wall, 3),
+        "per_request_us_p50": round(float(np.percentile(latencies, 50)), 1),
+        "per_request_us_p99": round(float(np.percentile(latencies, 99)), 1),
+        "per_request_us_mean": round(float(latencies.mean()), 1),
+    }
+
+
+def log_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--gap-ms", type=float, default=2.0, help="idle time per request outside logging")
+    args = parser.parse_args()
+    results = {}
+
+    for name in ("sync", "queue_full", "queue_truncate"):
+        log_dir = tempfile.mkdtemp(prefix=f"finverse-log-{name}-")
+        logger = logging.getLogger(f"bench.{name}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        console = open(os.path.join(log_dir, "console.out"), "w", encoding="utf-8")
+        formatter = logging.Formatter(log_pipeline.LOG_FORMAT)
+
+        if name == "sync":
+            # The handlers practice.py attached directly before the queued pipeline
+            handlers = [logging.FileHandler(os.path.join(log_dir, "finance_chatbot.log"), encoding="utf-8"),
+                        logging.StreamHandler(console)]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+                logger.addHandler(handler)
+            result = run(logger, args.requests, args.threads, args.gap_ms / 1000)
+            for handler in handlers:
+                handler.close()
+        else:
+            handlers = [log_pipeline.DailyRotatingFileHandler(log_dir, "finance_chatbot"),
+                        logging.StreamHandler(console)]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+            mode = "full" if name == "queue_full" else "truncate"
+            pipeline = log_pipeline.LogPipeline(logger, lambda pid: handlers, log_pipeline.PayloadFilter(1000, mode))
+            result = run(logger, args.requests, args.threads, args.gap_ms / 1000)
+            drain_start = time.perf_counter()
+            pipeline.stop()
+            result["drain_s"] = round(time.perf_counter() - drain_start, 3)
+            for handler in handlers:
+                handler.close()
+        console.close()
+        result["log_mb"] = round(log_bytes(log_dir) / 1e6, 2)
+        results[name] = result
+
+    print(json.dumps({"requests": args.requests, "threads": args.threads, "gap_ms": args.gap_ms,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
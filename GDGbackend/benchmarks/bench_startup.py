@@ -0,0 +1,120 @@
+"""Import time and time to first request of the Flask app.
+
+Every sample runs in a fresh interpreter, against the offline fakes
+(LLM_BACKEND=fake, EMBEDDING_BACKEND=fake), in a scratch working directory
+that links to the PDF folder. One run up front builds the corpus, indexes
+and vector store, so the samples measure a warm restart:
+
+- lazy: `import app`, then the first /chat request, which also
+  initializes the chat resources
+- preload: `import app`, then init_resources() and the quiz pool as a
+  server hook would run them, then the first /chat request
+
+Run from GDGbackend/:
+
+    python benchmarks/bench_startup.py [--repeat 5] [--output startup.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUERY = "How should I start investing with a small salary?"
+
+
+def child():
+    """Measure one startup in this process and print the timings as JSON."""
+    timings = {}
+    start = time.perf_counter()
+    import app
+    timings["import_ms"] = (time.perf_counter() - start) * 1000
+
+    if os.environ["BENCH_MODE"] == "preload":
+        start = time.perf_counter()
+        app.init_resources()
+        app.get_quiz_pool()
+        timings["preload_ms"] = (time.perf_counter() - start) * 1000
+
+    client = app.app.test_client()
+    start = time.perf_counter()
+    response = client.post("/chat", json={"message": QUERY, "session_id": "bench-startup"})
+    timings["first_request_ms"] = (time.perf_counter() - start) * 1000
+    timings["status"] = response.status_code
+    print("BENCH " + json.dumps(timings))
+    sys.stdout.flush()
+    # Background refill threads would otherwise keep the process alive
+    os._exit(0)
+
+
+def run_child(mode, workdir):
+    env = dict(os.environ, BENCH_MODE=mode)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=workdir, env=env,
+                            capture_output=True, text=True, timeout=3600)
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"{mode} run failed:\n{result.stderr[-2000:]}")
+
+
+def summarize(samples, key):
+    values = [sample[key] for sample in samples if key in sample]
+    if not values:
+        return None
+    return {"median_ms": round(statistics.median(values), 1), "min_ms": round(min(values), 1),
+            "max_ms": round(max(values), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--books", default=os.path.join(BACKEND_DIR, "books"))
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="finverse-startup-")
+    os.makedirs(workdir, exist_ok=True)
+    if not os.path.exists(os.path.join(workdir, "books")):
+        os.symlink(os.path.abspath(args.books), os.path.join(workdir, "books"))
+    os.environ.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "offline"),
+        "LLM_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": "0",
+        "FAKE_LLM_TOKEN_DELAY": "0",
+        "FAKE_EMBED_DELAY": "0",
+        "FAKE_QUIZ_DELAY": "0",
+        "RESPONSE_CACHE_ENABLED": "0",
+        "QUERY_EMBED_CACHE_PATH": "",
+    })
+
+    # Build everything once so the samples below are warm restarts
+    run_child("preload", workdir)
+
+    results = {}
+    for mode in ("lazy", "preload"):
+        samples = [run_child(mode, workdir) for _ in range(args.repeat)]
+        summaries = {key: summarize(samples, f"{key}_ms") for key in ("import", "preload", "first_request")}
+        results[mode] = {key: summary for key, summary in summaries.items() if summary}
+        results[mode]["errors"] = sum(sample["status"] != 200 for sample in samples)
+
+    results = {"workdir": workdir, "repeat": args.repeat, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Top-k latency, recall and per-process memory: Chroma vs the memory-mapped index.
+
+Exports an existing Chroma store with vector_index.export_chroma() and runs
+the same queries (stored chunk vectors plus Gaussian noise, so no embedding
+backend is needed) through Chroma, the exact memmap search and the quantized
+memmap search. Recall@k is measured against the exact search. Memory is read
+from /proc/self/smaps_rollup in a fresh process per backend after opening
+the store and answering the queries: "private" is what each extra worker
+would add, "shared" is page cache every worker maps. Run from GDGbackend/:
+
+    python benchmarks/bench_vector_index.py [--store retriever_store_gemini] [--queries 200] [--k 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from vector_index import MmapVectorIndex, export_chroma  # noqa: E402
+
+BACKENDS = ("chroma", "mmap", "mmap_quantized")
+
+
+def open_backend(name, store, index_dir):
+    if name == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(persist_directory=store)
+    return MmapVectorIndex(index_dir, quantized=name == "mmap_quantized")
+
+
+def make_queries(index_dir, count, noise, seed=0):
+    index = MmapVectorIndex(index_dir)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), size=min(count, len(index)), replace=False)
+    vectors = np.asarray(index.vectors[np.sort(rows)])
+    scale = noise * np.sqrt(index.sq_norms.mean() / index.dim)
+    return (vectors + rng.normal(0, scale, vectors.shape)).astype(np.float32)
+
+
+def top_ids(backend, query, k):
+    results = backend.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k)
+    return [doc.metadata.get("chunk_id") for doc, _ in results]
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+            "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+            "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)}
+
+
+def child(args):
+    """Open one backend in this process, answer the queries and print its memory."""
+    baseline = memory_kb()
+    backend = open_backend(args.child, args.store, args.index_dir)
+    for query in make_queries(args.index_dir, args.queries, args.noise):
+        top_ids(backend, query, args.k)
+    used = memory_kb()
+    print("BENCH " + json.dumps({key: round(used[key] - baseline[key], 1) for key in used}))
+
+
+def measure_memory(name, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, "--store", args.store,
+               "--index-dir", args.index_dir, "--queries", str(args.queries), "--k", str(args.k),
+               "--noise", str(args.noise)]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=3600)
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    return {"error": result.stderr[-500:]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=os.getenv("RETRIEVER_STORE_DIR", "retriever_store_gemini"))
+    parser.add_argument("--index-dir", help="where to export the index (default: a new temp dir)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.5, help="query noise relative to the vector scale")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    from langchain_chroma import Chroma
+    args.index_dir = args.index_dir or tempfile.mkdtemp(prefix="finverse-vectors-")
+    start = time.perf_counter()
+    export_chroma(Chroma(persist_directory=args.store), args.index_dir, "bench")
+    export_s = time.perf_counter() - start
+    queries = make_queries(args.index_dir, args.queries, args.noise)
+
+    results, reference = {}, None
+    for name in BACKENDS:
+        start = time.perf_counter()
+        backend = open_backend(name, args.store, args.index_dir)
+        open_ms = (time.perf_counter() - start) * 1000
+        top_ids(backend, queries[0], args.k)
+        latencies, hits = [], []
+        for query in queries:
+            start = time.perf_counter()
+            hits.append(top_ids(backend, query, args.k))
+            latencies.append((time.perf_counter() - start) * 1000)
+        if name == "mmap":
+            reference = hits
+        results[name] = {"open_ms": round(open_ms, 1),
+                         "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                         "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                         "hits": hits}
+
+    # Batched matrix products amortize the scan across concurrent queries
+    exact = MmapVectorIndex(args.index_dir)
+    start = time.perf_counter()
+    exact.search_batch(queries, args.k)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    for name, result in results.items():
+        hits = result.pop("hits")
+        result["recall_at_k"] = round(float(np.mean([len(set(found) & set(expected)) / len(expected)
+                                                     for found, expected in zip(hits, reference)])), 4)
+        result["memory"] = measure_memory(name, args)
+    results["mmap"]["batched_per_query_ms"] = round(batch_ms, 3)
+
+    print(json.dumps({"store": args.store, "vectors": len(exact), "dim": exact.dim, "k": args.k,
+                      "queries": len(queries), "export_s": round(export_s, 2), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
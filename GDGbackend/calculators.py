@@ -0,0 +1,201 @@
+# ------------------------------------
+# Vectorized Financial Calculators
+# ------------------------------------
+# NumPy versions of the calculators in practice.py. Every argument can be a
+# scalar or an array; arrays broadcast against each other so a single call
+# evaluates thousands of scenarios (for example a rate x term grid). The
+# schedule functions return full month-by-month arrays. A 0% rate is
+# handled explicitly instead of dividing by zero.
+import numpy as np
+
+MAX_SCENARIOS = 100_000
+MAX_SCHEDULE_CELLS = 2_000_000
+# Schedules returned as JSON are far smaller: scenarios x months per array,
+# four arrays per loan schedule. 50,000 cells is about 140 thirty-year loans.
+MAX_RESPONSE_SCHEDULE_CELLS = 50_000
+
+
+def _arrays(*values):
+    return np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in values))
+
+
+def _growth_factor(rate, periods):
+    """(1 + rate) ** periods and the annuity factor ((1 + rate) ** periods - 1) / rate,
+    with the rate -> 0 limit (periods) where the rate is zero."""
+    rate, periods = np.broadcast_arrays(rate, periods)
+    factor = np.power(1 + rate, periods)
+    annuity = np.divide(factor - 1, rate, out=periods.astype(np.float64), where=rate != 0)
+    return factor, annuity
+
+
+def compound_interest(principal, rate, years, compounds_per_year=1):
+    """Final amount A = P(1 + r/n)^(nt), with rate in percent."""
+    principal, rate, years, n = _arrays(principal, rate, years, compounds_per_year)
+    return principal * np.power(1 + rate / 100 / n, n * years)
+
+
+def loan_payment(principal, rate, years):
+    """Monthly payment PMT = P * r / (1 - (1 + r)^-n); P / n at a 0% rate."""
+    principal, rate, years = _arrays(principal, rate, years)
+    monthly_rate = rate / 100 / 12
+    months = years * 12
+    factor, annuity = _growth_factor(monthly_rate, months)
+    return principal * factor / annuity
+
+
+def retirement_savings(current_savings, monthly_contribution, years, annual_return):
+    """Future value of current savings plus monthly contributions."""
+    current_savings, monthly_contribution, years, annual_return = _arrays(
+        current_savings, monthly_contribution, years, annual_return)
+    monthly_return = annual_return / 100 / 12
+    factor, annuity = _growth_factor(monthly_return, years * 12)
+    return current_savings * factor + monthly_contribution * annuity
+
+
+def _schedule_months(years):
+    months = np.rint(np.asarray(years, dtype=np.float64) * 12).astype(np.int64)
+    if months.size and months.min() < 0:
+        raise ValueError("years must not be negative")
+    return months
+
+
+def amortization_schedule(principal, rate, years):
+    """Month-by-month loan amortization for every scenario.
+
+    Returns a dict of arrays shaped (*scenarios, max_months): payment,
+    interest, principal and balance (remaining after each payment). Months
+    past a scenario's own term are zero.
+    """
+    principal, rate, years = _arrays(principal, rate, years)
+    months = _schedule_months(years)
+    max_months = int(months.max()) if months.size else 0
+    if principal.size * max_months > MAX_SCHEDULE_CELLS:
+        raise ValueError(f"schedule too large: {principal.size} scenarios x {max_months} months")
+
+    monthly_rate = (rate / 100 / 12)[..., None]
+    payment = loan_payment(principal, rate, months / 12)[..., None]
+    k = np.arange(1, max_months + 1, dtype=np.float64)
+    factor, annuity = _growth_factor(monthly_rate, k)
+    balance = principal[..., None] * factor - payment * annuity
+    previous = np.concatenate([principal[..., None], balance[..., :-1]], axis=-1)
+    interest = previous * monthly_rate
+    principal_paid = payment - interest
+
+    active = k <= months[..., None]
+    balance = np.where(active, np.maximum(balance, 0.0), 0.0)
+    return {
+        "payment": np.where(active, payment, 0.0),
+        "interest": np.where(active, interest, 0.0),
+        "principal": np.where(active, principal_paid, 0.0),
+        "balance": balance,
+    }
+
+
+def contribution_schedule(current_savings, monthly_contribution, years, annual_return):
+    """Month-by-month savings growth for every scenario.
+
+    Returns a dict of arrays shaped (*scenarios, max_months): balance,
+    contributed (savings plus contributions so far) and growth. Months past
+    a scenario's own horizon repeat its final values.
+    """
+    current_savings, monthly_contribution, years, annual_return = _arrays(
+        current_savings, monthly_contribution, years, annual_return)
+    months = _schedule_months(years)
+    max_months = int(months.max()) if months.size else 0
+    if current_savings.size * max_months > MAX_SCHEDULE_CELLS:
+        raise ValueError(f"schedule too large: {current_savings.size} scenarios x {max_months} months")
+
+    monthly_return = (annual_return / 100 / 12)[..., None]
+    k = np.minimum(np.arange(1, max_months + 1), months[..., None]).astype(np.float64)
+    factor, annuity = _growth_factor(monthly_return, k)
+    balance = current_savings[..., None] * factor + monthly_contribution[..., None] * annuity
+    contributed = current_savings[..., None] + monthly_contribution[..., None] * k
+    return {"balance": balance, "contributed": contributed, "growth": balance - contributed}
+
+
+CALCULATIONS = {
+    "compound_interest": (compound_interest, ["principal", "rate", "years"], ["compounds_per_year"]),
+    "loan": (loan_payment, ["principal", "rate", "years"], []),
+    "retirement": (retirement_savings, ["current_savings", "monthly_contribution", "years", "annual_return"], []),
+}
+
+SCHEDULES = {
+    "loan": amortization_schedule,
+    "retirement": contribution_schedule,
+}
+
+# Calculations that run month by month; their terms are rounded to whole months
+MONTHLY = {"loan", "retirement"}
+
+
+def calculate_batch(payload):
+    """Evaluate a JSON batch request.
+
+    `payload` names a calculation ("type") and gives each parameter as a
+    number or a list. With "grid": true the lists are crossed into every
+    combination; otherwise they broadcast element-wise. "schedule": true
+    adds month-by-month arrays for loan and retirement, up to
+    MAX_RESPONSE_SCHEDULE_CELLS scenario-months. Loan and retirement
+    terms are rounded to whole months, the grid their schedules use, so the
+    results always match the last schedule row. Raises ValueError on bad
+    input.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("request body must be a JSON object")
+    calc_type = payload.get("type")
+    if calc_type not in CALCULATIONS:
+        raise ValueError(f"type must be one of {sorted(CALCULATIONS)}")
+    fn, required, optional = CALCULATIONS[calc_type]
+
+    missing = [name for name in required if name not in payload]
+    if missing:
+        raise ValueError(f"missing parameters: {', '.join(missing)}")
+    names = required + [name for name in optional if name in payload]
+    try:
+        values = [np.atleast_1d(np.asarray(payload[name], dtype=np.float64)) for name in names]
+    except (TypeError, ValueError):
+        raise ValueError("parameters must be numbers or lists of numbers")
+    if any(v.ndim != 1 for v in values):
+        raise ValueError("parameters must be numbers or flat lists of numbers")
+
+    if payload.get("grid"):
+        if np.prod([v.size for v in values]) > MAX_SCENARIOS:
+            raise ValueError(f"too many scenarios (limit {MAX_SCENARIOS})")
+        values = [v.ravel() for v in np.meshgrid(*values, indexing="ij")]
+    else:
+        try:
+            values = list(np.broadcast_arrays(*values))
+        except ValueError:
+            raise ValueError("parameter lists must have the same length (or use \"grid\": true)")
+    if values[0].size > MAX_SCENARIOS:
+        raise ValueError(f"too many scenarios ({values[0].size} > {MAX_SCENARIOS})")
+
+    kwargs = dict(zip(names, values))
+    if "years" in kwargs and (kwargs["years"] <= 0).any():
+        raise ValueError("years must be greater than 0")
+    if "compounds_per_year" in kwargs and (kwargs["compounds_per_year"] <= 0).any():
+        raise ValueError("compounds_per_year must be greater than 0")
+    if calc_type in MONTHLY:
+        months = _schedule_months(kwargs["years"])
+        if (months == 0).any():
+            raise ValueError("years must be at least one month")
+        kwargs["years"] = months / 12
+    results = fn(**kwargs)
+    if not np.isfinite(results).all():
+        raise ValueError("calculation overflowed - check the rates and terms")
+    result = {
+        "type": calc_type,
+        "scenarios": int(values[0].size),
+        "inputs": {name: v.tolist() for name, v in kwargs.items()},
+        "results": np.round(results, 2).tolist(),
+    }
+    if payload.get("schedule"):
+        if calc_type not in SCHEDULES:
+            raise ValueError(f"schedules are only available for {sorted(SCHEDULES)}")
+        months = int(_schedule_months(kwargs["years"]).max())
+        if values[0].size * months > MAX_RESPONSE_SCHEDULE_CELLS:
+            raise ValueError(f"schedule too large to return: {values[0].size} scenarios x {months} months "
+                             f"(limit {MAX_RESPONSE_SCHEDULE_CELLS}); ask for fewer scenarios or shorter terms")
+        schedule = SCHEDULES[calc_type](**kwargs)
+        result["schedule"] = {name: np.round(arr, 2).tolist() for name, arr in schedule.items()}
+    return result
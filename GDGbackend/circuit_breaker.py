@@ -0,0 +1,234 @@
+# ------------------------------------
+# Upstream Circuit Breaker
+# ------------------------------------
+# Guards calls to the Gemini clients (chat model, embeddings, quiz model).
+# Every call gets a deadline; after `failure_threshold` consecutive errors
+# or timeouts the circuit opens and calls fail immediately with
+# CircuitOpenError, so callers can answer from a degraded path instead of
+# queueing behind a provider incident. After `reset_timeout` seconds one
+# trial call is let through (half-open): success closes the circuit,
+# failure opens it again. Transitions are logged and exported on /metrics.
+#
+# A sync call that misses its deadline keeps running on the deadline pool
+# until the client returns; the caller just stops waiting for it. Streams get
+# two deadlines instead, one for the first chunk and one between chunks (see
+# iter_with_deadlines).
+import time
+import queue
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+import metrics
+
+logger = logging.getLogger("finance_chatbot")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breakers = []
+deadline_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upstream")
+
+
+class UpstreamError(Exception):
+    """The upstream call was refused or didn't finish in time."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The circuit is open; the call was not made."""
+
+
+class UpstreamTimeout(UpstreamError, TimeoutError):
+    """The upstream call missed its deadline."""
+
+
+def _collect_state():
+    for breaker in list(breakers):
+        yield {"name": breaker.name}, STATE_VALUES[breaker.state]
+
+
+def _collect_events():
+    for breaker in list(breakers):
+        for event, value in breaker.stats().items():
+            if event != "state":
+                yield {"name": breaker.name, "event": event}, value
+
+
+metrics.registry.collector("finverse_breaker_state", "Circuit state (0 closed, 1 half-open, 2 open).",
+                           "gauge", _collect_state)
+metrics.registry.collector("finverse_breaker_events_total", "Circuit breaker calls and transitions.",
+                           "counter", _collect_events)
+
+
+_END = object()
+
+
+def iter_with_deadlines(stream, first_deadline=None, chunk_deadline=None, name="upstream"):
+    """Yield a blocking stream's items, raising UpstreamTimeout when one is late.
+
+    The stream is read on its own thread: the first item must arrive within
+    first_deadline seconds and each later one within chunk_deadline (None
+    or 0 waits as long as it takes). When the caller stops early or gives
+    up, the reader closes the stream after its current item.
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+
+    def read():
+        error = None
+        try:
+            for item in stream:
+                items.put((item, None))
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            error = e
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        items.put((_END, error))
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(read,), name=f"{name}-stream", daemon=True).start()
+    first = True
+    try:
+        while True:
+            deadline = (first_deadline if first else chunk_deadline) or None
+            try:
+                item, error = items.get(timeout=deadline)
+            except queue.Empty:
+                what = "its first chunk" if first else "the next chunk"
+                raise UpstreamTimeout(f"{name} stream sent no {what} within {deadline:g}s") from None
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            first = False
+            yield item
+    finally:
+        stop.set()
+
+
+class CircuitBreaker:
+    """Deadline and circuit breaker for one upstream client.
+
+    A failure_threshold of 0 disables the circuit (calls still get the
+    deadline); a deadline of None or 0 waits as long as the call takes.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, deadline=None, half_open_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.deadline = deadline or None
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+        self.counters = {"successes": 0, "failures": 0, "timeouts": 0, "rejected": 0,
+                         "opened": 0, "half_opened": 0, "closed": 0}
+        breakers.append(self)
+
+    # State -----------------------------------------------------------------
+    def _transition(self, state, reason=""):
+        # Called with the lock held
+        logger.warning(f"Circuit '{self.name}' {self.state} -> {state}{f' ({reason})' if reason else ''}")
+        self.state = state
+        self.counters[{OPEN: "opened", HALF_OPEN: "half_opened", CLOSED: "closed"}[state]] += 1
+
+    def allow(self):
+        """Whether a call may go upstream now (takes the trial slot when half-open)."""
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.counters["rejected"] += 1
+                    return False
+                self._transition(HALF_OPEN, f"{self.reset_timeout:g}s elapsed")
+                self._trials = 0
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self.counters["rejected"] += 1
+                    return False
+                self._trials += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.counters["successes"] += 1
+            self.failures = 0
+            if self.state != CLOSED:
+                self._transition(CLOSED, "trial call succeeded")
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.counters["failures"] += 1
+            if isinstance(error, UpstreamTimeout):
+                self.counters["timeouts"] += 1
+            self.failures += 1
+            if not self.failure_threshold:
+                return
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                reason = f"{self.failures} consecutive failures"
+                if error is not None:
+                    reason += f", last {type(error).__name__}: {error}"
+                self._transition(OPEN, reason)
+
+    def release(self):
+        """Give back a trial slot for a call that was abandoned without an outcome."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._trials:
+                self._trials -= 1
+
+    # Calls -----------------------------------------------------------------
+    def _refuse(self):
+        raise CircuitOpenError(f"circuit '{self.name}' is open")
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn within the deadline, recording the outcome."""
+        if not self.allow():
+            self._refuse()
+        try:
+            if self.deadline is None:
+                result = fn(*args, **kwargs)
+            else:
+                future = deadline_pool.submit(fn, *args, **kwargs)
+                try:
+                    result = future.result(timeout=self.deadline)
+                except FuturesTimeoutError:
+                    raise UpstreamTimeout(f"{self.name} call missed its {self.deadline:g}s deadline") from None
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, coro_fn, *args, **kwargs):
+        """Async counterpart of call."""
+        if not self.allow():
+            self._refuse()
+        try:
+            try:
+                result = await asyncio.wait_for(coro_fn(*args, **kwargs), self.deadline)
+            except asyncio.TimeoutError:
+                raise UpstreamTimeout(f"{self.name} call missed its {self.deadline:g}s deadline") from None
+        except asyncio.CancelledError:
+            # The request itself was cancelled (e.g. its own deadline) - no verdict on the provider
+            self.release()
+            raise
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "state": self.state}
@@ -0,0 +1,160 @@
+# ------------------------------------
+# Token-budgeted Context Packer
+# ------------------------------------
+# Assembles the retrieved chunks and chat history that go into the prompt.
+# Chunks that are neighbours in the same book are stitched back together
+# (dropping the splitter's overlap), near-duplicates are removed, and the
+# result is packed into a token budget: history first (newest messages
+# first), then context in retrieval rank order. Token counts are estimated
+# from text length, which is close enough for budgeting.
+import re
+
+from langchain.schema import Document
+
+CHARS_PER_TOKEN = 4
+ELLIPSIS = " ..."
+CHUNK_ID_PATTERN = re.compile(r"^(.*)-(\d+)$")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(message.content) for message in messages)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, at a word boundary where possible.
+
+    The " ..." marking the cut counts toward the budget.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    room = limit - len(ELLIPSIS)
+    if room <= 0:
+        return text[:max(limit, 0)]
+    cut = text.rfind(" ", 0, room + 1)
+    return text[:cut if cut > room // 2 else room].rstrip() + ELLIPSIS
+
+
+def join_overlapping(first, second, overlap_window):
+    """Join two consecutive chunks, removing the text they share."""
+    probe = second[:min(50, len(second))]
+    pos = first.find(probe, max(0, len(first) - overlap_window))
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return first[:pos] + second
+        pos = first.find(probe, pos + 1)
+    return first + "\n" + second
+
+
+class ContextPacker:
+    """Merge, dedupe and budget retrieved chunks and chat history."""
+
+    def __init__(self, token_budget=2000, history_budget=600, chunk_overlap=200, duplicate_threshold=0.85):
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.overlap_window = chunk_overlap * 2
+        self.duplicate_threshold = duplicate_threshold
+
+    # History ---------------------------------------------------------------
+    def pack_history(self, messages):
+        """Keep the newest messages that fit the history budget.
+
+        Returns (messages, tokens). If even the newest message is too long it
+        is truncated rather than dropped. A leading system message (the
+        conversation summary) is always kept and counted first.
+        """
+        pinned = messages[:1] if messages and messages[0].type == "system" else []
+        messages = messages[len(pinned):]
+        pinned_tokens = message_tokens(pinned)
+        budget = max(self.history_budget - pinned_tokens, 0)
+        kept, used = [], 0
+        for message in reversed(messages):
+            tokens = estimate_tokens(message.content)
+            if used + tokens > budget:
+                if not kept and budget:
+                    content = truncate_to_tokens(message.content, budget)
+                    kept.append(type(message)(content=content))
+                    used = estimate_tokens(content)
+                break
+            kept.append(message)
+            used += tokens
+        return pinned + list(reversed(kept)), pinned_tokens + used
+
+    # Context ---------------------------------------------------------------
+    @staticmethod
+    def _position(doc):
+        match = CHUNK_ID_PATTERN.match(doc.metadata.get("chunk_id", ""))
+        return (match.group(1), int(match.group(2))) if match else None
+
+    def merge_adjacent(self, docs):
+        """Stitch chunks that follow each other in the same book.
+
+        A merged run takes the rank of its best-ranked member.
+        """
+        positions = {idx: self._position(doc) for idx, doc in enumerate(docs)}
+        by_position = {pos: idx for idx, pos in positions.items() if pos is not None}
+        merged, consumed = [], set()
+        for idx, doc in enumerate(docs):
+            if idx in consumed:
+                continue
+            pos = positions[idx]
+            if pos is None:
+                merged.append(doc)
+                continue
+            # Walk back to the first chunk of the run, then forward to its end
+            stem, first = pos
+            while (stem, first - 1) in by_position and by_position[(stem, first - 1)] not in consumed:
+                first -= 1
+            text, last = None, first
+            while (stem, last) in by_position and by_position[(stem, last)] not in consumed:
+                member = by_position[(stem, last)]
+                consumed.add(member)
+                content = docs[member].page_content
+                text = content if text is None else join_overlapping(text, content, self.overlap_window)
+                last += 1
+            metadata = dict(doc.metadata, chunk_span=last - first)
+            # A stitched run spans from its first chunk's page to its last chunk's
+            if "page" in docs[by_position[(stem, first)]].metadata:
+                metadata["page"] = docs[by_position[(stem, first)]].metadata["page"]
+                last_metadata = docs[by_position[(stem, last - 1)]].metadata
+                metadata["page_end"] = last_metadata.get("page_end", last_metadata.get("page", metadata["page"]))
+            merged.append(Document(page_content=text, metadata=metadata))
+        return merged
+
+    def dedupe(self, docs):
+        """Drop chunks whose word set nearly matches a better-ranked one."""
+        kept, signatures = [], []
+        for doc in docs:
+            words = frozenset(WORD_PATTERN.findall(doc.page_content.lower()))
+            if any(len(words | other) and len(words & other) / len(words | other) >= self.duplicate_threshold
+                   for other in signatures):
+                continue
+            kept.append(doc)
+            signatures.append(words)
+        return kept
+
+    def pack_context(self, docs, budget):
+        """Fill the budget with merged, deduplicated chunks in rank order.
+
+        The first chunk that no longer fits is truncated into the remaining
+        space if that leaves a useful amount of text.
+        """
+        packed, used = [], 0
+        for doc in self.dedupe(self.merge_adjacent(docs)):
+            tokens = estimate_tokens(doc.page_content)
+            if used + tokens <= budget:
+                packed.append(doc)
+                used += tokens
+                continue
+            if budget - used >= 100:
+                content = truncate_to_tokens(doc.page_content, budget - used)
+                packed.append(Document(page_content=content, metadata=doc.metadata))
+                used += estimate_tokens(content)
+            break
+        return packed, used
+
@@ -0,0 +1,99 @@
+# ------------------------------------
+# Rolling Conversation Summary
+# ------------------------------------
+# Keeps long sessions coherent without growing the prompt. The prompt gets
+# the last few messages verbatim plus one compact summary of everything
+# before them. After each turn, a background thread folds the messages that
+# have just left the verbatim window into the session's summary (previous
+# summary + new messages -> new summary), capped at a token budget, and
+# stores it next to the history with the id of the last message it covers.
+# Requests never wait for it; until an update lands they use the previous
+# summary.
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import SystemMessage
+
+import metrics
+from context_packer import truncate_to_tokens
+
+logger = logging.getLogger("finance_chatbot")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+class ConversationMemory:
+    """Rolling per-session summaries, updated off the request path.
+
+    summarize(previous_summary, messages) returns the new summary text.
+    """
+
+    def __init__(self, store, summarize, verbatim_messages=4, summary_tokens=250, batch_messages=20):
+        self.store = store
+        self.summarize = summarize
+        self.verbatim_messages = verbatim_messages
+        self.summary_tokens = summary_tokens
+        self.batch_messages = batch_messages
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._dirty = set()
+        self.counters = {"updates": 0, "failures": 0}
+
+    def summary_message(self, session_id):
+        """The session's summary as a system message, or None before the first one."""
+        summary, _ = self.store.summary(session_id)
+        return SystemMessage(content=SUMMARY_PREFIX + summary) if summary else None
+
+    def schedule(self, session_id):
+        """Queue a summary update; a session has at most one queued or running."""
+        with self._lock:
+            if session_id in self._pending:
+                # Run once more when the current update finishes
+                self._dirty.add(session_id)
+                return
+            self._pending.add(session_id)
+        self._executor.submit(self._run, session_id)
+
+    def _run(self, session_id):
+        while True:
+            try:
+                self.update(session_id)
+            except Exception as e:
+                self.counters["failures"] += 1
+                logger.warning(f"Conversation summary update failed for session '{session_id}': {str(e)}")
+            with self._lock:
+                if session_id not in self._dirty:
+                    self._pending.discard(session_id)
+                    return
+                self._dirty.discard(session_id)
+
+    def update(self, session_id):
+        """Fold the messages older than the verbatim window into the summary.
+
+        Returns the number of messages summarized.
+        """
+        summary, covered_id = self.store.summary(session_id)
+        folded = 0
+        while True:
+            rows = self.store.messages_after(session_id, covered_id, self.batch_messages + self.verbatim_messages)
+            older = rows[:len(rows) - self.verbatim_messages][:self.batch_messages]
+            if not older:
+                return folded
+            start = time.perf_counter()
+            text = self.summarize(summary, [message for _, message in older])
+            summary = truncate_to_tokens(text.strip(), self.summary_tokens)
+            covered_id = older[-1][0]
+            self.store.save_summary(session_id, summary, covered_id)
+            metrics.stage_seconds.observe(time.perf_counter() - start, path="memory", stage="summary")
+            self.counters["updates"] += 1
+            folded += len(older)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "pending": len(self._pending)}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,242 @@
+# ------------------------------------
+# Memory-mapped Corpus Store
+# ------------------------------------
+# Replaces the flat datatext.txt. Every book's extracted text is written
+# back to back into one binary file (corpus.bin, UTF-8) and an offset index
+# (corpus.idx.npz) records where each book, page and chunk lives in it.
+# Chunks are stored as byte ranges into the page text rather than as copies,
+# so overlapping chunks cost nothing extra. The data file is opened through
+# mmap: a chunk is fetched by ID as a zero-copy memoryview, and every chunk
+# carries its source book and page numbers.
+import os
+import mmap
+import time
+import bisect
+import logging
+
+import numpy as np
+from langchain.schema import Document
+
+import ingestion
+
+logger = logging.getLogger("finance_chatbot")
+
+corpus_file = "corpus.bin"
+
+
+def index_path_for(path):
+    return os.path.splitext(path)[0] + ".idx.npz"
+
+
+def locate_chunks(text, chunks):
+    """Return the character start of each chunk in the book text, or -1.
+
+    Chunks come out of the splitter in order, so each search starts just
+    after the previous chunk's start.
+    """
+    starts, cursor = [], 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start == -1:
+            start = text.find(chunk)
+        starts.append(start)
+        if start != -1:
+            cursor = start + 1
+    return starts
+
+
+def byte_offsets(text, positions):
+    """Map character positions in text to UTF-8 byte offsets."""
+    offsets, char_pos, byte_pos = {}, 0, 0
+    for pos in sorted(set(positions)):
+        byte_pos += len(text[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        offsets[pos] = byte_pos
+    return offsets
+
+
+def build_corpus_store(manifest, path=None):
+    """Write the data file and offset index for every book in the manifest."""
+    path = path or corpus_file
+    start_time = time.time()
+    books, book_start, book_end, book_first_page, book_page_count = [], [], [], [], []
+    page_start, page_end = [], []
+    chunk_ids, chunk_book, chunk_start, chunk_end, chunk_page, chunk_page_end = [], [], [], [], [], []
+    separator_length = len(ingestion.page_separator)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        position = 0
+        for book_idx, pdf_file in enumerate(sorted(manifest.get("books", {}))):
+            text_path, _ = ingestion.book_paths(pdf_file)
+            # newline="" keeps stray carriage returns from the PDFs, as the chunker saw them
+            with open(text_path, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+            records = list(ingestion.iter_book_chunks(pdf_file))
+            chunk_texts = [record["text"] for record in records]
+            starts = locate_chunks(text, chunk_texts)
+
+            # Page boundaries in characters (the separator belongs to no page)
+            page_chars, cursor = [], 0
+            for page in text.split(ingestion.page_separator)[:manifest["books"][pdf_file].get("pages")]:
+                page_chars.append((cursor, cursor + len(page)))
+                cursor += len(page) + separator_length
+            positions = [p for bounds in page_chars for p in bounds] + [len(text)]
+            positions += [s for s in starts if s != -1] + [s + len(c) for s, c in zip(starts, chunk_texts) if s != -1]
+            offsets = byte_offsets(text, positions)
+
+            encoded = text.encode("utf-8")
+            out.write(encoded)
+            books.append(pdf_file)
+            book_start.append(position)
+            book_first_page.append(len(page_start))
+            book_page_count.append(len(page_chars))
+            page_starts = [position + offsets[s] for s, _ in page_chars]
+            page_start.extend(page_starts)
+            page_end.extend(position + offsets[e] for _, e in page_chars)
+
+            extra = position + len(encoded)
+            for record, start, content in zip(records, starts, chunk_texts):
+                if start == -1:
+                    # Not found verbatim in the book text - keep a copy after the book
+                    logger.warning(f"Chunk {record['id']} not found in {pdf_file} text. Storing a copy.")
+                    data = content.encode("utf-8")
+                    out.write(data)
+                    begin, end, first, last = extra, extra + len(data), 0, 0
+                    extra = end
+                else:
+                    begin, end = position + offsets[start], position + offsets[start + len(content)]
+                    first = bisect.bisect_right(page_starts, begin)
+                    last = bisect.bisect_right(page_starts, max(begin, end - 1))
+                chunk_ids.append(record["id"])
+                chunk_book.append(book_idx)
+                chunk_start.append(begin)
+                chunk_end.append(end)
+                chunk_page.append(first)
+                chunk_page_end.append(last)
+            position = extra
+            book_end.append(position)
+
+    chunk_ids = np.array(chunk_ids, dtype=str)
+    index = {
+        "books": np.array(books, dtype=str),
+        "book_start": np.array(book_start, dtype=np.int64),
+        "book_end": np.array(book_end, dtype=np.int64),
+        "book_first_page": np.array(book_first_page, dtype=np.int64),
+        "book_page_count": np.array(book_page_count, dtype=np.int64),
+        "page_start": np.array(page_start, dtype=np.int64),
+        "page_end": np.array(page_end, dtype=np.int64),
+        "chunk_ids": chunk_ids,
+        "chunk_order": np.argsort(chunk_ids, kind="stable").astype(np.int64),
+        "chunk_book": np.array(chunk_book, dtype=np.int32),
+        "chunk_start": np.array(chunk_start, dtype=np.int64),
+        "chunk_end": np.array(chunk_end, dtype=np.int64),
+        "chunk_page": np.array(chunk_page, dtype=np.int32),
+        "chunk_page_end": np.array(chunk_page_end, dtype=np.int32),
+        "data_size": np.array([position], dtype=np.int64),
+        "fingerprint": np.array([ingestion.corpus_fingerprint(manifest)]),
+    }
+    index_path = index_path_for(path)
+    np.savez(index_path + ".tmp.npz", **index)
+    os.replace(tmp_path, path)
+    os.replace(index_path + ".tmp.npz", index_path)
+    logger.info(f"Built corpus store '{path}' ({len(books)} books, {len(page_start)} pages, "
+                f"{len(chunk_ids)} chunks, {position / 1e6:.1f} MB) in {time.time() - start_time:.2f}s")
+
+
+def open_corpus_store(manifest=None, path=None):
+    """Open the corpus store, rebuilding it first if the corpus has changed."""
+    manifest = manifest or ingestion.load_manifest()
+    path = path or corpus_file
+    fingerprint = ingestion.corpus_fingerprint(manifest)
+    if os.path.exists(path) and os.path.exists(index_path_for(path)):
+        try:
+            store = CorpusStore(path)
+            if store.fingerprint == fingerprint:
+                return store
+            store.close()
+            logger.info("Corpus changed since the corpus store was built. Rebuilding.")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Corpus store unreadable ({e}). Rebuilding.")
+    build_corpus_store(manifest, path)
+    return CorpusStore(path)
+
+
+class CorpusStore:
+    """Read-only view of corpus.bin through mmap and its offset index."""
+
+    def __init__(self, path=None):
+        path = path or corpus_file
+        with np.load(index_path_for(path), allow_pickle=False) as index:
+            for name in index.files:
+                setattr(self, name, index[name])
+        self.fingerprint = str(self.fingerprint[0])
+        self._sorted_ids = self.chunk_ids[self.chunk_order]
+        self._book_rows = {str(name): row for row, name in enumerate(self.books)}
+
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size != int(self.data_size[0]):
+            self._file.close()
+            raise ValueError(f"data file is {size} bytes, index expects {int(self.data_size[0])}")
+        # mmap can't map an empty file
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.data = memoryview(self._mmap)
+
+    def close(self):
+        self.data.release()
+        if self._mmap:
+            self._mmap.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    # Chunks ----------------------------------------------------------------
+    def _row(self, chunk_id):
+        pos = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == chunk_id:
+            return int(self.chunk_order[pos])
+        return None
+
+    def __contains__(self, chunk_id):
+        return self._row(chunk_id) is not None
+
+    def chunk_bytes(self, chunk_id):
+        """Zero-copy memoryview of a chunk's UTF-8 bytes."""
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self.data[self.chunk_start[row]:self.chunk_end[row]]
+
+    def chunk_text(self, chunk_id):
+        return str(self.chunk_bytes(chunk_id), "utf-8")
+
+    def chunk_metadata(self, chunk_id):
+        """Source book and 1-based page range of a chunk (page 0 if unknown)."""
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return {"source": str(self.books[self.chunk_book[row]]), "chunk_id": chunk_id,
+                "page": int(self.chunk_page[row]), "page_end": int(self.chunk_page_end[row])}
+
+    def document(self, chunk_id):
+        return Document(page_content=self.chunk_text(chunk_id), metadata=self.chunk_metadata(chunk_id))
+
+    def book_chunk_ids(self, pdf_file):
+        row = self._book_rows[pdf_file]
+        return [str(chunk_id) for chunk_id in self.chunk_ids[self.chunk_book == row]]
+
+    def iter_chunks(self):
+        """Yield (chunk_id, text) for every chunk in corpus order."""
+        for row, chunk_id in enumerate(self.chunk_ids):
+            yield str(chunk_id), str(self.data[self.chunk_start[row]:self.chunk_end[row]], "utf-8")
+
+    # Pages -----------------------------------------------------------------
+    def page_text(self, pdf_file, page):
+        """Text of a book's page, numbered from 1."""
+        row = self._book_rows[pdf_file]
+        if not 1 <= page <= self.book_page_count[row]:
+            raise IndexError(f"{pdf_file} has no page {page}")
+        idx = self.book_first_page[row] + page - 1
+        return str(self.data[self.page_start[idx]:self.page_end[idx]], "utf-8")
@@ -0,0 +1,209 @@
+# ------------------------------------
+# Batched, Resumable Embedding Builder
+# ------------------------------------
+# Embeds chunks in batches over a bounded worker pool, retrying with
+# exponential backoff when the provider rate-limits or fails. Finished chunk
+# IDs are checkpointed after every batch so an interrupted build resumes
+# where it stopped, and identical chunk texts are only embedded once.
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("finance_chatbot")
+
+
+class LocalHashEmbeddings(Embeddings):
+    """Deterministic offline embedder based on feature hashing.
+
+    Stands in for GoogleGenerativeAIEmbeddings in tests and offline builds:
+    the same text always maps to the same unit vector, and texts that share
+    words end up close together.
+    """
+
+    def __init__(self, size=768):
+        self.size = size
+
+    def _embed(self, text):
+        vector = [0.0] * self.size
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def chroma_sink(vectorstore):
+    """Return a sink that writes pre-computed embeddings into a Chroma store."""
+    def sink(ids, texts, embeddings, metadatas):
+        vectorstore._collection.upsert(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+    return sink
+
+
+class EmbeddingBuilder:
+    """Embed chunks in checkpointed batches and hand them to a sink.
+
+    `embeddings` is any LangChain Embeddings backend; `sink` is called as
+    sink(ids, texts, vectors, metadatas) once per finished batch.
+    """
+
+    def __init__(self, embeddings, sink, checkpoint_file, batch_size=64, max_workers=4,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+
+    # Checkpoint handling ---------------------------------------------------
+    def load_checkpoint(self, build_key):
+        """Return the chunk IDs already finished for this build.
+
+        A checkpoint left by another build is truncated and restarted under
+        this build's key, so a later resume reads the right header. A torn
+        final line from an interrupted write is cut off.
+        """
+        done, header, good_size = set(), None, 0
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    good_size += len(line)
+                    if "build_key" in record:
+                        header = record["build_key"]
+                    elif header == build_key:
+                        done.update(record.get("ids", []))
+            if header == build_key:
+                if good_size < os.path.getsize(self.checkpoint_file):
+                    with open(self.checkpoint_file, "rb+") as f:
+                        f.truncate(good_size)
+                return done
+            if header is not None:
+                logger.info("Embedding checkpoint belongs to another build. Starting over.")
+        with open(self.checkpoint_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"build_key": build_key}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return set()
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def _append_checkpoint(self, record):
+        with open(self.checkpoint_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Embedding -------------------------------------------------------------
+    def _embed_with_backoff(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                # Stop retrying once another batch has failed for good
+                if attempt == self.max_retries or self._failed.is_set():
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)  # Jitter so workers don't retry in lockstep
+                logger.warning(f"Embedding batch failed ({e}). Retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _run_batch(self, batch):
+        if self._failed.is_set():
+            # Another batch already failed the build
+            return 0, 0
+        texts = [group["text"] for group in batch]
+        try:
+            vectors = self._embed_with_backoff(texts)
+        except Exception:
+            self._failed.set()
+            raise
+
+        ids, docs, embeds, metas = [], [], [], []
+        for group, vector in zip(batch, vectors):
+            for chunk_id, metadata in zip(group["ids"], group["metadatas"]):
+                ids.append(chunk_id)
+                docs.append(group["text"])
+                embeds.append(vector)
+                metas.append(metadata)
+
+        # The sink and checkpoint are shared by all workers
+        with self._lock:
+            self.sink(ids, docs, embeds, metas)
+            self._append_checkpoint({"ids": ids})
+        return len(texts), len(ids)
+
+    def build(self, ids, texts, metadatas=None, build_key=""):
+        """Embed every chunk not yet in the checkpoint and write it to the sink.
+
+        Returns a dict of counts: total chunks, chunks skipped from the
+        checkpoint, unique texts embedded and chunks written. When a batch
+        fails for good the queued batches are cancelled and the error is
+        raised; the finished ones stay in the checkpoint.
+        """
+        start_time = time.time()
+        metadatas = metadatas or [{} for _ in ids]
+        done = self.load_checkpoint(build_key)
+
+        # Group pending chunks by text hash so duplicates are embedded once
+        groups = {}
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            if chunk_id in done:
+                continue
+            key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            group = groups.setdefault(key, {"text": text, "ids": [], "metadatas": []})
+            group["ids"].append(chunk_id)
+            group["metadatas"].append(metadata)
+
+        pending = list(groups.values())
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        stats = {"total": len(ids), "skipped": len(done & set(ids)), "embedded": 0, "written": 0}
+
+        if batches:
+            logger.info(f"Embedding {len(pending)} unique chunk(s) in {len(batches)} batch(es) "
+                        f"({stats['skipped']} already done)...")
+        self._failed.clear()
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            futures = [pool.submit(self._run_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    embedded, written = future.result()
+                except Exception:
+                    # Don't spend quota on queued batches once the build has failed
+                    cancelled = sum(other.cancel() for other in futures)
+                    if cancelled:
+                        logger.warning(f"Embedding batch failed. Cancelled {cancelled} queued batch(es).")
+                    raise
+                stats["embedded"] += embedded
+                stats["written"] += written
+
+        logger.info(f"Embedded {stats['embedded']} unique text(s) for {stats['written']} chunk(s) "
+                    f"in {time.time() - start_time:.2f}s")
+        return stats
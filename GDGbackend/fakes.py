@@ -0,0 +1,211 @@
+# ------------------------------------
+# Local Fakes for Offline Runs
+# ------------------------------------
+# Stand-ins for the Gemini clients so the chat pipeline can be exercised
+# without network access or API keys. Every fake is deterministic and has a
+# configurable latency. The fault injector makes them fail or stall like a
+# provider incident (FAKE_FAULT_RATE, FAKE_FAULT_MODE, FAKE_FAULT_STALL_S,
+# FAKE_FAULT_TARGETS), to exercise the circuit breakers offline.
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import itertools
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from embedding_builder import LocalHashEmbeddings
+
+DEFAULT_FAKE_ANSWER = (
+    "A stock represents a share of ownership in a company. "
+    "Investors buy stocks hoping the price rises or the company pays dividends. "
+    "Remember that past performance doesn't guarantee future results."
+)
+
+
+class FakeProviderError(RuntimeError):
+    """An error injected in place of a provider response."""
+
+
+class FaultInjector:
+    """Fails or stalls a fraction of fake provider calls.
+
+    mode "error" raises FakeProviderError, "stall" sleeps `stall` seconds
+    before answering. `targets` limits the faults to some of "llm",
+    "embeddings" and "quiz". configure() changes them at runtime.
+    """
+
+    def __init__(self, rate=0.0, mode="error", stall=30.0, targets=("llm", "embeddings", "quiz")):
+        self.configure(rate, mode, stall, targets)
+        self.injected = 0
+
+    def configure(self, rate=None, mode=None, stall=None, targets=None):
+        if rate is not None:
+            self.rate = rate
+        if mode is not None:
+            self.mode = mode
+        if stall is not None:
+            self.stall = stall
+        if targets is not None:
+            self.targets = set(targets)
+
+    def _hit(self, target):
+        if target in self.targets and self.rate and random.random() < self.rate:
+            self.injected += 1
+            if self.mode == "error":
+                raise FakeProviderError(f"injected {target} provider error")
+            return True
+        return False
+
+    def inject(self, target):
+        if self._hit(target):
+            time.sleep(self.stall)
+
+    async def ainject(self, target):
+        if self._hit(target):
+            await asyncio.sleep(self.stall)
+
+
+faults = FaultInjector(rate=float(os.getenv("FAKE_FAULT_RATE", 0)), mode=os.getenv("FAKE_FAULT_MODE", "error"),
+                       stall=float(os.getenv("FAKE_FAULT_STALL_S", 30)),
+                       targets=os.getenv("FAKE_FAULT_TARGETS", "llm,embeddings,quiz").split(","))
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Chat model that answers with a fixed text, one word-token at a time.
+
+    `first_token_delay` simulates time-to-first-token and `token_delay` the
+    gap between tokens, so streaming and timing code can be tested locally.
+    """
+
+    response: str = DEFAULT_FAKE_ANSWER
+    first_token_delay: float = 0.2
+    token_delay: float = 0.02
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming-chat"
+
+    def _tokens(self):
+        words = self.response.split(" ")
+        return [word + (" " if idx < len(words) - 1 else "") for idx, word in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        faults.inject("llm")
+        time.sleep(self.first_token_delay + self.token_delay * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        faults.inject("llm")
+        time.sleep(self.first_token_delay)
+        for idx, token in enumerate(self._tokens()):
+            if idx:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await faults.ainject("llm")
+        await asyncio.sleep(self.first_token_delay + self.token_delay * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await faults.ainject("llm")
+        await asyncio.sleep(self.first_token_delay)
+        for idx, token in enumerate(self._tokens()):
+            if idx:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeRemoteEmbeddings(LocalHashEmbeddings):
+    """LocalHashEmbeddings with a simulated round trip and call counters.
+
+    `delay` is slept once per embedding request, standing in for the
+    GoogleGenerativeAIEmbeddings network call.
+    """
+
+    model = "fake/embedding"
+
+    def __init__(self, size=768, delay=0.1):
+        super().__init__(size)
+        self.delay = delay
+        self.calls = {"queries": 0, "documents": 0}
+
+    def embed_documents(self, texts):
+        self.calls["documents"] += 1
+        faults.inject("embeddings")
+        time.sleep(self.delay)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls["queries"] += 1
+        faults.inject("embeddings")
+        time.sleep(self.delay)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text):
+        self.calls["queries"] += 1
+        await faults.ainject("embeddings")
+        await asyncio.sleep(self.delay)
+        return super().embed_query(text)
+
+
+FAKE_TERMS = ["liquidity", "dividends", "inflation", "diversification", "amortization", "equity", "yield",
+              "premiums", "deductibles", "escrow", "annuities", "volatility", "leverage", "principal",
+              "collateral", "index funds", "credit scores", "compounding", "rebalancing"]
+FAKE_AUDIENCES = ["students", "retirees", "freelancers", "renters", "homeowners", "parents", "couples",
+                  "graduates", "savers", "travelers", "employees", "founders"]
+
+
+class FakeGenerateContentResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel that returns quiz JSON.
+
+    Reads the question count and topics from the quiz prompt and answers
+    after `delay` seconds with that many valid, distinct questions.
+    """
+
+    _serial = itertools.count(1)
+
+    def __init__(self, model_name="fake-gemini", delay=0.5):
+        self.model_name = model_name
+        self.delay = delay
+
+    def _questions(self, prompt):
+        match = re.search(r"Generate (\d+) .*? questions about (.*?) at an? (\w+) level", prompt)
+        count, topic, level = (int(match.group(1)), match.group(2), match.group(3)) if match else (3, "finance", "basic")
+        questions = []
+        for idx in range(1, count + 1):
+            serial = next(self._serial)
+            questions.append({
+                "id": idx,
+                "question": f"Question {serial}: what does {FAKE_TERMS[serial % len(FAKE_TERMS)]} mean for "
+                            f"{FAKE_AUDIENCES[serial // len(FAKE_TERMS) % len(FAKE_AUDIENCES)]} in {topic} ({level})?",
+                "options": [f"Statement {serial}{letter}" for letter in "abcd"],
+                "correctAnswer": serial % 4,
+            })
+        return json.dumps(questions)
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        faults.inject("quiz")
+        time.sleep(self.delay)
+        return FakeGenerateContentResponse(self._questions(prompt))
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        await faults.ainject("quiz")
+        await asyncio.sleep(self.delay)
+        return FakeGenerateContentResponse(self._questions(prompt))
@@ -0,0 +1,35 @@
+# ------------------------------------
+# Preforking Server Configuration
+# ------------------------------------
+# gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# The master loads the app and the read-only resources (synced corpus,
+# memory-mapped corpus store, lexical index) once before forking, so every
+# worker shares them copy-on-write. Each worker then opens its own vector
+# store, SQLite connections, LLM client and quiz pool (none of which survive
+# a fork) before it accepts requests. Each worker also logs through its own
+# listener to its own file (finance_chatbot_YYYYMMDD-<pid>.log). With VECTOR_BACKEND=mmap the vector
+# store is a memory-mapped export instead, shared through the page cache.
+#
+# Workers open the vector store in parallel, so build or update it once
+# beforehand when the corpus has changed:
+#   python -c "import practice; practice.init_resources()"
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("WEB_THREADS", 8))
+timeout = int(os.getenv("WEB_TIMEOUT", 60))
+preload_app = True
+
+
+def on_starting(server):
+    import practice
+    practice.preload_resources()
+
+
+def post_worker_init(worker):
+    import practice
+    import app
+    practice.init_resources()
+    app.get_quiz_pool()
@@ -0,0 +1,120 @@
+# ------------------------------------
+# Session-Keyed Chat History Store
+# ------------------------------------
+# Append-only SQLite store (WAL mode) holding one row per message, keyed by
+# session. Each turn is a single two-row insert and reads only fetch the last
+# N messages of one session, so per-turn cost stays flat however much history
+# accumulates. A second table holds each session's rolling summary and the
+# last message it covers (see conversation_memory.py).
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+logger = logging.getLogger("finance_chatbot")
+
+DEFAULT_SESSION = "default"
+
+
+class ChatHistoryStore:
+    """Per-session chat history backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "type TEXT NOT NULL, content TEXT NOT NULL, created REAL DEFAULT (julianday('now')))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, covered_id INTEGER NOT NULL, "
+            "updated REAL DEFAULT (julianday('now')))"
+        )
+        conn.commit()
+
+    def _conn(self):
+        # SQLite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_turn(self, session_id, user_message, ai_message):
+        """Append one human/AI exchange to a session."""
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO messages (session_id, type, content) VALUES (?, ?, ?)",
+                [(session_id, "human", user_message), (session_id, "ai", ai_message)])
+
+    def recent(self, session_id, limit):
+        """Return the last `limit` messages of a session, oldest first."""
+        rows = self._conn().execute(
+            "SELECT type, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit)).fetchall()
+        return [HumanMessage(content=content) if msg_type == "human" else AIMessage(content=content)
+                for msg_type, content in reversed(rows)]
+
+    def messages_after(self, session_id, after_id, limit=200):
+        """Return up to `limit` (id, message) pairs after a message id, oldest first."""
+        rows = self._conn().execute(
+            "SELECT id, type, content FROM messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (session_id, after_id, limit)).fetchall()
+        return [(row_id, HumanMessage(content=content) if msg_type == "human" else AIMessage(content=content))
+                for row_id, msg_type, content in rows]
+
+    def summary(self, session_id):
+        """Return a session's (summary, id of the last message it covers), or ("", 0)."""
+        row = self._conn().execute(
+            "SELECT summary, covered_id FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def save_summary(self, session_id, summary, covered_id):
+        """Store a summary unless a newer one exists or the session was cleared meanwhile."""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO summaries (session_id, summary, covered_id) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM messages WHERE id = ? AND session_id = ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET summary = excluded.summary, "
+                "covered_id = excluded.covered_id, updated = julianday('now') "
+                "WHERE excluded.covered_id > summaries.covered_id",
+                (session_id, summary, covered_id, covered_id, session_id))
+
+    def clear(self, session_id):
+        """Delete every message of a session, and its summary."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+
+    def import_legacy_json(self, history_file, session_id=DEFAULT_SESSION):
+        """One-time import of the old global chat_history.json into a session."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM store_meta WHERE key = 'legacy_imported'").fetchone():
+            return 0
+        messages = []
+        if os.path.exists(history_file):
+            try:
+                with open(history_file, "r") as f:
+                    messages = [(session_id, msg.get("type"), msg.get("content", ""))
+                                for msg in json.load(f) if msg.get("type") in ("human", "ai")]
+            except json.JSONDecodeError:
+                logger.warning("Chat history file is empty or corrupted. Skipping import.")
+        with conn:
+            conn.executemany("INSERT INTO messages (session_id, type, content) VALUES (?, ?, ?)", messages)
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('legacy_imported', ?)", (history_file,))
+        if messages:
+            logger.info(f"Imported {len(messages)} messages from '{history_file}' into session '{session_id}'.")
+        return len(messages)
@@ -0,0 +1,324 @@
+# ------------------------------------
+# Incremental PDF Ingestion
+# ------------------------------------
+# Keeps a manifest of every book in the PDF folder (size, mtime and content
+# hash) so that only added, changed or removed books are re-extracted and
+# re-chunked. Page extraction is spread over a process pool.
+import os
+import json
+import hashlib
+import logging
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+
+logger = logging.getLogger("finance_chatbot")
+
+# Version 2 keys extracted files and chunk IDs by the book's relative path
+MANIFEST_VERSION = 2
+manifest_file = "ingest_manifest.json"
+extract_dir = "extracted"
+page_separator = "\n" + "=" * 80 + "\n"
+
+# Large books are split into page ranges so one long PDF doesn't hold up the pool
+pages_per_task = int(os.getenv("INGEST_PAGES_PER_TASK", 100))
+max_workers = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+
+chunk_size = 1000
+chunk_overlap = 200
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=None):
+    """Load the ingestion manifest, or return an empty one."""
+    path = path or manifest_file
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+            logger.warning("Ingestion manifest version changed. Rebuilding corpus.")
+        except json.JSONDecodeError:
+            logger.warning("Ingestion manifest is corrupted. Rebuilding corpus.")
+    return {"version": MANIFEST_VERSION, "books": {}}
+
+
+def save_manifest(manifest, path=None):
+    """Atomically write the ingestion manifest."""
+    path = path or manifest_file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan_changes(pdf_folder, manifest):
+    """Compare the PDF folder against the manifest.
+
+    Size and mtime are checked first; the content hash is only computed when
+    they differ, so an unchanged corpus is detected without reading any PDF.
+    Returns a dict of added, changed, removed and unchanged book names, plus
+    the fresh file stats for every book on disk.
+    """
+    known = manifest.get("books", {})
+    pdf_files = sorted(f for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf"))
+
+    plan = {"added": [], "changed": [], "removed": [], "unchanged": [], "stats": {}}
+    for pdf_file in pdf_files:
+        stat = os.stat(os.path.join(pdf_folder, pdf_file))
+        stats = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry = known.get(pdf_file)
+
+        if entry and entry.get("size") == stats["size"] and entry.get("mtime_ns") == stats["mtime_ns"]:
+            stats["sha256"] = entry["sha256"]
+            plan["unchanged"].append(pdf_file)
+        else:
+            stats["sha256"] = file_sha256(os.path.join(pdf_folder, pdf_file))
+            if entry is None:
+                plan["added"].append(pdf_file)
+            elif entry.get("sha256") == stats["sha256"]:
+                # Touched but identical content - only the stats need refreshing
+                plan["unchanged"].append(pdf_file)
+            else:
+                plan["changed"].append(pdf_file)
+        plan["stats"][pdf_file] = stats
+
+    plan["removed"] = sorted(set(known) - set(pdf_files))
+    return plan
+
+
+def extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end) from a PDF. Runs in a worker process."""
+    import fitz  # PyMuPDF for PDF extraction
+
+    doc = fitz.open(pdf_path)
+    try:
+        return [doc[page_num].get_text() for page_num in range(start, min(end, len(doc)))]
+    finally:
+        doc.close()
+
+
+def count_pages(pdf_path):
+    """Return the number of pages in a PDF."""
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def book_key(pdf_file):
+    """Return the key a book's chunk IDs are derived from.
+
+    This is the book's path relative to the PDF folder (extension included),
+    NFC-normalized and with forward slashes, so it is the same on every
+    platform and two books never share one.
+    """
+    return unicodedata.normalize("NFC", pdf_file).replace(os.sep, "/")
+
+
+def book_paths(pdf_file):
+    """Return the per-book extracted text and chunk file paths.
+
+    The file names carry a hash of the book key, so books whose names only
+    differ in case don't overwrite each other on case-insensitive filesystems.
+    """
+    key = book_key(pdf_file)
+    stem = os.path.splitext(os.path.basename(key))[0]
+    name = f"{stem}.{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}"
+    return (os.path.join(extract_dir, f"{name}.txt"),
+            os.path.join(extract_dir, f"{name}.chunks.jsonl"))
+
+
+def chunk_book(pdf_file, text, splitter):
+    """Split one book's text into chunks and write them as JSON lines."""
+    _, chunks_path = book_paths(pdf_file)
+    key = book_key(pdf_file)
+    chunks = splitter.split_text(text)
+
+    with open(chunks_path, "w", encoding="utf-8") as f:
+        for idx, chunk in enumerate(chunks):
+            record = {
+                "id": f"{key}-{idx:05d}",
+                "source": pdf_file,
+                "sha256": hashlib.sha256(chunk.encode("utf-8")).hexdigest(),
+                "text": chunk,
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return len(chunks)
+
+
+def extract_books(pdf_folder, pdf_files):
+    """Extract every page of the given books over a process pool.
+
+    Returns a dict mapping book name to its list of page texts. Books that
+    fail to open are logged and left out.
+    """
+    tasks = []
+    for pdf_file in pdf_files:
+        pdf_path = os.path.join(pdf_folder, pdf_file)
+        try:
+            page_count = count_pages(pdf_path)
+        except Exception as e:
+            logger.error(f"Error opening {pdf_file}: {e}")
+            continue
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((pdf_file, start, start + pages_per_task))
+        if page_count == 0:
+            tasks.append((pdf_file, 0, 0))
+
+    pages = {pdf_file: {} for pdf_file, _, _ in tasks}
+    failed = set()
+    workers = max(1, min(max_workers, len(tasks)))
+
+    if workers == 1:
+        for pdf_file, start, end in tasks:
+            try:
+                pages[pdf_file][start] = extract_page_range(os.path.join(pdf_folder, pdf_file), start, end)
+            except Exception as e:
+                logger.error(f"Error extracting {pdf_file} from page {start}: {e}")
+                failed.add(pdf_file)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract_page_range, os.path.join(pdf_folder, pdf_file), start, end): (pdf_file, start)
+                       for pdf_file, start, end in tasks}
+            for future, (pdf_file, start) in futures.items():
+                try:
+                    pages[pdf_file][start] = future.result()
+                except Exception as e:
+                    logger.error(f"Error extracting {pdf_file} from page {start}: {e}")
+                    failed.add(pdf_file)
+
+    extracted = {}
+    for pdf_file, ranges in pages.items():
+        if pdf_file in failed:
+            continue
+        extracted[pdf_file] = [text for start in sorted(ranges) for text in ranges[start]]
+        logger.info(f"[SUCCESS] Extracted text from {pdf_file}")
+    return extracted
+
+
+def sync_corpus(pdf_folder):
+    """Bring the extracted corpus up to date with the PDF folder.
+
+    Only added and changed books are extracted and chunked; removed books
+    have their extracted files deleted. Returns the change plan, or None if
+    the folder is missing or has no PDFs.
+    """
+    if not os.path.exists(pdf_folder):
+        logger.error("Error: PDF folder not found!")
+        return None
+
+    start_time = time.time()
+    os.makedirs(extract_dir, exist_ok=True)
+    manifest = load_manifest()
+    plan = plan_changes(pdf_folder, manifest)
+
+    if not plan["stats"]:
+        logger.error("Error: No PDF files found in the folder!")
+        return None
+
+    books = manifest.setdefault("books", {})
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunking_changed = (manifest.get("chunk_size"), manifest.get("chunk_overlap")) != (chunk_size, chunk_overlap)
+
+    for pdf_file in plan["removed"]:
+        for path in book_paths(pdf_file):
+            if os.path.exists(path):
+                os.remove(path)
+        books.pop(pdf_file, None)
+        logger.info(f"Removed {pdf_file} from corpus")
+
+    # Books whose extracted files went missing are treated as changed
+    for pdf_file in list(plan["unchanged"]):
+        if not all(os.path.exists(path) for path in book_paths(pdf_file)):
+            plan["unchanged"].remove(pdf_file)
+            plan["changed"].append(pdf_file)
+
+    to_extract = plan["added"] + plan["changed"]
+    if to_extract:
+        logger.info(f"Extracting text from {len(to_extract)} PDF(s)...")
+    with metrics.stage_seconds.time(path="ingest", stage="extract"):
+        extracted = extract_books(pdf_folder, to_extract)
+
+    for pdf_file in to_extract:
+        if pdf_file not in extracted:
+            books.pop(pdf_file, None)
+            continue
+        page_texts = extracted[pdf_file]
+        text = "".join(page + page_separator for page in page_texts)
+        text_path, _ = book_paths(pdf_file)
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        with metrics.stage_seconds.time(path="ingest", stage="chunk"):
+            chunks = chunk_book(pdf_file, text, splitter)
+        books[pdf_file] = dict(plan["stats"][pdf_file], pages=len(page_texts), chunks=chunks)
+
+    for pdf_file in plan["unchanged"]:
+        entry = books[pdf_file]
+        entry.update(plan["stats"][pdf_file])
+        if chunking_changed:
+            text_path, _ = book_paths(pdf_file)
+            with open(text_path, "r", encoding="utf-8", newline="") as f, \
+                    metrics.stage_seconds.time(path="ingest", stage="chunk"):
+                entry["chunks"] = chunk_book(pdf_file, f.read(), splitter)
+
+    if chunking_changed and plan["unchanged"]:
+        logger.info("Chunking parameters changed. Re-chunked unchanged books.")
+
+    manifest["chunk_size"] = chunk_size
+    manifest["chunk_overlap"] = chunk_overlap
+    save_manifest(manifest)
+
+    if to_extract or plan["removed"]:
+        logger.info(f"Corpus updated in {time.time() - start_time:.2f}s "
+                    f"(added: {len(plan['added'])}, changed: {len(plan['changed'])}, removed: {len(plan['removed'])}). "
+                    f"Extracted text saved in '{extract_dir}'.")
+    else:
+        logger.info(f"Corpus is up to date ({len(books)} books). Skipping PDF extraction.")
+
+    return plan
+
+
+def corpus_fingerprint(manifest=None):
+    """Return a hash identifying the current chunked corpus.
+
+    Built from the manifest alone (book hashes, chunk counts and chunking
+    parameters), so it can be checked without reading any corpus text.
+    """
+    manifest = manifest or load_manifest()
+    digest = hashlib.sha256()
+    digest.update(f"{manifest.get('version')}:{manifest.get('chunk_size')}:{manifest.get('chunk_overlap')}".encode("utf-8"))
+    for pdf_file, entry in sorted(manifest.get("books", {}).items()):
+        digest.update(f"|{pdf_file}:{entry.get('sha256')}:{entry.get('chunks')}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_book_chunks(pdf_file):
+    """Yield the chunk records written for one book."""
+    _, chunks_path = book_paths(pdf_file)
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def book_chunk_ids(pdf_file, chunk_count):
+    """Return the chunk IDs of a book without reading its chunk file."""
+    key = book_key(pdf_file)
+    return [f"{key}-{idx:05d}" for idx in range(chunk_count)]
@@ -0,0 +1,68 @@
+# ------------------------------------
+# Precompiled Finance Intent Classifier
+# ------------------------------------
+# All intent keywords are compiled once into a single alternation and the
+# query is scanned a single time. Each matched keyword credits every intent
+# it belongs to, so the result is a score per intent instead of the first
+# pattern that happens to match.
+import re
+
+# Same keyword lists as the original per-intent regexes, in priority order
+INTENT_KEYWORDS = {
+    "investment_advice": ["invest", "stock", "bond", "etf", "portfolio", "dividend", "market", "return", "risk", "asset"],
+    "budgeting": ["budget", "spend", "saving", "expense", "income", "track", "money", "financial plan", "cash flow"],
+    "debt": ["debt", "loan", "credit", "mortgage", "interest", "payment", "borrow", "lend", "finance", "leverage"],
+    "retirement": ["retire", "401k", "ira", "pension", "social security", "annuity", "future", "nest egg"],
+    "tax": ["tax", "deduction", "filing", "return", "irs", "write-off", "capital gain", "liability", "exemption"],
+    "insurance": ["insurance", "policy", "coverage", "premium", "deductible", "claim", "risk management", "protection"],
+    "financial_planning": ["plan", "goal", "future", "strategy", "wealth", "net worth", "financial freedom", "independence"],
+    "calculator": ["calculate", "computation", "formula", "interest", "payment", "return", "yield", "rate", "compound"],
+}
+
+DEFAULT_INTENT = "general"
+
+
+class IntentClassifier:
+    """Single-pass keyword classifier over a precompiled alternation."""
+
+    def __init__(self, intent_keywords=INTENT_KEYWORDS):
+        self.priority = {intent: idx for idx, intent in enumerate(intent_keywords)}
+
+        keyword_intents = {}
+        for intent, keywords in intent_keywords.items():
+            for keyword in keywords:
+                keyword_intents.setdefault(keyword, []).append(intent)
+
+        # A multi-word keyword hides any shorter keyword inside it from the scan
+        # ("risk management" contains "risk"), so credit those intents too
+        for keyword, intents in keyword_intents.items():
+            for other, other_intents in keyword_intents.items():
+                if other != keyword and re.search(r"\b" + re.escape(other) + r"\b", keyword):
+                    intents.extend(i for i in other_intents if i not in intents)
+
+        self.keyword_intents = keyword_intents
+        # Longest keywords first so multi-word phrases win over their parts
+        alternation = "|".join(re.escape(k) for k in sorted(keyword_intents, key=len, reverse=True))
+        self.pattern = re.compile(r"\b(?:" + alternation + r")\b", re.IGNORECASE)
+
+    def scores(self, text):
+        """Return {intent: number of keyword hits} for every matching intent."""
+        scores = {}
+        for match in self.pattern.finditer(text):
+            for intent in self.keyword_intents[match.group(0).lower()]:
+                scores[intent] = scores.get(intent, 0) + 1
+        return scores
+
+    def ranked(self, text):
+        """Return [(intent, score)] best first; ties keep the original priority order."""
+        scores = self.scores(text)
+        if not scores:
+            return [(DEFAULT_INTENT, 0)]
+        return sorted(scores.items(), key=lambda item: (-item[1], self.priority[item[0]]))
+
+    def classify(self, text):
+        """Return the single best intent for a query."""
+        return self.ranked(text)[0][0]
+
+
+classifier = IntentClassifier()
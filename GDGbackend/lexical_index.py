@@ -0,0 +1,179 @@
+# ------------------------------------
+# Local Lexical (BM25) Index
+# ------------------------------------
+# An inverted index over the same chunks the vector store holds, scored with
+# BM25. It is built from the corpus store and saved as one .npz of flat
+# arrays (sorted vocabulary, term offsets, postings, document lengths and
+# chunk IDs), so loading it is a handful of array reads and a lookup needs
+# no network at all. Hit texts are read from the corpus store. fuse_results() combines lexical and
+# vector hits for hybrid retrieval.
+import os
+import re
+import time
+import logging
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger("finance_chatbot")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_TOKEN_LENGTH = 32
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can could do does for from has have how i if in into is it its
+me my of on or should so than that the their them then there these they this to was what when where
+which who why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords (and run-on junk tokens) removed."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if token not in STOPWORDS and len(token) <= MAX_TOKEN_LENGTH]
+
+
+class LexicalIndex:
+    """BM25 inverted index held as flat NumPy arrays."""
+
+    def __init__(self, arrays, corpus, k1=1.2, b=0.75):
+        self.terms = arrays["terms"]
+        self.term_offsets = arrays["term_offsets"]
+        self.postings_docs = arrays["postings_docs"]
+        self.postings_tf = arrays["postings_tf"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self.chunk_ids = arrays["chunk_ids"]
+        self.corpus = corpus
+        self.fingerprint = str(arrays["fingerprint"][0])
+        self.k1 = k1
+        self.b = b
+
+        self.doc_count = len(self.doc_lengths)
+        avg_length = self.doc_lengths.mean() if self.doc_count else 1.0
+        # Per-document BM25 length normalisation, computed once
+        self._norm = (k1 * (1 - b + b * self.doc_lengths / avg_length)).astype(np.float32)
+        df = np.diff(self.term_offsets).astype(np.float32)
+        self._idf = np.log1p((self.doc_count - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    # Build & persistence ---------------------------------------------------
+    @classmethod
+    def build(cls, corpus, **kwargs):
+        """Index every chunk in the corpus store."""
+        postings = {}
+        doc_lengths, chunk_ids = [], []
+        for chunk_id, text in corpus.iter_chunks():
+            doc = len(chunk_ids)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+            doc_lengths.append(len(tokens))
+            chunk_ids.append(chunk_id)
+
+        terms = sorted(postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        flat = [posting for term in terms for posting in postings[term]]
+        arrays = {
+            "terms": np.array(terms, dtype=str),
+            "term_offsets": term_offsets,
+            "postings_docs": np.array([doc for doc, _ in flat], dtype=np.int32),
+            "postings_tf": np.minimum([tf for _, tf in flat], np.iinfo(np.uint16).max).astype(np.uint16),
+            "doc_lengths": np.array(doc_lengths, dtype=np.int32),
+            "chunk_ids": np.array(chunk_ids, dtype=str),
+            "fingerprint": np.array([corpus.fingerprint]),
+        }
+        return cls(arrays, corpus, **kwargs)
+
+    def save(self, path):
+        arrays = {name: getattr(self, name) for name in
+                  ("terms", "term_offsets", "postings_docs", "postings_tf", "doc_lengths", "chunk_ids")}
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, fingerprint=np.array([self.fingerprint]), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, corpus, **kwargs):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files}, corpus, **kwargs)
+
+    @classmethod
+    def load_or_build(cls, path, corpus, **kwargs):
+        """Load the saved index, rebuilding it if the corpus has changed."""
+        start_time = time.time()
+        if os.path.exists(path):
+            try:
+                index = cls.load(path, corpus, **kwargs)
+                if index.fingerprint == corpus.fingerprint:
+                    logger.info(f"Loaded lexical index ({index.doc_count} chunks, {len(index.terms)} terms) "
+                                f"in {time.time() - start_time:.2f}s")
+                    return index
+                logger.info("Corpus changed since the lexical index was built. Rebuilding.")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Lexical index unreadable ({e}). Rebuilding.")
+        index = cls.build(corpus, **kwargs)
+        index.save(path)
+        logger.info(f"Built lexical index ({index.doc_count} chunks, {len(index.terms)} terms) "
+                    f"in {time.time() - start_time:.2f}s")
+        return index
+
+    # Search ----------------------------------------------------------------
+    def _term_index(self, term):
+        idx = int(np.searchsorted(self.terms, term))
+        if idx < len(self.terms) and self.terms[idx] == term:
+            return idx
+        return None
+
+    def is_keyword_query(self, query, max_terms=3):
+        """True for short queries whose content words all appear in the index."""
+        terms = set(tokenize(query))
+        return 0 < len(terms) <= max_terms and all(self._term_index(term) is not None for term in terms)
+
+    def document(self, doc):
+        return self.corpus.document(str(self.chunk_ids[doc]))
+
+    def search_with_scores(self, query, k=5):
+        """Return up to k (Document, BM25 score) pairs, best first."""
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            idx = self._term_index(term)
+            if idx is None:
+                continue
+            start, end = self.term_offsets[idx], self.term_offsets[idx + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            scores[docs] += self._idf[idx] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.document(doc), float(scores[doc])) for doc in matched]
+
+    def search(self, query, k=5):
+        return [doc for doc, _ in self.search_with_scores(query, k)]
+
+
+def _normalized(values, invert=False):
+    values = np.asarray(values, dtype=np.float64)
+    spread = values.max() - values.min() if len(values) else 0.0
+    if spread == 0:
+        return np.ones(len(values))
+    scaled = (values - values.min()) / spread
+    return 1 - scaled if invert else scaled
+
+
+def fuse_results(vector_results, lexical_results, k=5, alpha=0.5):
+    """Combine vector (Document, distance) and lexical (Document, score) hits.
+
+    Each list is min-max normalised (distances inverted) and the two scores
+    are mixed as alpha * vector + (1 - alpha) * lexical, with 0 for a list a
+    chunk is missing from. Chunks are matched on their chunk_id metadata.
+    """
+    fused = {}
+    for weight, results, invert in ((alpha, vector_results, True), (1 - alpha, lexical_results, False)):
+        for (doc, _), score in zip(results, _normalized([s for _, s in results], invert=invert)):
+            key = doc.metadata.get("chunk_id") or doc.page_content
+            entry = fused.setdefault(key, [doc, 0.0])
+            entry[1] += weight * score
+    ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+    return [doc for doc, _ in ranked[:k]]
@@ -0,0 +1,173 @@
+# ------------------------------------
+# Queue-based Logging Pipeline
+# ------------------------------------
+# Request threads only put log records on an in-memory queue; a background
+# QueueListener thread does the file and console I/O. The log file follows
+# the calendar day (finance_chatbot_YYYYMMDD.log, switched at midnight
+# rather than fixed at startup), is rotated by size within a day, and files
+# older than the retention period are deleted. Messages longer than a limit
+# (user queries, raw LLM responses) are truncated, or in "sample" mode kept
+# whole for a random fraction and truncated otherwise.
+#
+# Rotation is not safe with several processes writing one file, so a forked
+# child (a gunicorn worker under preload_app) gets its own listener thread
+# and its own file, finance_chatbot_YYYYMMDD-<pid>.log.
+import os
+import glob
+import atexit
+import time
+import queue
+import random
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """Write to <prefix>_YYYYMMDD.log, moving to a new file each day.
+
+    Within a day the file is rotated by size (.1, .2, ... backups). At each
+    day change, files older than retention_days are removed.
+    """
+
+    def __init__(self, log_dir, prefix, max_bytes=10 * 1024 * 1024, backup_count=5, retention_days=14, suffix=""):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.suffix = suffix
+        self.retention_days = retention_days
+        os.makedirs(log_dir, exist_ok=True)
+        self._start_day(time.time())
+        # The file is only created once something is logged
+        super().__init__(self._path(), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def _start_day(self, now):
+        today = datetime.date.fromtimestamp(now)
+        self.day = today.strftime("%Y%m%d")
+        tomorrow = today + datetime.timedelta(days=1)
+        self.next_day_at = time.mktime(tomorrow.timetuple())
+
+    def _path(self):
+        return os.path.abspath(os.path.join(self.log_dir, f"{self.prefix}_{self.day}{self.suffix}.log"))
+
+    def shouldRollover(self, record):
+        return record.created >= self.next_day_at or super().shouldRollover(record)
+
+    def doRollover(self):
+        if time.time() < self.next_day_at:
+            return super().doRollover()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._start_day(time.time())
+        self.baseFilename = self._path()
+        self.stream = self._open()
+        self.prune()
+
+    def prune(self):
+        """Delete log files (and their size backups) older than the retention period."""
+        if not self.retention_days:
+            return
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        for path in glob.glob(os.path.join(self.log_dir, f"{self.prefix}_*.log*")):
+            day = os.path.basename(path)[len(self.prefix) + 1:][:8]
+            if day.isdigit() and day < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class PayloadFilter(logging.Filter):
+    """Truncate (or sample) messages longer than max_chars.
+
+    mode is "truncate", "sample" (keep 1 in 1/sample_rate long messages
+    whole, truncate the rest) or "full" (no limit).
+    """
+
+    def __init__(self, max_chars=1000, mode="truncate", sample_rate=0.01):
+        super().__init__()
+        self.max_chars = max_chars
+        self.mode = mode
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if self.mode == "full" or not self.max_chars:
+            return True
+        message = record.getMessage()
+        if len(message) <= self.max_chars:
+            return True
+        if self.mode == "sample" and random.random() < self.sample_rate:
+            return True
+        record.msg = f"{message[:self.max_chars]}... [truncated, {len(message)} chars]"
+        record.args = None
+        return True
+
+
+class LogPipeline:
+    """A logger's QueueHandler and the listener thread that drains it.
+
+    make_handlers(pid) returns the handlers to drain into: pid is None in
+    the process that configured logging and the child's pid after a fork.
+    """
+
+    def __init__(self, logger, make_handlers, payload_filter=None):
+        self.logger = logger
+        self.make_handlers = make_handlers
+        self.handlers = make_handlers(None)
+        self.queue_handler = QueueHandler(queue.SimpleQueue())
+        if payload_filter is not None:
+            self.queue_handler.addFilter(payload_filter)
+        self.listener = None
+        logger.addHandler(self.queue_handler)
+        # The handlers here already print to the console; don't repeat through the root logger
+        logger.propagate = False
+        self.start()
+        atexit.register(self.stop)
+        # A forked child has the queue and file handler but not the listener thread:
+        # give it a new queue, its own handlers and a listener
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def start(self):
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Flush the queued records and stop the listener thread."""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _restart_in_child(self):
+        if self.listener is None:
+            return
+        for handler in self.handlers:
+            # Everything was flushed after each record, so this only drops the parent's file
+            handler.close()
+        self.handlers = self.make_handlers(os.getpid())
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+
+def configure(logger, log_dir, prefix, max_bytes=10 * 1024 * 1024, backup_count=5, retention_days=14,
+              payload_max_chars=1000, payload_mode="truncate", payload_sample_rate=0.01, console=True):
+    """Attach the queue pipeline (file, plus console if asked) to a logger."""
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    def make_handlers(pid):
+        suffix = f"-{pid}" if pid else ""
+        handlers = [DailyRotatingFileHandler(log_dir, prefix, max_bytes, backup_count, retention_days, suffix)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+
+    pipeline = LogPipeline(logger, make_handlers, PayloadFilter(payload_max_chars, payload_mode, payload_sample_rate))
+    pipeline.handlers[0].prune()
+    return pipeline
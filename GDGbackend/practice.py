@@ -2,25 +2,33 @@
 # Part 1: Imports & Setup
 # ------------------------------------
 import os
-import sys
 import json
 import re
 import time
-import fitz  # PyMuPDF for PDF extraction
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+import ingestion
+import metrics
+import log_pipeline
+from embedding_builder import EmbeddingBuilder, LocalHashEmbeddings, chroma_sink
+from response_cache import ResponseCache, normalize_query, history_digest
+from query_embedding_cache import CachedQueryEmbeddings
+from vector_index import MmapVectorIndex, export_chroma, index_fingerprint
+from lexical_index import LexicalIndex, fuse_results, tokenize
+from context_packer import ContextPacker, estimate_tokens, message_tokens, truncate_to_tokens
+from corpus_store import open_corpus_store
+from history_store import ChatHistoryStore, DEFAULT_SESSION
+from conversation_memory import ConversationMemory
+from singleflight import SingleFlight, AsyncSingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpenError, UpstreamTimeout, iter_with_deadlines
+from intent_classifier import classifier as intent_classifier
+from calculators import calculate_batch
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import TextLoader
-from langchain.schema import Document
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import logging
-from datetime import datetime
 
 # ------------------------------------
 # Part 2: Environment Variables & API Keys
@@ -30,173 +38,371 @@ load_dotenv()
 
 port = int(os.getenv("FLASK_PORT", 5000))
 
-# Replace with your actual keys
-os.environ["HF_TOKEN"] = os.getenv("HF_TOKEN")
 gemini_api_key = os.getenv("GOOGLE_API_KEY")
 
 # ------------------------------------
 # Part 3: Logging Configuration
 # ------------------------------------
 # Setup logging - Using ASCII symbols instead of Unicode emojis for Windows compatibility
+# Records are queued and written by a background thread (see log_pipeline.py);
+# messages over LOG_PAYLOAD_MAX_CHARS are truncated, or sampled with LOG_PAYLOAD_MODE=sample
 log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, f"finance_chatbot_{datetime.now().strftime('%Y%m%d')}.log")
-
-# Configure file handler with UTF-8 encoding
-file_handler = logging.FileHandler(log_file, encoding='utf-8')
-console_handler = logging.StreamHandler()
-
-# Set formatter without Unicode characters for better Windows compatibility
-log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-file_handler.setFormatter(log_formatter)
-console_handler.setFormatter(log_formatter)
-
-# Configure logger
 logger = logging.getLogger("finance_chatbot")
-logger.setLevel(logging.INFO)
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+log_pipeline_handle = None
+log_pipeline_lock = threading.Lock()
+
+def configure_logging():
+    """Start the queued file and console logging (once)."""
+    global log_pipeline_handle
+    if log_pipeline_handle is not None:
+        return
+    with log_pipeline_lock:
+        if log_pipeline_handle is None:
+            log_pipeline_handle = log_pipeline.configure(
+                logger, log_dir, "finance_chatbot",
+                max_bytes=int(float(os.getenv("LOG_MAX_MB", 10)) * 1024 * 1024),
+                backup_count=int(os.getenv("LOG_BACKUPS", 5)),
+                retention_days=int(os.getenv("LOG_RETENTION_DAYS", 14)),
+                payload_max_chars=int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 1000)),
+                payload_mode=os.getenv("LOG_PAYLOAD_MODE", "truncate"),
+                payload_sample_rate=float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01)),
+            )
 
 # ------------------------------------
 # Part 4: PDF Extraction
 # ------------------------------------
 pdf_folder = "books"
-output_text_file = "datatext.txt"
+corpus_file = os.getenv("CORPUS_STORE_PATH", "corpus.bin")
 
 def extract_pdfs():
-    if not os.path.exists(pdf_folder):
-        logger.error("Error: PDF folder not found!")
-        return False
+    """Incrementally sync the extracted corpus with the PDF folder.
 
-    pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf")]
-    
-    if not pdf_files:
-        logger.error("Error: No PDF files found in the folder!")
-        return False
+    Only books that were added, changed or removed since the last run are
+    re-extracted and re-chunked (see ingestion.py).
+    """
+    with metrics.stage_seconds.time(path="ingest", stage="sync"):
+        return ingestion.sync_corpus(pdf_folder) is not None
 
-    logger.info("Extracting text from PDFs...")
-    with open(output_text_file, "w", encoding="utf-8") as txt_file:
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(pdf_folder, pdf_file)
-            logger.info(f"Processing: {pdf_file}")
-            
-            try:
-                doc = fitz.open(pdf_path)
-                for page_num in range(len(doc)):
-                    text = doc[page_num].get_text()
-                    txt_file.write(text + "\n" + "=" * 80 + "\n")
-                logger.info(f"[SUCCESS] Extracted text from {pdf_file}")
-            except Exception as e:
-                logger.error(f"Error opening {pdf_file}: {e}")
-                continue
-    logger.info(f"All PDFs processed! Extracted text saved in '{output_text_file}'.")
-    return True
+# Page-indexed, memory-mapped view of the extracted corpus (see corpus_store.py)
+corpus_store = None
 
-if not os.path.exists(output_text_file):
+def load_corpus():
+    """Sync the extracted corpus and open the corpus store over it."""
+    global corpus_store
     extract_pdfs()
-else:
-    logger.info(f"Found existing '{output_text_file}'. Skipping PDF extraction.")
+    if ingestion.load_manifest().get("books"):
+        corpus_store = open_corpus_store(path=corpus_file)
 
 # ------------------------------------
 # Part 5: Persistent Chat History
 # ------------------------------------
 history_file = "chat_history.json"
+history_db_file = os.getenv("CHAT_HISTORY_DB", "chat_history.sqlite3")
 
-def load_chat_history():
-    """Load chat history from JSON file and convert to Human/AI messages."""
-    chat_history = ChatMessageHistory()
-    
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, "r") as f:
-                history_data = json.load(f)
-            
-            for msg in history_data:
-                if msg.get("type") == "human":
-                    chat_history.add_user_message(msg.get("content", ""))
-                elif msg.get("type") == "ai":
-                    chat_history.add_ai_message(msg.get("content", ""))
-            
-            logger.info("Loaded existing chat history.")
-        except json.JSONDecodeError:
-            logger.warning("Chat history file is empty or corrupted. Starting fresh.")
-    else:
-        logger.info("No previous chat history found. Starting fresh.")
-    
-    return chat_history
+history_store = None
 
-def save_chat_history(history):
-    """Save chat history as JSON."""
-    history_data = [{"type": "human" if isinstance(msg, HumanMessage) else "ai", "content": msg.content} for msg in history.messages]
-    
-    with open(history_file, "w") as f:
-        json.dump(history_data, f, indent=4)
+# Only keep the last 4 messages verbatim, and only as many as fit the history budget
+max_history = 4
+
+def open_history_store():
+    """Open the SQLite history store for this process."""
+    global history_store
+    history_store = ChatHistoryStore(history_db_file)
+    # Carry the old single-user history over into the default session once
+    history_store.import_legacy_json(history_file, DEFAULT_SESSION)
 
-chat_history = load_chat_history()
+def save_chat_turn(session_id, user_input, response_text):
+    """Append one exchange to a session's history."""
+    history_store.append_turn(session_id, user_input, response_text)
+    if conversation_memory is not None:
+        conversation_memory.schedule(session_id)
+
+def clear_chat_history(session_id=DEFAULT_SESSION):
+    """Delete a session's history."""
+    ensure_resources()
+    history_store.clear(session_id)
+
+# ------------------------------------
+# Part 5a: Conversation Memory
+# ------------------------------------
+# The prompt carries the last max_history messages verbatim, led by a rolling
+# summary of the older turns that a background thread keeps up to date (see
+# conversation_memory.py), so prompt size stays flat however long a session
+# runs. MEMORY_SUMMARY_TOKENS caps the summary; 0 turns summaries off.
+memory_summary_tokens = int(os.getenv("MEMORY_SUMMARY_TOKENS", 250))
+conversation_memory = None
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a personal finance assistant. "
+    "Update the summary with the new messages. Keep the user's goals, figures, constraints and decisions "
+    "and the advice already given; drop small talk. Write plain prose of at most {words} words and "
+    "reply with the summary only."
+)
+
+def summarize_conversation(previous_summary, messages):
+    """Fold new messages into a conversation summary with the chat model."""
+    from langchain_core.messages import SystemMessage, HumanMessage
+    transcript = "\n".join(f"{'User' if message.type == 'human' else 'Assistant'}: {message.content}"
+                           for message in messages)
+    request = f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    prompt = [SystemMessage(content=SUMMARY_PROMPT.format(words=memory_summary_tokens * 3 // 4)),
+              HumanMessage(content=request)]
+    # Same breaker as the chat calls: its failures count toward the circuit, and an open circuit skips it
+    response = llm_breaker.call(llm.invoke, prompt)
+    return response if isinstance(response, str) else response.content
+
+def open_conversation_memory():
+    """Start the summary updater for this process."""
+    global conversation_memory
+    if memory_summary_tokens > 0:
+        conversation_memory = ConversationMemory(history_store, summarize_conversation,
+                                                 verbatim_messages=max_history,
+                                                 summary_tokens=memory_summary_tokens)
+
+def load_history(session_id):
+    """The session's recent messages, led by the summary of older turns when there is one."""
+    recent = history_store.recent(session_id, max_history)
+    summary = conversation_memory.summary_message(session_id) if conversation_memory is not None else None
+    return [summary] + recent if summary else recent
 
 # ------------------------------------
 # Part 6: Persistent Retriever & Embeddings
 # ------------------------------------
+persist_directory_gemini = os.getenv("RETRIEVER_STORE_DIR", "retriever_store_gemini")
+retriever_meta_file = os.path.join(persist_directory_gemini, "finverse_meta.json")
+embedding_checkpoint_file = os.path.join(persist_directory_gemini, "embedding_checkpoint.jsonl")
+
+# "local" swaps in a deterministic offline embedder (use with its own RETRIEVER_STORE_DIR);
+# "fake" is the same embedder behind a simulated network round trip (see fakes.py)
+embedding_backend = os.getenv("EMBEDDING_BACKEND", "gemini")
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", 64))
+embed_workers = int(os.getenv("EMBED_WORKERS", 4))
+
+# "mmap" serves queries from a flat, memory-mapped export of the Chroma store
+# (see vector_index.py) that all worker processes share through the page cache;
+# Chroma is then only opened to build or update the store and re-export it.
+# VECTOR_INDEX_QUANTIZED=1 scans an int8 copy and re-ranks the best candidates.
+vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+vector_index_dir = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+
+# Query embeddings are cached in memory and, unless the path is empty, on disk
+query_embedding_cache = None
+if os.getenv("QUERY_EMBED_CACHE_ENABLED", "1") == "1":
+    query_embedding_cache_size = int(os.getenv("QUERY_EMBED_CACHE_SIZE", 2048))
+    query_embedding_cache_path = os.getenv("QUERY_EMBED_CACHE_PATH", "query_embeddings.sqlite3") or None
+    query_embedding_cache_disk_max = int(os.getenv("QUERY_EMBED_CACHE_DISK_MAX", 50000))
+
+def create_embeddings():
+    """Create the embedding backend used for indexing and queries."""
+    if embedding_backend == "local":
+        return LocalHashEmbeddings()
+    if embedding_backend == "fake":
+        from fakes import FakeRemoteEmbeddings
+        return FakeRemoteEmbeddings(delay=float(os.getenv("FAKE_EMBED_DELAY", 0.1)))
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=gemini_api_key)
+
+def create_query_embeddings(embeddings):
+    """Put the query embedding cache in front of the embedding backend."""
+    global query_embedding_cache
+    if os.getenv("QUERY_EMBED_CACHE_ENABLED", "1") != "1":
+        return embeddings
+    query_embedding_cache = CachedQueryEmbeddings(embeddings, max_entries=query_embedding_cache_size,
+                                                  disk_path=query_embedding_cache_path,
+                                                  max_disk_entries=query_embedding_cache_disk_max)
+    return query_embedding_cache
+
+def load_retriever_meta():
+    """Load the chunk metadata persisted next to the vector store."""
+    if os.path.exists(retriever_meta_file):
+        try:
+            with open(retriever_meta_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning("Retriever metadata is corrupted. Re-indexing corpus.")
+    return None
+
+def save_retriever_meta(manifest):
+    """Persist the corpus fingerprint and per-book chunk counts for the store."""
+    books = manifest.get("books", {})
+    meta = {
+        "fingerprint": ingestion.corpus_fingerprint(manifest),
+        "chunk_count": sum(entry.get("chunks", 0) for entry in books.values()),
+        "chunking": [manifest.get("chunk_size"), manifest.get("chunk_overlap")],
+        "chunk_ids": manifest.get("version"),
+        "books": {pdf_file: {"sha256": entry["sha256"], "chunks": entry.get("chunks", 0)}
+                  for pdf_file, entry in books.items()},
+    }
+    tmp_path = retriever_meta_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, retriever_meta_file)
+    return meta
+
+def load_book_documents(pdf_files):
+    """Load the pre-split chunks of the given books, with source and page metadata."""
+    ids, documents = [], []
+    for pdf_file in pdf_files:
+        for chunk_id in corpus_store.book_chunk_ids(pdf_file):
+            ids.append(chunk_id)
+            documents.append(corpus_store.document(chunk_id))
+    return ids, documents
+
+def store_matches_manifest(vectorstore, books):
+    """Whether the store holds exactly the manifest's chunk IDs."""
+    expected = [chunk_id for pdf_file, entry in books.items()
+                for chunk_id in ingestion.book_chunk_ids(pdf_file, entry.get("chunks", 0))]
+    if vectorstore._collection.count() != len(expected):
+        return False
+    return len(vectorstore.get(ids=expected, include=[])["ids"]) == len(expected)
+
 def initialize_retriever():
-    """Initialize and return the document retriever."""
-    if not os.path.exists(output_text_file):
-        logger.error(f"Error: Text file '{output_text_file}' not found!")
+    """Initialize and return the document retriever.
+
+    The corpus is only loaded and split when the store has to be built or
+    updated. Whether that is needed is decided from the persisted chunk
+    metadata, without reading the corpus.
+    """
+    from langchain_chroma import Chroma
+
+    start_time = time.time()
+    manifest = ingestion.load_manifest()
+    if not manifest.get("books"):
+        logger.error(f"Error: No extracted corpus found in '{ingestion.extract_dir}'!")
         return None
-        
-    loader = TextLoader(output_text_file, encoding="utf-8")
-    documents = loader.load()
-
-    # Split into chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
-
-    # Embedding and vector store setup
-    persist_directory_gemini = "retriever_store_gemini"
-    if os.path.exists(persist_directory_gemini) and os.listdir(persist_directory_gemini):
-        logger.info("Loaded existing Gemini retriever store.")
-        vectorstore = Chroma(persist_directory=persist_directory_gemini, embedding_function=GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001", google_api_key=gemini_api_key))
+
+    embeddings = create_embeddings()
+    fingerprint = ingestion.corpus_fingerprint(manifest)
+    meta = load_retriever_meta()
+    if vector_backend == "mmap" and meta and meta.get("fingerprint") == fingerprint \
+            and index_fingerprint(vector_index_dir) == fingerprint:
+        return open_vector_index(embeddings, "mmap", start_time)
+
+    store_exists = os.path.exists(persist_directory_gemini) and os.listdir(persist_directory_gemini)
+    # Chroma embeds search queries through this; indexing below uses the backend directly
+    vectorstore = Chroma(persist_directory=persist_directory_gemini,
+                         embedding_function=create_query_embeddings(embeddings))
+    books = manifest["books"]
+
+    if meta and meta.get("fingerprint") == fingerprint:
+        mode = "lazy"
+        logger.info(f"Loaded existing Gemini retriever store ({meta['chunk_count']} chunks).")
+    elif store_exists and meta is None and not os.path.exists(embedding_checkpoint_file) \
+            and store_matches_manifest(vectorstore, books):
+        # Store predates chunk metadata but holds exactly the manifest's chunks - start tracking it
+        mode = "adopted"
+        save_retriever_meta(manifest)
+        logger.info("Loaded existing Gemini retriever store and recorded its chunk metadata.")
     else:
-        logger.info("Creating new Gemini retriever store...")
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=gemini_api_key)
-        vectorstore = Chroma.from_documents(documents=splits, embedding=embeddings, persist_directory=persist_directory_gemini)
-        logger.info("Created and saved new retriever store!")
+        mode = "update" if meta else "build"
+        indexed = meta["books"] if meta else {}
+        if store_exists and meta is None and not os.path.exists(embedding_checkpoint_file):
+            # Chunks under unknown IDs could never be deleted by the incremental updates
+            logger.info("Existing Gemini retriever store doesn't match the corpus. Re-indexing it.")
+            vectorstore.reset_collection()
+        if meta and meta.get("chunk_ids") != manifest.get("version"):
+            # The stored chunks are under IDs the manifest no longer derives - start over
+            logger.info("Chunk ID scheme changed. Re-indexing the whole corpus.")
+            vectorstore.reset_collection()
+            mode, indexed = "build", {}
+        rechunked = meta is not None and meta.get("chunking") != [manifest.get("chunk_size"), manifest.get("chunk_overlap")]
+        stale = [pdf_file for pdf_file, entry in indexed.items()
+                 if rechunked or pdf_file not in books or books[pdf_file]["sha256"] != entry["sha256"]]
+        fresh = [pdf_file for pdf_file in books
+                 if pdf_file not in indexed or pdf_file in stale]
+
+        stale_ids = [chunk_id for pdf_file in stale
+                     for chunk_id in ingestion.book_chunk_ids(pdf_file, indexed[pdf_file]["chunks"])]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
 
+        logger.info(f"Indexing {len(fresh)} book(s) into Gemini retriever store...")
+        ids, documents = load_book_documents(fresh)
+        builder = EmbeddingBuilder(embeddings, chroma_sink(vectorstore), embedding_checkpoint_file,
+                                   batch_size=embed_batch_size, max_workers=embed_workers)
+        builder.build(ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents],
+                      build_key=fingerprint)
+        meta = save_retriever_meta(manifest)
+        builder.clear_checkpoint()
+        logger.info(f"Saved retriever store with {meta['chunk_count']} chunks "
+                    f"(removed {len(stale_ids)}, added {len(ids)}).")
+
+    if vector_backend == "mmap":
+        export_chroma(vectorstore, vector_index_dir, fingerprint)
+        return open_vector_index(embeddings, f"{mode}_export", start_time)
+
+    logger.info(f"Retriever cold start ({mode}) took {time.time() - start_time:.2f}s")
+    metrics.stage_seconds.observe(time.time() - start_time, path="ingest", stage=f"retriever_{mode}")
     return vectorstore.as_retriever(search_kwargs={"k": 5})
 
-retriever = initialize_retriever()
-if retriever is None:
-    logger.error("Failed to initialize retriever. Exiting.")
-    sys.exit(1)
+def open_vector_index(embeddings, mode, start_time):
+    """Serve retrieval from the memory-mapped export instead of Chroma."""
+    index = MmapVectorIndex(vector_index_dir, embedding_function=create_query_embeddings(embeddings),
+                            quantized=os.getenv("VECTOR_INDEX_QUANTIZED", "0") == "1")
+    logger.info(f"Retriever cold start ({mode}) took {time.time() - start_time:.2f}s "
+                f"(memory-mapped index, {len(index)} chunks)")
+    metrics.stage_seconds.observe(time.time() - start_time, path="ingest", stage=f"retriever_{mode}")
+    return index.as_retriever(search_kwargs={"k": 5})
+
+retriever = None
+
+# ------------------------------------
+# Part 6a: Lexical Index & Retrieval Mode
+# ------------------------------------
+# "vector" searches Chroma only, "lexical" only the local BM25 index, and
+# "hybrid" fuses both. In vector and hybrid mode, short keyword queries whose
+# terms are all indexed take the lexical fast path and skip the embedding
+# call (LEXICAL_FAST_PATH_TERMS=0 turns that off), and the lexical index
+# answers when the embedding service fails or misses the retrieval deadline.
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid")
+lexical_fast_path_terms = int(os.getenv("LEXICAL_FAST_PATH_TERMS", 3))
+hybrid_alpha = float(os.getenv("HYBRID_ALPHA", 0.5))
+
+lexical_index = None
+
+def load_lexical_index():
+    """Load (or build) the BM25 index over the corpus store."""
+    global lexical_index, retrieval_mode
+    if retrieval_mode == "vector" and not lexical_fast_path_terms:
+        return
+    try:
+        lexical_index = LexicalIndex.load_or_build(os.getenv("LEXICAL_INDEX_PATH", "lexical_index.npz"), corpus_store)
+    except Exception as e:
+        logger.error(f"Could not load the lexical index ({str(e)}). Using vector retrieval only.")
+        retrieval_mode = "vector"
+
+# ------------------------------------
+# Part 6b: Response Cache
+# ------------------------------------
+# Semantic hits are off by default: near-identical financial questions ("...in my 30s" vs
+# "...in my 50s") can need different answers. An empty disk path keeps the cache in memory only.
+response_cache = None
+
+def open_response_cache():
+    """Open the response cache for this process."""
+    global response_cache
+    if os.getenv("RESPONSE_CACHE_ENABLED", "1") != "1":
+        return
+    response_cache = ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+        max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", 32)) * 1024 * 1024),
+        ttl=int(os.getenv("RESPONSE_CACHE_TTL", 86400)),
+        semantic_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0)),
+        disk_path=os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3") or None,
+        max_disk_entries=int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", 10000)),
+    )
 
 # ------------------------------------
 # Part 7: Finance-Specific Intent Detection
 # ------------------------------------
 def detect_finance_intent(user_input):
     """Detect specific finance intents to provide more targeted responses."""
-    # Map of intents to their regex patterns
-    intents = {
-        "investment_advice": r'\b(invest|stock|bond|etf|portfolio|dividend|market|return|risk|asset)\b',
-        "budgeting": r'\b(budget|spend|saving|expense|income|track|money|financial plan|cash flow)\b',
-        "debt": r'\b(debt|loan|credit|mortgage|interest|payment|borrow|lend|finance|leverage)\b',
-        "retirement": r'\b(retire|401k|ira|pension|social security|annuity|future|nest egg)\b',
-        "tax": r'\b(tax|deduction|filing|return|irs|write-off|capital gain|liability|exemption)\b',
-        "insurance": r'\b(insurance|policy|coverage|premium|deductible|claim|risk management|protection)\b',
-        "financial_planning": r'\b(plan|goal|future|strategy|wealth|net worth|financial freedom|independence)\b',
-        "calculator": r'\b(calculate|computation|formula|interest|payment|return|yield|rate|compound)\b',
-        "general": r'.*'  # Fallback
-    }
-    
-    # Check each intent pattern against the user input
-    for intent, pattern in intents.items():
-        if re.search(pattern, user_input.lower()):
-            logger.info(f"Detected intent: {intent} for query: {user_input[:50]}...")
-            return intent
-    
-    logger.info(f"No specific intent detected, using general intent for: {user_input[:50]}...")
-    return "general"
+    # Single pass over a precompiled keyword alternation (see intent_classifier.py)
+    ranked = intent_classifier.ranked(user_input)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Intent scores {ranked} for query: {user_input[:50]}...")
+    return ranked[0][0]
 
 # ------------------------------------
 # Part 8: Custom System Prompts Based on Intent
@@ -274,18 +480,58 @@ def get_system_prompt(intent):
 # ------------------------------------
 # Part 9: LLM & Prompt Configuration
 # ------------------------------------
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=gemini_api_key)
+# "fake" swaps in a local model that streams a canned answer (see fakes.py)
+llm_backend = os.getenv("LLM_BACKEND", "gemini")
+
+def create_llm():
+    """Create the chat model used to answer questions."""
+    if llm_backend == "fake":
+        from fakes import FakeStreamingChatModel
+        return FakeStreamingChatModel(first_token_delay=float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY", 0.2)),
+                                      token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", 0.02)))
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=gemini_api_key)
+
+llm = None
 
-# Default system prompt (will be updated based on intent)
-system_prompt = get_system_prompt("general")
+# One prompt template and stuff-documents chain per intent, built once and
+# shared by every request
+FINANCE_INTENTS = ["investment_advice", "budgeting", "debt", "retirement", "tax",
+                   "insurance", "financial_planning", "calculator", "general"]
 
-prompt = ChatPromptTemplate.from_messages([
-    ("system", system_prompt),
-    MessagesPlaceholder(variable_name="history"),
-    ("human", "{input}")
-])
+intent_chains = {}
+intent_chains_lock = threading.Lock()
 
-stuff_chain = create_stuff_documents_chain(llm=llm, prompt=prompt, document_variable_name="context")
+def build_intent_chain(intent):
+    """Build the prompt template and stuff-documents chain for an intent."""
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+
+    intent_prompt = ChatPromptTemplate.from_messages([
+        ("system", get_system_prompt(intent)),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+    return create_stuff_documents_chain(llm=llm, prompt=intent_prompt, document_variable_name="context")
+
+def get_intent_chain(intent):
+    """Return the cached chain for an intent, building it on first use."""
+    if intent not in FINANCE_INTENTS:
+        intent = "general"
+    chain = intent_chains.get(intent)
+    if chain is None:
+        with intent_chains_lock:
+            chain = intent_chains.get(intent)
+            if chain is None:
+                chain = intent_chains[intent] = build_intent_chain(intent)
+    return chain
+
+def warm_intent_chains():
+    """Build the chains for every intent up front."""
+    start_time = time.time()
+    for intent in FINANCE_INTENTS:
+        get_intent_chain(intent)
+    logger.info(f"Built {len(intent_chains)} intent chains in {(time.time() - start_time) * 1000:.1f}ms")
 
 # ------------------------------------
 # Part 10: Financial Calculator Functions
@@ -300,6 +546,8 @@ def loan_payment_calculator(principal, rate, years):
     """Calculate monthly loan payment using the formula: PMT = P(r(1+r)^n)/((1+r)^n-1)"""
     rate = rate / 100 / 12  # Monthly interest rate in decimal
     n = years * 12  # Total number of payments
+    if rate == 0:
+        return principal / n
     payment = principal * (rate * (1 + rate)**n) / ((1 + rate)**n - 1)
     return payment
 
@@ -312,6 +560,8 @@ def retirement_calculator(current_savings, monthly_contribution, years, annual_r
     future_value = current_savings * (1 + monthly_return)**months
     
     # Calculate future value of the annuity (monthly contributions)
+    if monthly_return == 0:
+        return future_value + monthly_contribution * months
     annuity_value = monthly_contribution * ((1 + monthly_return)**months - 1) / monthly_return
     
     return future_value + annuity_value
@@ -363,70 +613,615 @@ def extract_financial_parameters(user_input):
 # ------------------------------------
 # Part 12: Chatbot Core Function
 # ------------------------------------
-def chat_with_ai(user_input):
-    """Generate AI response using LLM and retriever with improved error handling."""
-    start_time = time.time()
+fallback_answer = "I'm sorry, I encountered an issue processing your request. Please try again with a different question."
+
+# Retrieval runs on this pool so it overlaps with the local request steps.
+# A deadline of 0 waits for retrieval however long it takes.
+retrieval_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVAL_WORKERS", 8)),
+                                    thread_name_prefix="retrieval")
+retrieval_deadline = float(os.getenv("RETRIEVAL_DEADLINE_S", 0))
+
+# Per-call deadlines and circuit breakers for the Gemini clients (see circuit_breaker.py).
+# When the chat model fails, times out or its circuit is open, /chat answers with the
+# most relevant passages of the retrieved chunks; when the embeddings do, retrieval
+# uses the lexical index. BREAKER_FAILURE_THRESHOLD=0 turns the circuits off.
+breaker_failure_threshold = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+breaker_reset_s = float(os.getenv("BREAKER_RESET_S", 30))
+llm_breaker = CircuitBreaker("llm", breaker_failure_threshold, breaker_reset_s,
+                             deadline=float(os.getenv("LLM_DEADLINE_S", 20)))
+embed_breaker = CircuitBreaker("embeddings", breaker_failure_threshold, breaker_reset_s,
+                               deadline=float(os.getenv("EMBED_DEADLINE_S", 5)))
+# Streamed answers have no overall deadline; the first token and each later chunk get their own
+llm_first_token_deadline = float(os.getenv("LLM_FIRST_TOKEN_S", 10))
+llm_chunk_deadline = float(os.getenv("LLM_CHUNK_S", 10))
+
+# Retrieved context and history share one prompt budget (estimated tokens);
+# history is packed first and capped at its own share
+context_packer = ContextPacker(token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", 2000)),
+                               history_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", 600)),
+                               chunk_overlap=ingestion.chunk_overlap)
+
+# Per-stage histograms, retrieval paths and cache counters for /metrics (see metrics.py)
+retrieval_paths = metrics.registry.counter(
+    "finverse_retrieval_total", "Chat retrievals by the path that answered them.", ["mode"])
+
+def cache_events():
+    for name, cache in (("response", response_cache), ("query_embedding", query_embedding_cache)):
+        if cache is not None:
+            for event, value in cache.stats().items():
+                if event in ("hits", "semantic_hits", "disk_hits", "misses", "evictions"):
+                    yield {"cache": name, "event": event}, value
+
+metrics.registry.collector("finverse_cache_events_total", "Cache lookups and evictions by outcome.",
+                           "counter", cache_events)
+
+def memory_events():
+    if conversation_memory is not None:
+        stats = conversation_memory.stats()
+        for event in ("updates", "failures"):
+            yield {"event": event}, stats[event]
+
+metrics.registry.collector("finverse_memory_summaries_total", "Conversation summary updates by outcome.",
+                           "counter", memory_events)
+
+def record_stage(timings, name, ms, path="chat"):
+    """Keep a stage duration for the request log and the stage histogram."""
+    timings[name] = ms
+    metrics.stage_seconds.observe(ms / 1000, path=path, stage=name)
+
+@contextmanager
+def timed_stage(timings, name):
+    """Record the duration of a request stage in milliseconds."""
+    stage_start = time.perf_counter()
     try:
-        # Check for calculator requests first
+        yield
+    except Exception:
+        metrics.errors.inc(path="chat", stage=name)
+        raise
+    finally:
+        record_stage(timings, name, (time.perf_counter() - stage_start) * 1000)
+
+
+@contextmanager
+def tracked_request(path):
+    """Count a request as in flight and record its total duration."""
+    with metrics.in_flight.track_inprogress(path=path), metrics.request_seconds.time(path=path):
+        yield
+
+def log_timings(timings):
+    logger.info("Stage timings (ms): " + ", ".join(f"{name}={ms:.1f}" for name, ms in timings.items()))
+    if query_embedding_cache is not None:
+        stats = query_embedding_cache.stats()
+        logger.info(f"Query embedding cache: {stats['hits'] + stats['disk_hits']} hits, "
+                    f"{stats['misses']} misses (hit rate {stats['hit_rate']})")
+
+class UnsavedAnswer(str):
+    """An answer not saved to the history; coalesced followers don't save it either."""
+
+def check_calculator(user_input, start_time, timings):
+    """Answer calculator requests directly, without the LLM or the history."""
+    with timed_stage(timings, "calculator"):
         calculation_result = extract_financial_parameters(user_input)
-        if calculation_result:
-            logger.info(f"Processed calculator request in {time.time() - start_time:.2f}s")
-            return calculation_result
-        
-        # Get intent and customize prompt
+    if calculation_result:
+        logger.info(f"Processed calculator request in {time.time() - start_time:.2f}s")
+        return UnsavedAnswer(calculation_result)
+    return calculation_result
+
+def begin_chat(user_input, session_id, start_time, timings):
+    """Run the local steps that come before the LLM call.
+
+    Returns (answer, chat_request). `answer` is set on an exact cache hit;
+    otherwise `chat_request` holds the chain and its input, still without
+    context.
+    """
+    # Get intent and trim history - both are part of the cache key
+    with timed_stage(timings, "intent"):
         intent = detect_finance_intent(user_input)
-        system_prompt = get_system_prompt(intent)
-        
-        # Update prompt template with intent-specific system prompt
-        updated_prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{input}")
-        ])
-        
-        # Create a new chain with the updated prompt
-        custom_chain = create_stuff_documents_chain(llm=llm, prompt=updated_prompt, document_variable_name="context")
-        
-        # Log the incoming query
-        logger.info(f"Processing query with intent '{intent}': {user_input}")
-        
-        # Get relevant documents
-        retrieved_docs = retriever.invoke(user_input)
-        processed_docs = [Document(page_content=doc.page_content if hasattr(doc, "page_content") else str(doc)) for doc in retrieved_docs]
-        
-        # Use a limited chat history to prevent context length issues
-        max_history = 4  # Only keep last 4 messages
-        trimmed_history = chat_history.messages[-max_history:] if len(chat_history.messages) > max_history else chat_history.messages
-        
-        # Prepare input data with parameters
-        input_data = {
-            "input": user_input,
-            "context": processed_docs,
-            "history": trimmed_history,
-            "parameters": {"max_new_tokens": 500, "temperature": 0.7}
-        }
-        
-        # Get response
-        response = custom_chain.invoke(input_data)
-        response_text = response if isinstance(response, str) else response.content
-        
-        # Update history
-        chat_history.add_user_message(user_input)
-        chat_history.add_ai_message(response_text)
-        save_chat_history(chat_history)
-        
-        # Log completion time
-        execution_time = time.time() - start_time
-        logger.info(f"Generated response in {execution_time:.2f}s")
-        
-        return response_text
+
+    # Use a limited chat history to prevent context length issues
+    with timed_stage(timings, "history"):
+        recent_history = load_history(session_id)
+        trimmed_history, history_tokens = context_packer.pack_history(recent_history)
+
+    # Serve repeated questions from the cache
+    if response_cache is not None:
+        with timed_stage(timings, "cache"):
+            response_text = response_cache.get(user_input, intent, trimmed_history)
+        if response_text is not None:
+            return serve_cached(user_input, session_id, response_text, start_time), None
+
+    # Reuse the prebuilt chain for this intent
+    with timed_stage(timings, "chain_setup"):
+        custom_chain = get_intent_chain(intent)
+
+    # Log the incoming query
+    logger.info(f"Processing query with intent '{intent}' (chain setup {timings['chain_setup']:.3f}ms): {user_input}")
+
+    return None, new_chat_request(user_input, intent, custom_chain, trimmed_history,
+                                  (message_tokens(recent_history), history_tokens), timings)
+
+def new_chat_request(user_input, intent, chain, history, history_tokens, timings):
+    """The chain, its input (still without context) and what the later steps need."""
+    # Prepare input data with parameters
+    input_data = {
+        "input": user_input,
+        "context": [],
+        "history": history,
+        "parameters": {"max_new_tokens": 500, "temperature": 0.7}
+    }
+
+    return {
+        "chain": chain,
+        "input": input_data,
+        "intent": intent,
+        "history": history,
+        "query_vector": None,
+        "timings": timings,
+        "history_tokens": history_tokens,
+    }
+
+def serve_cached(user_input, session_id, response_text, start_time):
+    """Record a cache hit in the session history and return it."""
+    save_chat_turn(session_id, user_input, response_text)
+    logger.info(f"Served cached response in {time.time() - start_time:.3f}s {response_cache.stats()}")
+    return response_text
+
+def use_semantic_cache():
+    return response_cache is not None and response_cache.semantic
+
+def lookup_similar(user_input, session_id, chat_request, query_vector, start_time):
+    """Check the semantic cache with the query embedding.
+
+    The embedding is kept on the request so it can be cached with the answer.
+    """
+    chat_request["query_vector"] = query_vector
+    response_text = response_cache.get_similar(query_vector, chat_request["intent"], chat_request["history"])
+    if response_text is not None:
+        return serve_cached(user_input, session_id, response_text, start_time)
+    return None
+
+def set_context(chat_request, retrieved_docs):
+    """Pack the retrieved documents into the prompt budget and attach them to the chain input."""
+    raw_history, history_tokens = chat_request["history_tokens"]
+    with timed_stage(chat_request["timings"], "packing"):
+        packed, context_tokens = context_packer.pack_context(
+            retrieved_docs, context_packer.token_budget - history_tokens)
+    raw_context = sum(estimate_tokens(doc.page_content) for doc in retrieved_docs)
+    logger.info(f"Prompt size (est. tokens): {raw_context + raw_history} -> {context_tokens + history_tokens} "
+                f"(context {len(retrieved_docs)} chunks/{raw_context} -> {len(packed)}/{context_tokens}, "
+                f"history {len(chat_request['input']['history'])} messages/{history_tokens})")
+    chat_request["input"]["context"] = packed
+
+def use_lexical_only(user_input):
+    if lexical_index is None:
+        return False
+    return retrieval_mode == "lexical" or (
+        lexical_fast_path_terms > 0 and lexical_index.is_keyword_query(user_input, lexical_fast_path_terms))
+
+def lexical_fallback(user_input, error):
+    """Answer from the lexical index when vector retrieval is unavailable."""
+    if lexical_index is None:
+        raise error
+    if isinstance(error, CircuitOpenError):
+        metrics.fallbacks.inc(path="retrieval", reason="circuit_open")
+    else:
+        logger.warning(f"Vector retrieval failed ({str(error)}). Using lexical results.")
+        metrics.fallbacks.inc(path="retrieval", reason="embedding_error")
+    retrieval_paths.inc(mode="lexical_fallback")
+    return None, lexical_index.search(user_input, retriever.search_kwargs["k"])
+
+def with_provenance(docs):
+    """Fill in source and page metadata from the corpus store.
+
+    Chunks indexed before the store existed only carry their chunk_id.
+    """
+    for doc in docs:
+        chunk_id = doc.metadata.get("chunk_id")
+        if "page" not in doc.metadata and chunk_id and chunk_id in corpus_store:
+            doc.metadata.update(corpus_store.chunk_metadata(chunk_id))
+    return docs
+
+def search_by_vector(user_input, query_vector):
+    """Vector search, fused with the lexical hits in hybrid mode."""
+    k = retriever.search_kwargs["k"]
+    if retrieval_mode != "hybrid" or lexical_index is None:
+        retrieval_paths.inc(mode="vector")
+        return with_provenance(retriever.vectorstore.similarity_search_by_vector(query_vector, k=k))
+    vector_results = retriever.vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=2 * k)
+    with_provenance([doc for doc, _ in vector_results])
+    retrieval_paths.inc(mode="hybrid")
+    return fuse_results(vector_results, lexical_index.search_with_scores(user_input, 2 * k), k, hybrid_alpha)
+
+def retrieve_context(user_input):
+    """Fetch the documents for a query, plus its embedding when one was computed.
+
+    The embedding is returned so the semantic cache can use it; it is None
+    when the query took the lexical path.
+    """
+    if use_lexical_only(user_input):
+        retrieval_paths.inc(mode="lexical")
+        return None, lexical_index.search(user_input, retriever.search_kwargs["k"])
+    try:
+        query_vector = embed_breaker.call(retriever.vectorstore.embeddings.embed_query, user_input)
+        return query_vector, search_by_vector(user_input, query_vector)
+    except Exception as e:
+        return lexical_fallback(user_input, e)
+
+async def aretrieve_context(user_input):
+    """Async counterpart of retrieve_context."""
+    if use_lexical_only(user_input):
+        retrieval_paths.inc(mode="lexical")
+        return None, lexical_index.search(user_input, retriever.search_kwargs["k"])
+    try:
+        query_vector = await embed_breaker.acall(retriever.vectorstore.embeddings.aembed_query, user_input)
+        return query_vector, await asyncio.to_thread(search_by_vector, user_input, query_vector)
+    except Exception as e:
+        return lexical_fallback(user_input, e)
+
+def prepare_chat(user_input, session_id, start_time, timings=None):
+    """Run every step that comes before the LLM call.
+
+    Retrieval starts on the retrieval pool as soon as the query is known not
+    to be a calculator request, and overlaps with intent detection, history
+    loading and chain selection. With RETRIEVAL_DEADLINE_S set, a late
+    retrieval is abandoned and the LLM answers without context.
+    """
+    timings = {} if timings is None else timings
+    calculation_result = check_calculator(user_input, start_time, timings)
+    if calculation_result:
+        return calculation_result, None
+
+    retrieval_start = time.perf_counter()
+    retrieval = retrieval_pool.submit(retrieve_context, user_input)
+
+    answer, chat_request = begin_chat(user_input, session_id, start_time, timings)
+    if answer is not None:
+        retrieval.cancel()
+        return answer, None
+
+    with timed_stage(timings, "retrieval_wait"):
+        try:
+            query_vector, retrieved_docs = retrieval.result(timeout=retrieval_deadline or None)
+        except FuturesTimeoutError:
+            metrics.fallbacks.inc(path="retrieval", reason="deadline")
+            if lexical_index is not None:
+                logger.warning(f"Retrieval missed its {retrieval_deadline}s deadline. Using lexical results.")
+                retrieved_docs = lexical_index.search(user_input, retriever.search_kwargs["k"])
+            else:
+                logger.warning(f"Retrieval missed its {retrieval_deadline}s deadline. Answering without context.")
+                retrieved_docs = []
+            query_vector = None
+    record_stage(timings, "retrieval", (time.perf_counter() - retrieval_start) * 1000)
+
+    if query_vector is not None and use_semantic_cache():
+        answer = lookup_similar(user_input, session_id, chat_request, query_vector, start_time)
+        if answer is not None:
+            return answer, None
+    set_context(chat_request, retrieved_docs)
+
+    return None, chat_request
+
+async def aprepare_chat(user_input, session_id, start_time, timings=None):
+    """Async counterpart of prepare_chat using the retriever's async paths.
+
+    The history and response cache steps block on SQLite, so they run on a
+    worker thread instead of the event loop.
+    """
+    timings = {} if timings is None else timings
+    calculation_result = check_calculator(user_input, start_time, timings)
+    if calculation_result:
+        return calculation_result, None
+
+    answer, chat_request = await asyncio.to_thread(begin_chat, user_input, session_id, start_time, timings)
+    if answer is not None:
+        return answer, None
+
+    with timed_stage(timings, "retrieval"):
+        query_vector, retrieved_docs = await aretrieve_context(user_input)
+
+    if query_vector is not None and use_semantic_cache():
+        answer = await asyncio.to_thread(lookup_similar, user_input, session_id, chat_request, query_vector,
+                                         start_time)
+        if answer is not None:
+            return answer, None
+    set_context(chat_request, retrieved_docs)
+
+    return None, chat_request
+
+def finish_chat(user_input, session_id, chat_request, response_text):
+    """Cache the answer and append the turn to the session history."""
+    if response_cache is not None:
+        response_cache.put(user_input, chat_request["intent"], chat_request["history"],
+                           response_text, chat_request["query_vector"])
+
+    # Update history
+    save_chat_turn(session_id, user_input, response_text)
+
+class DegradedAnswer(UnsavedAnswer):
+    """An answer given without the chat model; never cached or saved to the history."""
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+# Separator lines (=====, -----) left in the PDF text
+RULE_PATTERN = re.compile(r"(\W)\1{3,}")
+degraded_intro = ("Our AI assistant is temporarily unavailable, so here are the most relevant passages "
+                  "from our finance library:")
+
+def is_prose(sentence):
+    """Skip headers, tables and figures: keep sentences that are mostly letters."""
+    return len(sentence) > 20 and sum(char.isalpha() or char == " " for char in sentence) >= 0.85 * len(sentence)
+
+def extractive_answer(user_input, docs, max_passages=3, sentences_per_passage=2):
+    """Quote the sentences of the top chunks that share the most terms with the question."""
+    terms = set(tokenize(user_input))
+    passages = []
+    for doc in docs[:max_passages]:
+        text = RULE_PATTERN.sub(" ", " ".join(doc.page_content.split()))
+        sentences = [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if is_prose(sentence.strip())]
+        if not sentences:
+            continue
+        best = sorted(range(len(sentences)),
+                      key=lambda idx: -len(terms & set(tokenize(sentences[idx]))))[:sentences_per_passage]
+        text = " ".join(truncate_to_tokens(sentences[idx], 80) for idx in sorted(best))
+        source, page = doc.metadata.get("source"), doc.metadata.get("page")
+        citation = f" ({source}, p. {page})" if source and page else f" ({source})" if source else ""
+        passages.append(f"- {text}{citation}")
+    if not passages:
+        return DegradedAnswer(fallback_answer)
+    return DegradedAnswer(degraded_intro + "\n\n" + "\n".join(passages))
+
+def degraded_answer(user_input, chat_request, error):
+    """Answer from the retrieved passages when the chat model is unavailable.
+
+    The answer is not cached or saved to the history, so the question gets a
+    full answer once the model is back.
+    """
+    if isinstance(error, CircuitOpenError):
+        reason = "circuit_open"
+    else:
+        reason = "llm_timeout" if isinstance(error, UpstreamTimeout) else "llm_error"
+        logger.error(f"Chat model call failed ({type(error).__name__}: {str(error)}). Answering from retrieved passages.")
+    metrics.fallbacks.inc(path="chat", reason=reason)
+    return extractive_answer(user_input, chat_request["input"]["context"])
+
+def generate_chat(user_input, session_id, start_time):
+    """Answer one chat request, saving the turn to the session's history."""
+    timings = {}
+    answer, chat_request = prepare_chat(user_input, session_id, start_time, timings)
+    if answer is not None:
+        return answer
+
+    # Get response
+    try:
+        with timed_stage(timings, "llm"):
+            response = llm_breaker.call(chat_request["chain"].invoke, chat_request["input"])
+    except Exception as e:
+        return degraded_answer(user_input, chat_request, e)
+    response_text = response if isinstance(response, str) else response.content
+
+    with timed_stage(timings, "persist"):
+        finish_chat(user_input, session_id, chat_request, response_text)
+
+    # Log completion time
+    execution_time = time.time() - start_time
+    logger.info(f"Generated response in {execution_time:.2f}s")
+    log_timings(timings)
+
+    return response_text
+
+# Identical questions asked at the same time (a class working through the same
+# lesson) share one retrieval and LLM call; each asker still gets the turn in
+# their own history, unless the leader didn't save it either (UnsavedAnswer).
+# Only requests in flight are shared - nothing is cached here.
+# COALESCE_WAIT_S caps how long a follower waits for the shared answer (0: no cap).
+chat_flights = achat_flights = None
+if os.getenv("COALESCE_ENABLED", "1") == "1":
+    coalesce_wait = float(os.getenv("COALESCE_WAIT_S", 0)) or None
+    chat_flights = SingleFlight("chat", coalesce_wait)
+    achat_flights = AsyncSingleFlight("chat_async", coalesce_wait)
+
+def coalescing_key(user_input, session_id):
+    """Requests share an answer when the question and the recent history match."""
+    history = load_history(session_id)
+    return f"{normalize_query(user_input)}\x00{history_digest(history)}"
+
+def chat_with_ai(user_input, session_id=DEFAULT_SESSION):
+    """Generate AI response using LLM and retriever with improved error handling."""
+    start_time = time.time()
+    with tracked_request("chat"):
+        try:
+            ensure_resources()
+            if chat_flights is None:
+                return generate_chat(user_input, session_id, start_time)
+            (response_text, leader_session), shared = chat_flights.do(
+                coalescing_key(user_input, session_id),
+                lambda: (generate_chat(user_input, session_id, start_time), session_id))
+            if shared and leader_session != session_id and not isinstance(response_text, UnsavedAnswer):
+                save_chat_turn(session_id, user_input, response_text)
+            return response_text
+        except Exception as e:
+            error_message = f"Error: {str(e)}"
+            logger.error(error_message)
+            # Log the full error for debugging
+            import traceback
+            logger.error(traceback.format_exc())
+            metrics.fallbacks.inc(path="chat", reason="error")
+            return fallback_answer
+
+async def agenerate_chat(user_input, session_id, start_time):
+    """Async counterpart of generate_chat."""
+    timings = {}
+    answer, chat_request = await aprepare_chat(user_input, session_id, start_time, timings)
+    if answer is not None:
+        return answer
+
+    try:
+        with timed_stage(timings, "llm"):
+            response = await llm_breaker.acall(chat_request["chain"].ainvoke, chat_request["input"])
     except Exception as e:
-        error_message = f"Error: {str(e)}"
-        logger.error(error_message)
-        # Log the full error for debugging
-        import traceback
-        logger.error(traceback.format_exc())
-        return "I'm sorry, I encountered an issue processing your request. Please try again with a different question."
+        return degraded_answer(user_input, chat_request, e)
+    response_text = response if isinstance(response, str) else response.content
+
+    # SQLite and cache writes are quick but still blocking - keep them off the event loop
+    with timed_stage(timings, "persist"):
+        await asyncio.to_thread(finish_chat, user_input, session_id, chat_request, response_text)
+
+    logger.info(f"Generated response in {time.time() - start_time:.2f}s")
+    log_timings(timings)
+    return response_text
+
+async def achat_with_ai(user_input, session_id=DEFAULT_SESSION):
+    """Async version of chat_with_ai for the asyncio serving mode."""
+    start_time = time.time()
+    with tracked_request("chat"):
+        try:
+            if not resources_ready:
+                await asyncio.to_thread(init_resources)
+            if achat_flights is None:
+                return await agenerate_chat(user_input, session_id, start_time)
+
+            async def generate():
+                return await agenerate_chat(user_input, session_id, start_time), session_id
+
+            key = await asyncio.to_thread(coalescing_key, user_input, session_id)
+            (response_text, leader_session), shared = await achat_flights.do(key, generate)
+            if shared and leader_session != session_id and not isinstance(response_text, UnsavedAnswer):
+                await asyncio.to_thread(save_chat_turn, session_id, user_input, response_text)
+            return response_text
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            metrics.fallbacks.inc(path="chat", reason="error")
+            return fallback_answer
+
+def stream_chat_with_ai(user_input, session_id=DEFAULT_SESSION):
+    """Generate the AI response as a stream of text chunks.
+
+    History is saved once the stream completes. If the consumer stops early
+    (client disconnect), the partial answer is discarded and not saved. If
+    the model fails or misses the first-token or between-chunk deadline, the
+    stream ends with the degraded answer (after whatever was already sent).
+    """
+    start_time = time.time()
+    with tracked_request("chat_stream"):
+        try:
+            ensure_resources()
+            answer, chat_request = prepare_chat(user_input, session_id, start_time)
+            if answer is not None:
+                yield answer
+                return
+
+            if not llm_breaker.allow():
+                yield degraded_answer(user_input, chat_request, CircuitOpenError(f"circuit '{llm_breaker.name}' is open"))
+                return
+
+            first_token_time = None
+            parts = []
+            llm_start = time.perf_counter()
+            stream = iter_with_deadlines(chat_request["chain"].stream(chat_request["input"]),
+                                         llm_first_token_deadline, llm_chunk_deadline, llm_breaker.name)
+            try:
+                for chunk in stream:
+                    text = chunk if isinstance(chunk, str) else chunk.content
+                    if not text:
+                        continue
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                        record_stage(chat_request["timings"], "first_token", (time.perf_counter() - llm_start) * 1000)
+                        logger.info(f"Time to first token: {first_token_time - start_time:.2f}s")
+                    parts.append(text)
+                    yield text
+            except GeneratorExit:
+                llm_breaker.release()
+                raise
+            except Exception as e:
+                llm_breaker.record_failure(e)
+                answer = degraded_answer(user_input, chat_request, e)
+                yield "\n\n" + answer if parts else answer
+                return
+            finally:
+                # Stop the upstream generation as soon as the client goes away
+                stream.close()
+            llm_breaker.record_success()
+            record_stage(chat_request["timings"], "llm", (time.perf_counter() - llm_start) * 1000)
+
+            with timed_stage(chat_request["timings"], "persist"):
+                finish_chat(user_input, session_id, chat_request, "".join(parts))
+            logger.info(f"Streamed response in {time.time() - start_time:.2f}s")
+            log_timings(chat_request["timings"])
+        except GeneratorExit:
+            logger.info(f"Client disconnected after {time.time() - start_time:.2f}s. Discarding partial response.")
+            raise
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            metrics.fallbacks.inc(path="chat_stream", reason="error")
+            yield fallback_answer
+
+def sse_chat_events(user_input, session_id=DEFAULT_SESSION):
+    """Wrap stream_chat_with_ai as server-sent events."""
+    for text in stream_chat_with_ai(user_input, session_id):
+        yield f"data: {json.dumps({'token': text})}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+def sse_response(user_input, session_id=DEFAULT_SESSION):
+    """Return a Flask streaming response of server-sent chat events."""
+    return Response(stream_with_context(sse_chat_events(user_input, session_id)),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ------------------------------------
+# Part 12a: Startup
+# ------------------------------------
+# Importing this module only defines things; the corpus, indexes, vector
+# store, history database and LLM client are created by init_resources(),
+# on the first request or up front from a server hook. preload_resources()
+# loads the part that is read-only and fork-safe (the synced corpus, the
+# memory-mapped corpus store and the lexical index), so a preforking server
+# can load it once in the master and share it with its workers copy-on-write
+# (see gunicorn.conf.py). Everything holding connections, file handles or
+# client threads (Chroma, SQLite, the query embedding cache, the LLM client)
+# is opened per process by init_resources().
+resources_lock = threading.RLock()
+shared_resources_ready = False
+resources_ready = False
+
+def preload_resources():
+    """Load the fork-safe, read-only resources (once)."""
+    global shared_resources_ready
+    with resources_lock:
+        if shared_resources_ready:
+            return
+        start_time = time.time()
+        configure_logging()
+        load_corpus()
+        load_lexical_index()
+        shared_resources_ready = True
+        logger.info(f"Preloaded corpus and indexes in {time.time() - start_time:.2f}s")
+
+def init_resources():
+    """Create everything the chat path needs (once per process)."""
+    global retriever, llm, resources_ready
+    with resources_lock:
+        if resources_ready:
+            return
+        preload_resources()
+        start_time = time.time()
+        open_history_store()
+        retriever = initialize_retriever()
+        if retriever is None:
+            raise RuntimeError("Failed to initialize retriever.")
+        open_response_cache()
+        llm = create_llm()
+        open_conversation_memory()
+        warm_intent_chains()
+        resources_ready = True
+        logger.info(f"Initialized chat resources in {time.time() - start_time:.2f}s")
+
+def ensure_resources():
+    if not resources_ready:
+        init_resources()
 
 # ------------------------------------
 # Part 13: Flask API for Frontend
@@ -434,6 +1229,15 @@ def chat_with_ai(user_input):
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+def get_session_id(data=None, headers=None):
+    """Read the chat session ID from the JSON body or the X-Session-ID header.
+
+    `headers` defaults to the current Flask request's (the Quart app passes its own).
+    """
+    headers = request.headers if headers is None else headers
+    session_id = (data or {}).get('session_id') or headers.get('X-Session-ID')
+    return str(session_id)[:128] if session_id else DEFAULT_SESSION
+
 @app.route('/chat', methods=['POST'])
 def handle_chat():
     """API endpoint to handle chat requests from the frontend."""
@@ -445,20 +1249,45 @@ def handle_chat():
             return jsonify({'message': 'Please provide a message.'}), 400
         
         # Generate response
-        response = chat_with_ai(user_message)
+        response = chat_with_ai(user_message, get_session_id(data))
         
         return jsonify({'message': response})
     except Exception as e:
         logger.error(f"API error: {str(e)}")
         return jsonify({'message': 'An error occurred. Please try again.'}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def handle_chat_stream():
+    """API endpoint that streams the chat response as server-sent events."""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return jsonify({'message': 'Please provide a message.'}), 400
+
+    return sse_response(user_message, get_session_id(data))
+
+@app.route('/calculate', methods=['POST'])
+def handle_calculate():
+    """API endpoint for batch financial calculations (see calculators.py)."""
+    try:
+        return jsonify(calculate_batch(request.get_json(silent=True) or {}))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Calculate error: {str(e)}")
+        return jsonify({'message': 'An error occurred. Please try again.'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """Prometheus scrape endpoint (stage latencies, fallbacks, errors, caches)."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/clear_history', methods=['POST'])
 def clear_history():
     """API endpoint to clear chat history."""
     try:
-        global chat_history
-        chat_history = ChatMessageHistory()
-        save_chat_history(chat_history)
+        clear_chat_history(get_session_id(request.get_json(silent=True)))
         return jsonify({'message': 'Chat history cleared successfully.'}), 200
     except Exception as e:
         logger.error(f"Clear history error: {str(e)}")
@@ -470,6 +1299,7 @@ def clear_history():
 if __name__ == "__main__":
     # Run as API server when executed directly
     port = int(os.environ.get("PORT", 5000))
+    init_resources()
     logger.info(f"Starting Finance Chatbot API server on port {port}")
     print(f"Flask Chatbot API running on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,211 @@
+# ------------------------------------
+# Query Embedding Cache
+# ------------------------------------
+# Wraps the retriever's embedding backend so a question that was embedded
+# before skips the remote embedding call. Vectors are keyed on the embedding
+# model and the normalized query text, kept in an in-memory LRU and, when a
+# path is given, in a SQLite table (WAL mode) so they survive restarts and
+# are shared by every worker process. Document embedding (indexing) passes
+# straight through.
+import time
+import sqlite3
+import asyncio
+import inspect
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from response_cache import normalize_query
+
+logger = logging.getLogger("finance_chatbot")
+
+KEY_BYTES = 16
+
+
+def embedding_model_name(embeddings):
+    """Best-effort model identifier for an embedding backend."""
+    model = getattr(embeddings, "model", None)
+    if model:
+        return str(model)
+    size = getattr(embeddings, "size", None)
+    return f"{type(embeddings).__name__}:{size}" if size else type(embeddings).__name__
+
+
+def embed_query_batch(embeddings, texts):
+    """Embed several queries in one backend call.
+
+    Gemini embeds queries and documents with different task types, so the
+    query task type is passed when the backend takes one.
+    """
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return embeddings.embed_documents(texts)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper with an LRU (and optional disk) cache for queries.
+
+    On disk each vector is one row: the 16-byte key digest, the model and
+    the vector as little-endian float32. Rows of another model are dropped
+    when the file is opened; past `max_disk_entries` the oldest rows are
+    deleted every `sweep_interval` writes. The disk entry count in stats()
+    is counted at open and at each sweep and tracked in between, so reading
+    it never touches the database.
+    """
+
+    sweep_interval = 500
+
+    def __init__(self, embeddings, max_entries=2048, disk_path=None, max_disk_entries=50000, model_name=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or embedding_model_name(embeddings)
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        self._puts = 0
+        self._disk_entries = 0
+        if disk_path:
+            self._open_disk()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}|{normalize_query(text)}".encode("utf-8")).digest()[:KEY_BYTES]
+
+    # Disk tier -------------------------------------------------------------
+    def _open_disk(self):
+        # One connection, used under self._lock; other processes share the file through SQLite's locking
+        self._db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key BLOB PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)")
+        dropped = self._db.execute("DELETE FROM query_embeddings WHERE model != ?", (self.model_name,)).rowcount
+        self._db.commit()
+        if dropped:
+            logger.info(f"Dropped {dropped} query embeddings cached for another model.")
+        self._disk_entries = self._disk_count()
+        logger.info(f"Opened query embedding cache '{self.disk_path}' ({self._disk_entries} entries).")
+
+    def close(self):
+        """Close the disk tier's connection (don't carry an open one across a fork)."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _disk_count(self):
+        return self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+    def _disk_get(self, key):
+        row = self._db.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+        return np.frombuffer(row[0], dtype="<f4").copy() if row else None
+
+    def _disk_put(self, key, vector):
+        self._db.execute("INSERT OR REPLACE INTO query_embeddings (key, model, vector, created) VALUES (?, ?, ?, ?)",
+                         (key, self.model_name, vector.astype("<f4").tobytes(), time.time()))
+        self._db.commit()
+        self._puts += 1
+        # Only missed keys are written, so this is almost always a new row
+        self._disk_entries += 1
+        if self.max_disk_entries and self._puts % self.sweep_interval == 0:
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,))
+            self._db.commit()
+            # Also picks up rows other processes wrote
+            self._disk_entries = self._disk_count()
+
+    # Memory tier -----------------------------------------------------------
+    def _lookup(self, text):
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return key, vector
+            if self._db is not None:
+                vector = self._disk_get(key)
+                if vector is not None:
+                    self.counters["disk_hits"] += 1
+                    self._remember(key, vector)
+                    return key, vector
+            self.counters["misses"] += 1
+        return key, None
+
+    def _remember(self, key, vector):
+        # Called with the lock held
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _store(self, key, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._disk_put(key, vector)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write query embedding cache: {str(e)}")
+        return vector
+
+    # Embeddings interface ---------------------------------------------------
+    def embed_query(self, text):
+        key, vector = self._lookup(text)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(text))
+        return vector.tolist()
+
+    async def aembed_query(self, text):
+        # The disk tier does blocking file I/O - keep it off the event loop
+        key, vector = await asyncio.to_thread(self._lookup, text)
+        if vector is None:
+            embedding = await self.embeddings.aembed_query(text)
+            vector = await asyncio.to_thread(self._store, key, embedding)
+        return vector.tolist()
+
+    def embed_queries(self, texts, return_calls=False):
+        """Embed several queries, sending only the uncached ones to the backend.
+
+        With return_calls=True, returns (vectors, backend calls made), the
+        calls being 0 when every query was cached.
+        """
+        looked_up = [self._lookup(text) for text in texts]
+        missing = [idx for idx, (_, vector) in enumerate(looked_up) if vector is None]
+        vectors = [vector for _, vector in looked_up]
+        if missing:
+            embeddings = embed_query_batch(self.embeddings, [texts[idx] for idx in missing])
+            for idx, embedding in zip(missing, embeddings):
+                vectors[idx] = self._store(looked_up[idx][0], embedding)
+        vectors = [vector.tolist() for vector in vectors]
+        return (vectors, int(bool(missing))) if return_calls else vectors
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "disk_entries": self._disk_entries if self._db is not None else 0,
+            }
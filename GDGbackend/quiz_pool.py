@@ -0,0 +1,267 @@
+# ------------------------------------
+# Pre-generated Quiz Question Pool
+# ------------------------------------
+# Questions are generated ahead of time, validated, de-duplicated and kept
+# per (category, difficulty) bucket in memory and on disk. /quiz pops from
+# the pool in constant time; when a bucket runs low a background worker
+# refills it with a new batch. Buckets fill lazily, as /quiz touches them,
+# and refill calls are rate-limited, so a restart doesn't spend a burst of
+# quota. Only one process (the holder of the snapshot's lock file) loads and
+# writes the snapshot; it is rewritten after every change, so questions that
+# were served are not served again after a restart.
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server
+    fcntl = None
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("finance_chatbot")
+
+
+def question_signature(question):
+    """Word set of a question's text, used for near-duplicate detection."""
+    return frozenset(re.findall(r"[a-z0-9]+", question.get("question", "").lower()))
+
+
+def is_near_duplicate(signature, signatures, threshold):
+    """True if the signature's Jaccard similarity to any known one reaches the threshold."""
+    for other in signatures:
+        union = len(signature | other)
+        if union and len(signature & other) / union >= threshold:
+            return True
+    return False
+
+
+class QuizPool:
+    """Bucketed quiz question pool with background refill.
+
+    `generate_batch(category, difficulty, count)` returns a list of question
+    dicts (or None); `validate(questions)` returns an error message or None.
+    """
+
+    def __init__(self, generate_batch, validate, categories, difficulties, path=None,
+                 target_size=6, low_watermark=2, batch_size=5, workers=2, duplicate_threshold=0.8,
+                 refills_per_minute=12):
+        self.generate_batch = generate_batch
+        self.validate = validate
+        self.categories = list(categories)
+        self.difficulties = list(difficulties)
+        self.path = path
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.duplicate_threshold = duplicate_threshold
+        self.refill_interval = 60.0 / refills_per_minute if refills_per_minute else 0.0
+
+        self.buckets = {(c, d): deque() for c in self.categories for d in self.difficulties}
+        # Signatures of recently pooled questions, served ones included, so repeats are dropped
+        self.signatures = {key: deque(maxlen=500) for key in self.buckets}
+        self._low_since = {}
+        self._refilling = set()
+        self._next_refill_at = 0.0
+        self._save_pending = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-refill")
+        self.counters = {"requests": 0, "hits": 0, "partial_hits": 0, "misses": 0,
+                         "refills": 0, "refill_failures": 0, "duplicates_dropped": 0, "invalid_dropped": 0}
+        self.refill_lag = {"last": 0.0, "max": 0.0, "total": 0.0}
+        self._lock_file = None
+        self.owns_snapshot = self._acquire_snapshot()
+        self._load()
+
+    # Persistence -----------------------------------------------------------
+    def _acquire_snapshot(self):
+        """Take the snapshot's lock file; held for the life of the process."""
+        if not self.path:
+            return False
+        if fcntl is None:
+            return True
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.info(f"Quiz pool snapshot '{self.path}' is owned by another process. Pooling in memory only.")
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _load(self):
+        if not self.owns_snapshot or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Quiz pool file unreadable ({e}). Starting empty.")
+            return
+        loaded = 0
+        for entry in saved.get("buckets", []):
+            key = (entry.get("category"), entry.get("difficulty"))
+            if key not in self.buckets:
+                continue
+            for question in entry.get("questions", []):
+                self.buckets[key].append(question)
+                self.signatures[key].append(question_signature(question))
+                loaded += 1
+        logger.info(f"Loaded {loaded} pooled quiz questions from '{self.path}'.")
+
+    def _schedule_save(self):
+        # Called with the lock held; one queued save covers every change before it runs
+        if self.owns_snapshot and not self._save_pending:
+            self._save_pending = True
+            self._pool.submit(self._save)
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                self._save_pending = False
+                snapshot = {"buckets": [{"category": c, "difficulty": d, "questions": list(questions)}
+                                        for (c, d), questions in self.buckets.items()]}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not save the quiz pool: {str(e)}")
+
+    # Refill ----------------------------------------------------------------
+    def _schedule_refill(self, key):
+        # Called with the lock held
+        if key in self._refilling or len(self.buckets[key]) > self.low_watermark:
+            return
+        self._refilling.add(key)
+        self._low_since.setdefault(key, time.time())
+        self._pool.submit(self._refill, key)
+
+    def _throttle(self):
+        """Wait for the next refill slot (refills_per_minute across all buckets)."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_refill_at - now)
+            self._next_refill_at = max(now, self._next_refill_at) + self.refill_interval
+        if wait:
+            time.sleep(wait)
+
+    def _refill(self, key):
+        category, difficulty = key
+        try:
+            added = 0
+            # Bounded attempts so a model that keeps repeating itself can't spin forever
+            for _ in range(3):
+                with self._lock:
+                    if len(self.buckets[key]) >= self.target_size:
+                        break
+                self._throttle()
+                batch = self.generate_batch(category, difficulty, self.batch_size)
+                if not batch:
+                    with self._lock:
+                        self.counters["refill_failures"] += 1
+                    break
+                added += self._add_batch(key, batch)
+            with self._lock:
+                lag = time.time() - self._low_since.pop(key, time.time())
+                self.refill_lag["last"] = lag
+                self.refill_lag["max"] = max(self.refill_lag["max"], lag)
+                self.refill_lag["total"] += lag
+                self.counters["refills"] += 1
+                if added:
+                    self._schedule_save()
+            logger.info(f"Refilled quiz bucket {category}/{difficulty} with {added} question(s) in {lag:.2f}s")
+        except Exception as e:
+            with self._lock:
+                self.counters["refill_failures"] += 1
+            logger.error(f"Quiz pool refill error for {category}/{difficulty}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def _add_batch(self, key, batch):
+        added = 0
+        with self._lock:
+            for question in batch:
+                if not isinstance(question, dict) or self.validate([question]):
+                    self.counters["invalid_dropped"] += 1
+                    continue
+                signature = question_signature(question)
+                if is_near_duplicate(signature, self.signatures[key], self.duplicate_threshold):
+                    self.counters["duplicates_dropped"] += 1
+                    continue
+                self.buckets[key].append(question)
+                self.signatures[key].append(signature)
+                added += 1
+        return added
+
+    def warm(self):
+        """Schedule a refill for every bucket that is below its low watermark.
+
+        The refills still go through the rate limit, so a full warm-up of
+        every bucket is spread out over several minutes.
+        """
+        with self._lock:
+            for key in self.buckets:
+                self._schedule_refill(key)
+
+    # Serving ---------------------------------------------------------------
+    def take(self, count=3):
+        """Pop `count` questions from random buckets, renumbered from 1.
+
+        Returns None if the pool can't supply them all. Every bucket touched
+        is checked against its low watermark and refilled in the background.
+        """
+        categories = random.sample(self.categories, k=min(count, len(self.categories)))
+        difficulty = random.choice(self.difficulties)
+        questions = []
+        with self._lock:
+            self.counters["requests"] += 1
+            for category in categories:
+                key = (category, difficulty)
+                if not self.buckets[key]:
+                    # Fall back to any non-empty bucket at the same difficulty, then any at all
+                    key = next((k for k in self.buckets if k[1] == difficulty and self.buckets[k]),
+                               next((k for k in self.buckets if self.buckets[k]), None))
+                if key is not None:
+                    questions.append((key, self.buckets[key].popleft()))
+                    self._schedule_refill(key)
+                self._schedule_refill((category, difficulty))
+
+            if len(questions) < count:
+                # Put back what we took so a half-empty pool doesn't lose questions
+                for key, question in reversed(questions):
+                    self.buckets[key].appendleft(question)
+                self.counters["misses" if not questions else "partial_hits"] += 1
+                return None
+            self.counters["hits"] += 1
+            # Served questions must not come back from the snapshot after a restart
+            self._schedule_save()
+
+        questions = [dict(question, id=i) for i, (_, question) in enumerate(questions, 1)]
+        return questions
+
+    def stats(self):
+        with self._lock:
+            requests = self.counters["requests"]
+            refills = self.counters["refills"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / requests, 4) if requests else None,
+                "refill_lag_seconds": {
+                    "last": round(self.refill_lag["last"], 3),
+                    "max": round(self.refill_lag["max"], 3),
+                    "avg": round(self.refill_lag["total"] / refills, 3) if refills else None,
+                },
+                "pooled": sum(len(q) for q in self.buckets.values()),
+                "refilling": len(self._refilling),
+                "buckets": {f"{c}/{d}": len(q) for (c, d), q in self.buckets.items()},
+            }
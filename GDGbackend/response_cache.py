@@ -0,0 +1,211 @@
+# ------------------------------------
+# Response Cache for chat_with_ai
+# ------------------------------------
+# Answers are keyed on the normalized query, the detected intent and the
+# trimmed history. An optional semantic mode also serves a cached answer when
+# a new query's embedding is close enough to a cached one with the same intent
+# and history. Entries are evicted LRU-first when over the entry or memory
+# cap, and expire after a TTL. A SQLite file can back the in-memory tier so
+# the cache survives restarts; it is swept of expired rows and capped at
+# `max_disk_entries`, oldest first.
+#
+# Every lookup ends in exactly one of hits, semantic_hits or misses.
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("finance_chatbot")
+
+
+def normalize_query(text):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+def history_digest(messages):
+    """Hash the trimmed history so it can be part of a cache key."""
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(f"{msg.type}:{msg.content}\x00".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class ResponseCache:
+    """LRU/TTL response cache with optional semantic-similarity hits."""
+
+    # Puts between two sweeps of the disk table
+    sweep_interval = 100
+
+    def __init__(self, max_entries=1000, max_bytes=32 * 1024 * 1024, ttl=86400,
+                 semantic_threshold=0.0, disk_path=None, max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.counters = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, scope TEXT, response TEXT, vector BLOB, created REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._db.commit()
+            self._warm_from_disk()
+
+    @property
+    def semantic(self):
+        return self.semantic_threshold > 0
+
+    @staticmethod
+    def make_key(query, intent, history):
+        scope = f"{intent}:{history_digest(history)}"
+        key = hashlib.sha256(f"{scope}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+        return key, scope
+
+    # Memory tier -----------------------------------------------------------
+    @staticmethod
+    def _size(response, vector):
+        return len(response.encode("utf-8")) + (vector.nbytes if vector is not None else 0) + 200
+
+    def _insert(self, key, scope, response, vector, created):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)["size"]
+        size = self._size(response, vector)
+        self._entries[key] = {"scope": scope, "response": response, "vector": vector,
+                              "created": created, "size": size}
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["size"]
+            self.counters["evictions"] += 1
+
+    def _expired(self, entry, now):
+        return self.ttl and now - entry["created"] > self.ttl
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry["size"]
+
+    # Disk tier -------------------------------------------------------------
+    def _sweep_disk(self):
+        """Delete expired rows and the oldest rows over the disk cap."""
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        self._db.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+        if self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+        self._db.commit()
+
+    def _warm_from_disk(self):
+        self._sweep_disk()
+        rows = self._db.execute(
+            "SELECT key, scope, response, vector, created FROM responses ORDER BY created DESC LIMIT ?",
+            (self.max_entries,)).fetchall()
+        for key, scope, response, blob, created in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32) if blob else None
+            self._insert(key, scope, response, vector, created)
+        if rows:
+            logger.info(f"Warmed response cache with {len(self._entries)} entries from disk.")
+
+    def _load_from_disk(self, key, now):
+        row = self._db.execute("SELECT scope, response, vector, created FROM responses WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None or (self.ttl and now - row[3] > self.ttl):
+            return None
+        scope, response, blob, created = row
+        vector = np.frombuffer(blob, dtype=np.float32) if blob else None
+        self._insert(key, scope, response, vector, created)
+        return response
+
+    # Public API ------------------------------------------------------------
+    def get(self, query, intent, history):
+        """Return a cached response for an exact (normalized) match, or None."""
+        key, _ = self.make_key(query, intent, history)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry, now):
+                self._drop(key)
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry["response"]
+            if self._db is not None:
+                response = self._load_from_disk(key, now)
+                if response is not None:
+                    self.counters["hits"] += 1
+                    return response
+            self.counters["misses"] += 1
+            return None
+
+    def get_similar(self, vector, intent, history):
+        """Return the cached response whose query embedding is closest to
+        `vector` within the same intent and history, if above the threshold.
+
+        Called after get() missed for the same query, so a hit here turns
+        that miss into a semantic hit instead of adding a lookup.
+        """
+        if not self.semantic or vector is None:
+            return None
+        _, scope = self.make_key("", intent, history)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.time()
+
+        with self._lock:
+            candidates = [(key, entry) for key, entry in self._entries.items()
+                          if entry["scope"] == scope and entry["vector"] is not None
+                          and not self._expired(entry, now)]
+            if candidates:
+                matrix = np.stack([entry["vector"] for _, entry in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.semantic_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.counters["semantic_hits"] += 1
+                    self.counters["misses"] -= 1
+                    return entry["response"]
+            return None
+
+    def put(self, query, intent, history, response, vector=None):
+        """Cache a response, with its query embedding for semantic lookups."""
+        key, scope = self.make_key(query, intent, history)
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            self._insert(key, scope, response, vector, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, scope, response, vector, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, scope, response, vector.tobytes() if vector is not None else None, now))
+                self._puts += 1
+                if self._puts % self.sweep_interval == 0:
+                    self._sweep_disk()
+                else:
+                    self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes)
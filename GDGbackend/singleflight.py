@@ -0,0 +1,119 @@
+# ------------------------------------
+# Request Coalescing (singleflight)
+# ------------------------------------
+# Concurrent calls with the same key share one in-flight computation: the
+# first caller (the leader) runs it and every caller that arrives before it
+# finishes waits for the same result, or the same exception. Nothing is kept
+# once the computation finishes, so a later call always computes afresh.
+# Followers can be given a wait limit, after which they give up with
+# CoalesceTimeout. Each group's counters are exported on /metrics.
+import asyncio
+import threading
+
+import metrics
+
+groups = []
+
+
+class CoalesceTimeout(TimeoutError):
+    """A follower gave up waiting for the leader's result."""
+
+
+def _collect():
+    for group in list(groups):
+        for event, value in group.stats().items():
+            yield {"path": group.name, "event": event}, value
+
+
+metrics.registry.collector("finverse_coalesced_requests_total",
+                           "Requests that led or joined a shared in-flight computation.", "counter", _collect)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls per key across threads."""
+
+    def __init__(self, name, wait_timeout=None):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+        groups.append(self)
+
+    def do(self, key, fn):
+        """Return (fn()'s result, shared), running fn at most once per key at a time.
+
+        `shared` is True for followers that received the leader's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.counters["leaders" if leader else "coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self.counters["timeouts"] += 1
+                raise CoalesceTimeout(f"gave up waiting for a shared {self.name} request after {self.wait_timeout}s")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Coalesce concurrent coroutine calls per key on one event loop.
+
+    The shared computation runs as its own task, so a caller that is
+    cancelled (e.g. by its request deadline) doesn't cancel it for the others.
+    """
+
+    async def do(self, key, coro_fn):
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = self._calls[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        self.counters["leaders" if leader else "coalesced"] += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), None if leader else self.wait_timeout), not leader
+        except asyncio.TimeoutError:
+            if not leader and not task.done():
+                self.counters["timeouts"] += 1
+                raise CoalesceTimeout(f"gave up waiting for a shared {self.name} request after {self.wait_timeout}s")
+            raise
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Reading the exception also keeps asyncio from warning that it was never retrieved
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
@@ -0,0 +1,62 @@
+"""Offline test setup: every Gemini client is replaced by the fakes in fakes.py.
+
+Run from GDGbackend/:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# practice.py reads its configuration at import time
+os.environ.setdefault("GOOGLE_API_KEY", "offline")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+os.environ.setdefault("FAKE_EMBED_DELAY", "0")
+os.environ.setdefault("FAKE_LLM_FIRST_TOKEN_DELAY", "0")
+os.environ.setdefault("FAKE_LLM_TOKEN_DELAY", "0")
+os.environ.setdefault("FAKE_QUIZ_DELAY", "0")
+
+import pytest
+
+BOOK_PAGES = [
+    "Budgeting starts with tracking income and expenses. The 50/30/20 rule puts half of take-home pay "
+    "toward needs, thirty percent toward wants and twenty percent toward savings and debt repayment.",
+    "Index funds spread an investment across many stocks. Diversification lowers the risk of any single "
+    "company failing, and low fees let compounding work over decades.",
+    "Pay off high-interest credit card debt first. The avalanche method targets the highest rate, while "
+    "the snowball method clears the smallest balance to build momentum.",
+    "Retirement accounts grow tax-deferred. Saving fifteen percent of income from your thirties keeps "
+    "most savers on track, and an emergency fund covers three to six months of expenses.",
+]
+
+
+def write_book(path, pages=BOOK_PAGES):
+    """Write a small text PDF, one paragraph per page."""
+    import fitz
+
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(72, 72, 540, 720), text, fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+@pytest.fixture(scope="session")
+def backend(tmp_path_factory):
+    """practice.py initialized on a one-book corpus in a scratch working directory."""
+    workdir = tmp_path_factory.mktemp("backend")
+    os.makedirs(workdir / "books")
+    write_book(str(workdir / "books" / "basics.pdf"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    import practice
+    practice.init_resources()
+    yield practice
+    # Flush the log queue while pytest's captured streams are still open
+    if practice.log_pipeline_handle is not None:
+        practice.log_pipeline_handle.stop()
+    os.chdir(cwd)
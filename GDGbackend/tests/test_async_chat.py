@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from fakes import DEFAULT_FAKE_ANSWER
+
+
+def test_blocking_steps_stay_off_the_event_loop(backend, monkeypatch):
+    loop_threads = set()
+    blocking_threads = []
+    load_history = backend.load_history
+
+    def recording_load_history(session_id):
+        blocking_threads.append(threading.get_ident())
+        return load_history(session_id)
+
+    monkeypatch.setattr(backend, "load_history", recording_load_history)
+
+    async def chat():
+        loop_threads.add(threading.get_ident())
+        return await asyncio.gather(*(backend.achat_with_ai(f"How much should I save each month? ({idx})",
+                                                            f"async-{idx}") for idx in range(3)))
+
+    answers = asyncio.run(chat())
+    assert answers == [DEFAULT_FAKE_ANSWER] * 3
+    # coalescing_key and begin_chat both read the history
+    assert len(blocking_threads) == 6
+    assert loop_threads.isdisjoint(blocking_threads)
+    assert len(backend.history_store.recent("async-0", 10)) == 2
+
+
+def test_async_app_answers_and_reads_the_session_header(backend):
+    import async_app
+
+    async def post():
+        client = async_app.app.test_client()
+        return await client.post("/chat", json={"message": "What is the snowball method for debt?"},
+                                 headers={"X-Session-ID": "async-header"})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    assert len(backend.history_store.recent("async-header", 10)) == 2
+
+
+def test_waiting_for_a_slot_counts_toward_the_deadline(backend, monkeypatch):
+    import async_app
+
+    monkeypatch.setattr(async_app, "chat_timeout", 0.05)
+
+    async def post_while_full():
+        # A fresh semaphore, created on this loop, with its only slot taken
+        monkeypatch.setattr(async_app, "inflight", asyncio.Semaphore(1))
+        await async_app.inflight.acquire()
+        client = async_app.app.test_client()
+        response = await client.post("/chat", json={"message": "How big should an emergency fund be?"})
+        return response.status_code, await response.get_json(), async_app.inflight.locked()
+
+    status, body, still_full = asyncio.run(post_while_full())
+    assert status == 503 and "busy" in body["error"]
+    # The refused request didn't give back a slot it never had
+    assert still_full
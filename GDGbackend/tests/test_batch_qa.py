@@ -0,0 +1,105 @@
+import json
+
+import batch_qa
+
+QUESTIONS = [
+    "How should a beginner think about index funds and diversification for the long run?",
+    "Why does the avalanche method pay off the highest interest credit card debt first?",
+    "What share of take-home pay does the budgeting rule put toward savings each month?",
+]
+
+
+def write_questions(path, prefix):
+    with open(path, "w", encoding="utf-8") as f:
+        for idx, question in enumerate(QUESTIONS):
+            f.write(json.dumps({"id": f"{prefix}{idx}", "question": question}) + "\n")
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_failures_are_retried_without_duplicates(backend, tmp_path, monkeypatch):
+    questions, output = str(tmp_path / "questions.jsonl"), str(tmp_path / "answers.jsonl")
+    write_questions(questions, "retry-")
+    answer_question = batch_qa.answer_question
+    failing = {"retry-1"}
+
+    def flaky_answer_question(question_id, *args):
+        if question_id in failing:
+            raise RuntimeError("upstream down")
+        return answer_question(question_id, *args)
+
+    monkeypatch.setattr(batch_qa, "answer_question", flaky_answer_question)
+    first = batch_qa.run(questions, output, concurrency=2)
+    assert (first["answered"], first["failed"]) == (2, 1)
+    assert sorted(record["id"] for record in read_jsonl(output)) == ["retry-0", "retry-2"]
+    assert [record["id"] for record in read_jsonl(batch_qa.errors_path(output))] == ["retry-1"]
+
+    failing.clear()
+    second = batch_qa.run(questions, output, concurrency=2)
+    assert (second["answered"], second["failed"], second["skipped"]) == (1, 0, 2)
+    assert sorted(record["id"] for record in read_jsonl(output)) == ["retry-0", "retry-1", "retry-2"]
+    assert read_jsonl(batch_qa.errors_path(output)) == []
+
+
+def test_resume_compacts_old_error_records(backend, tmp_path):
+    questions, output = str(tmp_path / "questions.jsonl"), str(tmp_path / "answers.jsonl")
+    write_questions(questions, "legacy-")
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "legacy-0", "question": QUESTIONS[0], "error": "timeout"}) + "\n")
+        f.write(json.dumps({"id": "legacy-0", "question": QUESTIONS[0], "error": "timeout"}) + "\n")
+        f.write(json.dumps({"id": "legacy-1", "question": QUESTIONS[1], "answer": "kept"}) + "\n")
+        f.write('{"id": "legacy-2", "quest')
+
+    summary = batch_qa.run(questions, output)
+    assert (summary["answered"], summary["skipped"]) == (2, 1)
+    records = read_jsonl(output)
+    assert sorted(record["id"] for record in records) == ["legacy-0", "legacy-1", "legacy-2"]
+    assert not any("error" in record for record in records)
+
+
+def test_embed_calls_count_backend_calls(backend, tmp_path):
+    questions = str(tmp_path / "questions.jsonl")
+    asked = [f"{question[:-1]} when I am {age} years old?" for question in QUESTIONS for age in (30, 40)]
+    # The lower-cased copies in the second batch map to the same cache keys
+    with open(questions, "w", encoding="utf-8") as f:
+        for idx, question in enumerate(asked + [question.lower() for question in asked]):
+            f.write(json.dumps({"id": f"embed-{idx}", "question": question}) + "\n")
+
+    first = batch_qa.run(questions, str(tmp_path / "first.jsonl"), batch_size=len(asked))
+    assert first["embed_calls"] == 1
+    second = batch_qa.run(questions, str(tmp_path / "second.jsonl"), batch_size=len(asked))
+    assert second["embed_calls"] == 0
+
+
+def test_uncached_embeddings_make_one_call_per_batch(backend, monkeypatch):
+    from types import SimpleNamespace
+    from fakes import FakeRemoteEmbeddings
+
+    # A vector store whose embeddings have no query cache in front
+    embeddings = FakeRemoteEmbeddings(delay=0)
+    monkeypatch.setattr(backend, "retriever", SimpleNamespace(vectorstore=SimpleNamespace(embeddings=embeddings)))
+    vectors, calls = batch_qa.embed_batch(QUESTIONS)
+    assert calls == 1 and embeddings.calls == {"queries": 0, "documents": 1}
+    assert all(vector is not None for vector in vectors)
+
+
+def test_answers_go_through_the_chat_model_breaker(backend, tmp_path, monkeypatch):
+    from circuit_breaker import CircuitBreaker
+    from fakes import FakeProviderError
+
+    breaker = CircuitBreaker("llm-batch-test", failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(backend, "llm_breaker", breaker)
+    questions, output = str(tmp_path / "questions.jsonl"), str(tmp_path / "answers.jsonl")
+    write_questions(questions, "breaker-")
+
+    batch_qa.run(questions, output)
+    assert breaker.stats()["successes"] == len(QUESTIONS)
+
+    breaker.record_failure(FakeProviderError("provider down"))
+    write_questions(questions, "open-")
+    summary = batch_qa.run(questions, output)
+    assert summary["failed"] == len(QUESTIONS)
+    assert breaker.stats()["rejected"] == len(QUESTIONS)
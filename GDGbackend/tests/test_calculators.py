@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from calculators import calculate_batch
+
+
+def test_loan_grid_matches_the_scalar_formula():
+    result = calculate_batch({"type": "loan", "principal": 200000, "rate": [0, 6], "years": [15, 30], "grid": True})
+    assert result["scenarios"] == 4
+    assert result["results"][0] == round(200000 / 180, 2)
+    assert result["results"][3] == 1199.10
+
+
+@pytest.mark.parametrize("payload, message", [
+    ([{"type": "loan"}], "JSON object"),
+    ({"type": "mortgage"}, "type must be one of"),
+    ({"type": "loan", "principal": 1000, "rate": 5}, "missing parameters: years"),
+    ({"type": "compound_interest", "principal": 1000, "rate": 5, "years": 10, "compounds_per_year": 0},
+     "compounds_per_year"),
+    ({"type": "loan", "principal": 1000, "rate": 5, "years": 0.01}, "at least one month"),
+    ({"type": "loan", "principal": [1, 2], "rate": [1, 2, 3], "years": 5}, "same length"),
+    ({"type": "loan", "principal": 200000, "rate": list(range(200)), "years": 30, "schedule": True},
+     "schedule too large to return: 200 scenarios x 360 months"),
+])
+def test_bad_requests_raise_value_error(payload, message):
+    with pytest.raises(ValueError, match=message):
+        calculate_batch(payload)
+
+
+def test_schedules_end_on_the_totals():
+    loan = calculate_batch({"type": "loan", "principal": 10000, "rate": 7, "years": 2.52, "schedule": True})
+    schedule = loan["schedule"]
+    assert loan["inputs"]["years"] == [2.5]
+    assert schedule["payment"][0][-1] == loan["results"][0]
+    assert schedule["balance"][0][-1] == 0
+
+    savings = calculate_batch({"type": "retirement", "current_savings": 5000, "monthly_contribution": 300,
+                               "years": [10.04, 3], "annual_return": 6, "schedule": True})
+    final_balances = [row[-1] for row in savings["schedule"]["balance"]]
+    assert np.allclose(final_balances, savings["results"], atol=0.01)
+
+
+def test_calculate_endpoint_rejects_a_list_body():
+    import practice
+
+    response = practice.app.test_client().post("/calculate", json=[{"type": "loan"}])
+    assert response.status_code == 400
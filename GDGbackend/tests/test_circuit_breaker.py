@@ -0,0 +1,166 @@
+import time
+
+import pytest
+
+from circuit_breaker import (CircuitBreaker, CircuitOpenError, UpstreamTimeout, iter_with_deadlines,
+                             CLOSED, HALF_OPEN, OPEN)
+from fakes import faults, FakeProviderError, DEFAULT_FAKE_ANSWER
+
+
+def fail():
+    raise FakeProviderError("provider down")
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test-cycle", failure_threshold=2, reset_timeout=0.1)
+    for _ in range(2):
+        with pytest.raises(FakeProviderError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+
+    # Open: refused without calling upstream
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: pytest.fail("called while open"))
+
+    # Half-open: one trial call; failing it opens the circuit again
+    time.sleep(0.12)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure(FakeProviderError("still down"))
+    assert breaker.state == OPEN
+
+    time.sleep(0.12)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+    stats = breaker.stats()
+    assert (stats["opened"], stats["half_opened"], stats["closed"]) == (2, 2, 1)
+    assert stats["rejected"] == 2
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test-reset", failure_threshold=2, reset_timeout=10)
+    with pytest.raises(FakeProviderError):
+        breaker.call(fail)
+    breaker.call(lambda: None)
+    with pytest.raises(FakeProviderError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED
+
+
+def test_deadline_counts_as_a_timeout():
+    breaker = CircuitBreaker("test-deadline", failure_threshold=1, reset_timeout=10, deadline=0.05)
+    with pytest.raises(UpstreamTimeout):
+        breaker.call(time.sleep, 0.5)
+    assert breaker.state == OPEN
+    assert breaker.stats()["timeouts"] == 1
+
+
+def slow_stream(first_delay, gap, items=3, closed=None):
+    try:
+        time.sleep(first_delay)
+        for idx in range(items):
+            if idx:
+                time.sleep(gap)
+            yield idx
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def test_stream_deadlines():
+    assert list(iter_with_deadlines(slow_stream(0, 0), 0.5, 0.5)) == [0, 1, 2]
+
+    with pytest.raises(UpstreamTimeout, match="first chunk"):
+        list(iter_with_deadlines(slow_stream(0.3, 0), 0.05, 0.5))
+
+    received = []
+    with pytest.raises(UpstreamTimeout, match="next chunk"):
+        for item in iter_with_deadlines(slow_stream(0, 0.3), 0.5, 0.05):
+            received.append(item)
+    assert received == [0]
+
+    with pytest.raises(FakeProviderError):
+        list(iter_with_deadlines((fail() for _ in range(1)), 0.5, 0.5))
+
+
+def test_closing_the_stream_stops_the_reader():
+    closed = []
+    stream = iter_with_deadlines(slow_stream(0, 0.01, items=100, closed=closed), 0.5, 0.5)
+    assert next(stream) == 0
+    stream.close()
+    time.sleep(0.1)
+    assert closed == [True]
+
+
+@pytest.fixture
+def llm_breaker(backend, monkeypatch):
+    """A fresh chat model breaker with a short reset, and no faults left behind."""
+    breaker = CircuitBreaker("llm-test", failure_threshold=2, reset_timeout=0.2, deadline=1)
+    monkeypatch.setattr(backend, "llm_breaker", breaker)
+    yield breaker
+    faults.configure(rate=0.0, mode="error", stall=30.0, targets=("llm", "embeddings", "quiz"))
+
+
+def test_chat_degrades_while_the_model_fails_and_recovers(backend, llm_breaker):
+    faults.configure(rate=1.0, mode="error", targets=["llm"])
+    injected = faults.injected
+    answers = [backend.chat_with_ai(f"Why do index funds lower risk for beginner investors? ({idx})",
+                                    f"degraded-{idx}") for idx in range(3)]
+
+    assert all(isinstance(answer, backend.DegradedAnswer) for answer in answers)
+    assert all(answer.startswith(backend.degraded_intro) for answer in answers)
+    # The third request found the circuit open and never reached the model
+    assert faults.injected - injected == 2
+    assert llm_breaker.state == OPEN
+    # Degraded answers are not saved
+    assert backend.history_store.recent("degraded-0", 10) == []
+
+    faults.configure(rate=0.0)
+    time.sleep(0.25)
+    assert backend.chat_with_ai("Why do index funds lower risk for beginner investors?", "recovered") \
+        == DEFAULT_FAKE_ANSWER
+    assert llm_breaker.state == CLOSED
+
+
+def test_stream_degrades_when_the_first_token_is_late(backend, llm_breaker, monkeypatch):
+    monkeypatch.setattr(backend, "llm_first_token_deadline", 0.05)
+    faults.configure(rate=1.0, mode="stall", stall=0.5, targets=["llm"])
+    parts = list(backend.stream_chat_with_ai("How long does it take to build an emergency fund?", "stream-late"))
+
+    assert len(parts) == 1 and parts[0].startswith(backend.degraded_intro)
+    assert llm_breaker.stats()["timeouts"] == 1
+    assert backend.history_store.recent("stream-late", 10) == []
+
+
+def test_stream_ends_with_the_degraded_answer_when_chunks_stall(backend, llm_breaker, monkeypatch):
+    monkeypatch.setattr(backend, "llm_chunk_deadline", 0.05)
+    monkeypatch.setattr(backend.llm, "token_delay", 0.3)
+    parts = list(backend.stream_chat_with_ai("Which debts should I pay off before I start to invest?",
+                                             "stream-stall"))
+
+    assert parts[0] == DEFAULT_FAKE_ANSWER.split(" ")[0] + " "
+    assert parts[-1].startswith("\n\n" + backend.degraded_intro)
+    assert llm_breaker.stats()["timeouts"] == 1
+    assert backend.history_store.recent("stream-stall", 10) == []
+
+
+def test_stream_refused_while_the_circuit_is_open(backend, llm_breaker):
+    for _ in range(2):
+        llm_breaker.record_failure(FakeProviderError("provider down"))
+    parts = list(backend.stream_chat_with_ai("Is a Roth account better than a traditional one for me?",
+                                             "stream-open"))
+    assert len(parts) == 1 and parts[0].startswith(backend.degraded_intro)
+    assert llm_breaker.stats()["rejected"] == 1
+
+
+def test_summaries_go_through_the_chat_model_breaker(backend, llm_breaker):
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    messages = [HumanMessage(content="I earn 4,000 a month."), AIMessage(content="Start with a budget.")]
+    assert backend.summarize_conversation("", messages)
+    assert llm_breaker.stats()["successes"] == 1
+
+    for _ in range(2):
+        llm_breaker.record_failure(FakeProviderError("provider down"))
+    with pytest.raises(CircuitOpenError):
+        backend.summarize_conversation("", messages)
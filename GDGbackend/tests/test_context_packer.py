@@ -0,0 +1,106 @@
+import pytest
+from langchain.schema import Document
+
+from context_packer import ContextPacker, estimate_tokens, join_overlapping, truncate_to_tokens
+
+SENTENCE = "Index funds spread an investment across many stocks and keep fees low. "
+
+
+def chunk(chunk_id, text, page=None):
+    metadata = {"chunk_id": chunk_id, "source": "book.pdf"}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata)
+
+
+@pytest.mark.parametrize("max_tokens", [1, 2, 3, 5, 10, 17, 50])
+def test_truncation_stays_within_the_budget(max_tokens):
+    text = SENTENCE * 20
+    truncated = truncate_to_tokens(text, max_tokens)
+    assert estimate_tokens(truncated) <= max_tokens
+    assert text.startswith(truncated[:-4].rstrip() if truncated.endswith(" ...") else truncated)
+
+
+def test_truncation_cuts_at_a_word_boundary():
+    truncated = truncate_to_tokens(SENTENCE * 5, 10)
+    assert truncated == "Index funds spread an investment ..."
+    assert truncate_to_tokens("short text", 10) == "short text"
+
+
+def test_join_overlapping_drops_the_shared_text():
+    shared = "Then list every expense you had last month, however small it was."
+    first = "Budgeting starts with tracking income. " + shared
+    second = shared + " Sort them into needs and wants."
+    assert join_overlapping(first, second, 400) == \
+        "Budgeting starts with tracking income. " + shared + " Sort them into needs and wants."
+    assert join_overlapping("No overlap here.", "Another chunk.", 400) == "No overlap here.\nAnother chunk."
+
+
+def test_merge_adjacent_stitches_runs_in_rank_order():
+    packer = ContextPacker(chunk_overlap=20)
+    docs = [
+        chunk("book.pdf-00003", "third part of the run", page=2),
+        chunk("other.pdf-00001", "a chunk from another book"),
+        chunk("book.pdf-00002", "second part of the run", page=1),
+        chunk("book.pdf-00009", "far away chunk", page=7),
+        Document(page_content="no chunk id", metadata={}),
+    ]
+    merged = packer.merge_adjacent(docs)
+
+    assert [doc.page_content for doc in merged] == [
+        "second part of the run\nthird part of the run",
+        "a chunk from another book",
+        "far away chunk",
+        "no chunk id",
+    ]
+    # The run takes the rank of its best member and spans both pages
+    assert merged[0].metadata["chunk_span"] == 2
+    assert (merged[0].metadata["page"], merged[0].metadata["page_end"]) == (1, 2)
+
+
+def test_dedupe_drops_near_duplicates_of_better_ranked_chunks():
+    packer = ContextPacker(duplicate_threshold=0.85)
+    original = " ".join(f"word{idx}" for idx in range(20))
+    near_copy = original + " extra"                       # Jaccard 20/21
+    different = " ".join(f"term{idx}" for idx in range(20))
+    kept = packer.dedupe([chunk("a-1", original), chunk("b-1", near_copy), chunk("c-1", different)])
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["a-1", "c-1"]
+    assert packer.dedupe([chunk("a-1", ""), chunk("b-1", "")])[0].metadata["chunk_id"] == "a-1"
+
+
+def test_pack_context_truncates_the_first_chunk_that_does_not_fit():
+    packer = ContextPacker()
+    docs = [chunk(f"book{idx}.pdf-00001", " ".join(f"topic{idx}word{n}" for n in range(100))) for idx in range(3)]
+    packed, used = packer.pack_context(docs, 760)
+
+    assert len(packed) == 3
+    assert packed[2].page_content.endswith(" ...")
+    assert used <= 760
+    assert used == sum(estimate_tokens(doc.page_content) for doc in packed)
+
+    # Too little room left for a useful excerpt: the chunk is dropped instead
+    packed, used = packer.pack_context(docs, 350)
+    assert len(packed) == 1 and used <= 350
+
+
+def test_pack_history_keeps_the_pinned_summary_under_a_tight_budget():
+    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+    summary = SystemMessage(content="Summary of the earlier conversation: " + "saving for a house " * 3)
+    messages = [summary] + [message for idx in range(4) for message in
+                            (HumanMessage(content=f"question {idx} " * 5), AIMessage(content=f"answer {idx} " * 5))]
+    summary_tokens = estimate_tokens(summary.content)
+
+    # Room for the summary and part of the newest message only
+    packed, tokens = ContextPacker(history_budget=summary_tokens + 5).pack_history(messages)
+    assert packed[0] is summary
+    assert len(packed) == 2 and packed[1].type == "ai" and packed[1].content.startswith("answer 3")
+    assert tokens <= summary_tokens + 5
+
+    # The summary alone is over budget: it is kept, and nothing else fits
+    packed, tokens = ContextPacker(history_budget=summary_tokens - 1).pack_history(messages)
+    assert packed == [summary] and tokens == summary_tokens
+
+    # Only a leading system message is pinned; elsewhere it is truncated like any other
+    packed, tokens = ContextPacker(history_budget=10).pack_history(messages[1:] + [summary])
+    assert len(packed) == 1 and packed[0].type == "system" and tokens <= 10
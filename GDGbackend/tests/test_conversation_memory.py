@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from conversation_memory import ConversationMemory, SUMMARY_PREFIX
+from fakes import FakeProviderError
+from history_store import ChatHistoryStore
+
+
+class RecordingSummarizer:
+    """Joins the messages it is given onto the previous summary, optionally waiting for a release."""
+
+    def __init__(self, release=None):
+        self.calls = []
+        self.release = release
+        self.started = threading.Event()
+
+    def __call__(self, previous_summary, messages):
+        self.calls.append((previous_summary, [message.content for message in messages]))
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(2)
+        return " ".join([previous_summary] + [message.content for message in messages]).strip()
+
+
+def add_turns(store, session_id, first, count):
+    for idx in range(first, first + count):
+        store.append_turn(session_id, f"q{idx}", f"a{idx}")
+
+
+def wait_idle(memory, timeout=2):
+    deadline = time.monotonic() + timeout
+    while memory.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert memory.stats()["pending"] == 0
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChatHistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def test_only_messages_past_the_verbatim_window_are_folded(store):
+    summarize = RecordingSummarizer()
+    memory = ConversationMemory(store, summarize, verbatim_messages=4)
+    add_turns(store, "alice", 0, 2)
+    assert memory.update("alice") == 0
+    assert summarize.calls == [] and memory.summary_message("alice") is None
+
+    add_turns(store, "alice", 2, 3)
+    assert memory.update("alice") == 6
+    assert summarize.calls == [("", ["q0", "a0", "q1", "a1", "q2", "a2"])]
+    summary, covered_id = store.summary("alice")
+    assert summary == "q0 a0 q1 a1 q2 a2"
+    # The summary covers up to the last folded message; the last four stay verbatim
+    assert [message.content for _, message in store.messages_after("alice", covered_id)] == ["q3", "a3", "q4", "a4"]
+    assert memory.summary_message("alice").content == SUMMARY_PREFIX + summary
+
+    # The next update folds only what has left the window since
+    add_turns(store, "alice", 5, 1)
+    assert memory.update("alice") == 2
+    assert summarize.calls[-1] == ("q0 a0 q1 a1 q2 a2", ["q3", "a3"])
+
+
+def test_long_backlogs_are_folded_in_batches(store):
+    summarize = RecordingSummarizer()
+    memory = ConversationMemory(store, summarize, verbatim_messages=2, summary_tokens=5, batch_messages=4)
+    add_turns(store, "alice", 0, 6)
+    assert memory.update("alice") == 10
+    assert [len(messages) for _, messages in summarize.calls] == [4, 4, 2]
+    # Each fold is capped at the summary budget
+    assert len(store.summary("alice")[0]) <= 5 * 4
+
+
+def test_a_stale_fold_does_not_overwrite_a_newer_summary(store):
+    release = threading.Event()
+    summarize = RecordingSummarizer(release)
+    memory = ConversationMemory(store, summarize, verbatim_messages=2)
+    add_turns(store, "alice", 0, 3)
+    newest_id = store.messages_after("alice", 0)[-1][0]
+
+    slow = threading.Thread(target=memory.update, args=("alice",))
+    slow.start()
+    assert summarize.started.wait(2)
+    # Another writer saves a summary covering more while the fold is running
+    store.save_summary("alice", "newer summary", newest_id)
+    release.set()
+    slow.join()
+    assert store.summary("alice") == ("newer summary", newest_id)
+
+
+def test_a_fold_finishing_after_a_clear_saves_nothing(store):
+    release = threading.Event()
+    summarize = RecordingSummarizer(release)
+    memory = ConversationMemory(store, summarize, verbatim_messages=2)
+    add_turns(store, "alice", 0, 3)
+
+    slow = threading.Thread(target=memory.update, args=("alice",))
+    slow.start()
+    assert summarize.started.wait(2)
+    store.clear("alice")
+    release.set()
+    slow.join()
+    assert store.summary("alice") == ("", 0)
+
+
+def test_scheduled_updates_coalesce_without_losing_a_fold(store):
+    release = threading.Event()
+    summarize = RecordingSummarizer(release)
+    memory = ConversationMemory(store, summarize, verbatim_messages=2)
+    add_turns(store, "alice", 0, 3)
+    memory.schedule("alice")
+    assert summarize.started.wait(2)
+
+    # Turns arriving while the update runs queue one more run, however many there are
+    for idx in range(3, 8):
+        add_turns(store, "alice", idx, 1)
+        memory.schedule("alice")
+    assert memory.stats()["pending"] == 1
+    release.set()
+    wait_idle(memory)
+
+    assert len(summarize.calls) == 2
+    summary, covered_id = store.summary("alice")
+    assert [message.content for _, message in store.messages_after("alice", covered_id)] == ["q7", "a7"]
+    assert summary == " ".join(f"q{idx} a{idx}" for idx in range(7))
+    memory.shutdown()
+
+
+@pytest.mark.parametrize("failure", ["error", "circuit_open"])
+def test_a_failed_fold_leaves_the_summary_unchanged(store, failure):
+    breaker = CircuitBreaker("memory-test", failure_threshold=1, reset_timeout=60)
+    summarize = RecordingSummarizer()
+    memory = ConversationMemory(store, summarize, verbatim_messages=2)
+    add_turns(store, "alice", 0, 3)
+    memory.update("alice")
+    before = store.summary("alice")
+
+    def failing_summarize(previous_summary, messages):
+        if failure == "error":
+            raise FakeProviderError("provider down")
+        return breaker.call(summarize, previous_summary, messages)
+
+    if failure == "circuit_open":
+        breaker.record_failure(FakeProviderError("provider down"))
+    memory.summarize = failing_summarize
+    add_turns(store, "alice", 3, 2)
+    memory.schedule("alice")
+    wait_idle(memory)
+
+    assert memory.stats()["failures"] == 1
+    # Neither failure reached the summarizer, and the stored summary is untouched
+    assert len(summarize.calls) == 1
+    assert store.summary("alice") == before
+    memory.shutdown()
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+import ingestion
+from corpus_store import locate_chunks, byte_offsets, open_corpus_store, index_path_for
+
+# Multi-byte characters make byte and character offsets drift apart
+PAGES = [
+    "Épargne de précaution : mettez 50 € de côté chaque mois.",
+    "株式 index funds spread risk — diversification lowers volatility.",
+    "Retirement ≥ 15 % of income keeps most savers on track. Ünsere Rente!",
+]
+
+
+class SliceSplitter:
+    """Cut the text into fixed character windows that overlap."""
+
+    def __init__(self, size, step):
+        self.size, self.step = size, step
+
+    def split_text(self, text):
+        return [text[start:start + self.size] for start in range(0, len(text) - self.step, self.step)]
+
+
+def test_locate_chunks_and_byte_offsets():
+    text = "café — café — café"
+    starts = locate_chunks(text, ["café", "café", "café", "missing"])
+    assert starts == [0, 7, 14, -1]
+
+    offsets = byte_offsets(text, [14, 0, 7, len(text)])
+    for pos, offset in offsets.items():
+        assert offset == len(text[:pos].encode("utf-8"))
+    assert offsets[7] > 7
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """One extracted book with overlapping chunks, plus one chunk not in its text."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(ingestion.extract_dir)
+    pdf_file = "épargne.pdf"
+    text = "".join(page + ingestion.page_separator for page in PAGES)
+    text_path, _ = ingestion.book_paths(pdf_file)
+    with open(text_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+    class WithStray(SliceSplitter):
+        def split_text(self, text):
+            return super().split_text(text) + ["A paraphrased chunk: intérêts composés"]
+
+    chunks = ingestion.chunk_book(pdf_file, text, WithStray(60, 45))
+    manifest = {"version": 1, "chunk_size": 60, "chunk_overlap": 15,
+                "books": {pdf_file: {"sha256": "test", "pages": len(PAGES), "chunks": chunks}}}
+    store = open_corpus_store(manifest, path="corpus.bin")
+    yield store, manifest, pdf_file
+    store.close()
+
+
+def test_round_trip_reads_pages_and_chunks_back(corpus):
+    store, _, pdf_file = corpus
+    records = list(ingestion.iter_book_chunks(pdf_file))
+    assert len(store) == len(records)
+    assert store.book_chunk_ids(pdf_file) == [record["id"] for record in records]
+
+    for page, expected in enumerate(PAGES, start=1):
+        assert store.page_text(pdf_file, page) == expected
+    with pytest.raises(IndexError):
+        store.page_text(pdf_file, len(PAGES) + 1)
+
+    for record in records:
+        assert store.chunk_text(record["id"]) == record["text"]
+        assert bytes(store.chunk_bytes(record["id"])) == record["text"].encode("utf-8")
+    assert [text for _, text in store.iter_chunks()] == [record["text"] for record in records]
+
+    with pytest.raises(KeyError):
+        store.chunk_text("missing-00000")
+
+
+def test_chunk_metadata_carries_the_page_range(corpus):
+    store, _, pdf_file = corpus
+    records = list(ingestion.iter_book_chunks(pdf_file))
+
+    first = store.document(records[0]["id"])
+    assert first.metadata == {"source": pdf_file, "chunk_id": records[0]["id"], "page": 1, "page_end": 1}
+    # Expected pages from character positions in the book text
+    text = "".join(page + ingestion.page_separator for page in PAGES)
+    page_starts = [sum(len(page) + len(ingestion.page_separator) for page in PAGES[:idx])
+                   for idx in range(len(PAGES))]
+    spans = []
+    for record, start in zip(records[:-1], locate_chunks(text, [r["text"] for r in records[:-1]])):
+        end = start + len(record["text"]) - 1
+        expected = (sum(s <= start for s in page_starts), sum(s <= end for s in page_starts))
+        metadata = store.chunk_metadata(record["id"])
+        assert (metadata["page"], metadata["page_end"]) == expected
+        spans.append(expected[0] != expected[1])
+    assert any(spans) and not all(spans)
+    # A chunk missing from the book text is stored as a copy with no page
+    stray = store.chunk_metadata(records[-1]["id"])
+    assert (stray["page"], stray["page_end"]) == (0, 0)
+    assert store.chunk_text(records[-1]["id"]) == records[-1]["text"]
+
+
+def test_reopen_reuses_the_store_until_the_corpus_changes(corpus):
+    store, manifest, pdf_file = corpus
+    built = os.path.getmtime(index_path_for("corpus.bin"))
+
+    reopened = open_corpus_store(manifest, path="corpus.bin")
+    assert reopened.fingerprint == store.fingerprint
+    reopened.close()
+    assert os.path.getmtime(index_path_for("corpus.bin")) == built
+
+    manifest["books"][pdf_file]["sha256"] = "changed"
+    rebuilt = open_corpus_store(manifest, path="corpus.bin")
+    assert rebuilt.fingerprint != store.fingerprint
+    assert rebuilt.page_text(pdf_file, 2) == PAGES[1]
+    rebuilt.close()
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from embedding_builder import EmbeddingBuilder
+from fakes import FakeRemoteEmbeddings
+
+IDS = [f"book.pdf-{idx:05d}" for idx in range(10)]
+TEXTS = [f"chunk {idx} about budgeting and saving" for idx in range(10)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class MemorySink:
+    """Collects written chunks; raises after `fail_after` batches to simulate a crash."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.batches = 0
+        self.ids = []
+
+    def __call__(self, ids, texts, embeddings, metadatas):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise Interrupted()
+        self.batches += 1
+        self.ids.extend(ids)
+
+
+def builder(tmp_path, sink):
+    return EmbeddingBuilder(FakeRemoteEmbeddings(delay=0), sink, str(tmp_path / "checkpoint.jsonl"),
+                            batch_size=2, max_workers=1, max_retries=0)
+
+
+def interrupted_build(tmp_path, build_key, fail_after=2):
+    sink = MemorySink(fail_after=fail_after)
+    with pytest.raises(Interrupted):
+        builder(tmp_path, sink).build(IDS, TEXTS, build_key=build_key)
+    return sink
+
+
+def header(tmp_path):
+    with open(tmp_path / "checkpoint.jsonl", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+def test_resume_skips_finished_chunks(tmp_path):
+    first = interrupted_build(tmp_path, "corpus-a")
+    assert len(first.ids) == 4
+
+    sink = MemorySink()
+    stats = builder(tmp_path, sink).build(IDS, TEXTS, build_key="corpus-a")
+    assert stats["skipped"] == 4
+    assert sorted(sink.ids) == sorted(set(IDS) - set(first.ids))
+
+
+def test_changed_key_restarts_and_later_resumes_work(tmp_path):
+    interrupted_build(tmp_path, "corpus-a")
+
+    second = interrupted_build(tmp_path, "corpus-b", fail_after=3)
+    assert len(second.ids) == 6
+    assert header(tmp_path) == {"build_key": "corpus-b"}
+
+    sink = MemorySink()
+    stats = builder(tmp_path, sink).build(IDS, TEXTS, build_key="corpus-b")
+    assert stats["skipped"] == 6
+    assert sorted(sink.ids) == sorted(set(IDS) - set(second.ids))
+
+
+def test_flipping_back_does_not_reuse_other_builds_chunks(tmp_path):
+    interrupted_build(tmp_path, "corpus-a")
+    interrupted_build(tmp_path, "corpus-b")
+
+    sink = MemorySink()
+    stats = builder(tmp_path, sink).build(IDS, TEXTS, build_key="corpus-a")
+    assert stats["skipped"] == 0
+    assert sorted(sink.ids) == sorted(IDS)
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    first = interrupted_build(tmp_path, "corpus-a")
+    with open(tmp_path / "checkpoint.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"ids": ["book.pdf-000')
+
+    sink = MemorySink(fail_after=1)
+    with pytest.raises(Interrupted):
+        builder(tmp_path, sink).build(IDS, TEXTS, build_key="corpus-a")
+    done = builder(tmp_path, MemorySink()).load_checkpoint("corpus-a")
+    assert done == set(first.ids) | set(sink.ids)
+
+
+class FailingEmbeddings(FakeRemoteEmbeddings):
+    """Fails every embedding call from the `fail_at`-th on."""
+
+    def __init__(self, fail_at):
+        super().__init__(delay=0)
+        self.fail_at = fail_at
+
+    def embed_documents(self, texts):
+        if self.calls["documents"] + 1 >= self.fail_at:
+            self.calls["documents"] += 1
+            raise RuntimeError("quota exhausted")
+        return super().embed_documents(texts)
+
+
+def test_failed_batch_cancels_the_queued_ones(tmp_path):
+    embeddings, sink = FailingEmbeddings(fail_at=3), MemorySink()
+    build = EmbeddingBuilder(embeddings, sink, str(tmp_path / "checkpoint.jsonl"),
+                             batch_size=1, max_workers=1, max_retries=0)
+    with pytest.raises(RuntimeError, match="quota exhausted"):
+        build.build(IDS, TEXTS, build_key="corpus-a")
+
+    # Two batches finished, the third failed and the other seven never ran
+    assert embeddings.calls["documents"] == 3
+    assert len(sink.ids) == 2
+    assert build.load_checkpoint("corpus-a") == set(sink.ids)
@@ -0,0 +1,46 @@
+from history_store import ChatHistoryStore
+
+
+def test_sessions_are_separate_and_recent_reads_the_tail(tmp_path):
+    store = ChatHistoryStore(str(tmp_path / "history.sqlite3"))
+    for idx in range(5):
+        store.append_turn("alice", f"question {idx}", f"answer {idx}")
+    store.append_turn("bob", "hello", "hi")
+
+    recent = store.recent("alice", 3)
+    assert [msg.content for msg in recent] == ["answer 3", "question 4", "answer 4"]
+    assert [msg.type for msg in recent] == ["ai", "human", "ai"]
+    assert [msg.content for msg in store.recent("bob", 10)] == ["hello", "hi"]
+
+
+def test_clear_only_touches_one_session(tmp_path):
+    store = ChatHistoryStore(str(tmp_path / "history.sqlite3"))
+    store.append_turn("alice", "q", "a")
+    store.append_turn("bob", "q", "a")
+    first_id = store.messages_after("alice", 0)[-1][0]
+    store.save_summary("alice", "talked about budgets", first_id)
+
+    store.clear("alice")
+    assert store.recent("alice", 10) == []
+    assert store.summary("alice") == ("", 0)
+    assert len(store.recent("bob", 10)) == 2
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text('[{"type": "human", "content": "hi"}, {"type": "ai", "content": "hello"}]')
+    store = ChatHistoryStore(str(tmp_path / "history.sqlite3"))
+    assert store.import_legacy_json(str(legacy)) == 2
+    assert store.import_legacy_json(str(legacy)) == 0
+    assert [msg.content for msg in store.recent("default", 10)] == ["hi", "hello"]
+
+
+def test_chat_endpoint_keeps_history_per_session(backend):
+    client = backend.app.test_client()
+    client.post("/chat", json={"message": "How do I build a budget?", "session_id": "history-a"})
+    client.post("/chat", json={"message": "What are index funds?", "session_id": "history-b"})
+
+    assert [msg.content for msg in backend.history_store.recent("history-a", 10)][0] == "How do I build a budget?"
+    assert client.post("/clear_history", json={"session_id": "history-a"}).status_code == 200
+    assert backend.history_store.recent("history-a", 10) == []
+    assert len(backend.history_store.recent("history-b", 10)) == 2
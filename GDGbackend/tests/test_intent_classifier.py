@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.bench_intent import SAMPLE_QUERIES, legacy_detect_finance_intent
+from intent_classifier import IntentClassifier, classifier
+
+# Questions where the best-scoring intent is also the first one the original
+# per-intent regex loop matched, including ties broken by that order
+AGREEING = [
+    "What is a stock?",
+    "How should I start investing?",
+    "How to create a budget?",
+    "What's a good debt repayment strategy?",              # debt and financial planning tie
+    "How much should I put in my 401k before I retire?",
+    "Is term life insurance coverage worth the premium?",
+    "How do I reach financial freedom and grow my net worth?",
+    "What return can I get?",                              # investment, tax and calculator tie
+    "What is the return on a bond?",
+    "What is a mortgage interest payment?",
+    "Is there a risk management plan for my house?",
+    "What is a deductible on a health policy?",
+    "How do I track my cash flow?",
+    "Tell me about the IRS filing deadline",
+    "Explain the formula for yield",
+    "Hii",
+    "",
+]
+
+# Questions where another intent has more keyword hits than the first match
+OUTSCORED = {
+    "Calculate compound interest on $10000 at 7% for 10 years": ("debt", "calculator"),
+    "Do I need to pay capital gain tax on my ETF returns?": ("investment_advice", "tax"),
+    "What interest rate should I expect?": ("debt", "calculator"),
+    "How do I plan for the future?": ("retirement", "financial_planning"),
+    "Should I invest or pay off my credit card debt and car loan first?": ("investment_advice", "debt"),
+}
+
+
+@pytest.mark.parametrize("question", AGREEING)
+def test_agrees_with_the_original_regex_loop(question):
+    assert classifier.classify(question) == legacy_detect_finance_intent(question)
+
+
+@pytest.mark.parametrize("question, expected", OUTSCORED.items())
+def test_more_hits_outrank_the_first_match(question, expected):
+    assert (legacy_detect_finance_intent(question), classifier.classify(question)) == expected
+
+
+@pytest.mark.parametrize("question", SAMPLE_QUERIES + AGREEING + list(OUTSCORED))
+def test_differs_only_when_outscored(question):
+    ranked = dict(classifier.ranked(question))
+    legacy = legacy_detect_finance_intent(question)
+    assert legacy in ranked
+    if ranked[legacy] == max(ranked.values()):
+        assert classifier.classify(question) == legacy
+
+
+def test_ties_keep_the_original_priority():
+    assert [intent for intent, _ in classifier.ranked("What return can I get?")] \
+        == ["investment_advice", "tax", "calculator"]
+    assert classifier.ranked("What's a good debt repayment strategy?") == [("debt", 1), ("financial_planning", 1)]
+
+
+def test_multi_word_keywords_credit_their_parts():
+    scores = classifier.scores("Do I need risk management?")
+    assert scores["insurance"] == 1 and scores["investment_advice"] == 1
+
+
+def test_matches_whole_words_only_and_ignores_case():
+    assert classifier.classify("STOCKS") == "general"
+    assert classifier.classify("Which STOCK?") == "investment_advice"
+    assert IntentClassifier({"a": ["plan"]}).ranked("planet") == [("general", 0)]
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex, fuse_results, tokenize
+
+CHUNKS = {
+    "budget-0": "Budgeting starts with a budget: list income, then budget every expense.",
+    "invest-0": "Index funds spread an investment across many stocks.",
+    "debt-0": "The avalanche method pays the highest interest debt first; the snowball method pays small debt first.",
+    "retire-0": "Retirement accounts grow tax deferred until you retire.",
+    "mixed-0": "A long chapter about many things: budget, stocks, bonds, pensions, insurance, taxes and more.",
+}
+
+
+class MemoryCorpus:
+    fingerprint = "test-corpus"
+
+    def iter_chunks(self):
+        return iter(CHUNKS.items())
+
+    def document(self, chunk_id):
+        return Document(page_content=CHUNKS[chunk_id], metadata={"chunk_id": chunk_id})
+
+
+@pytest.fixture(scope="module")
+def index():
+    return LexicalIndex.build(MemoryCorpus())
+
+
+def doc(chunk_id):
+    return Document(page_content=chunk_id, metadata={"chunk_id": chunk_id})
+
+
+def test_tokenize_drops_stopwords_and_junk():
+    assert tokenize("What is THE 50/30/20 rule?") == ["50", "30", "20", "rule"]
+    assert tokenize("x" * 40 + " budget") == ["budget"]
+
+
+def test_bm25_ranks_repeated_terms_in_short_chunks_first(index):
+    ranked = [doc.metadata["chunk_id"] for doc, _ in index.search_with_scores("budget", k=5)]
+    # budget-0 says it three times; the long mixed chunk only once
+    assert ranked == ["budget-0", "mixed-0"]
+
+
+def test_rare_terms_outweigh_common_ones(index):
+    results = index.search_with_scores("avalanche stocks", k=5)
+    scores = dict((doc.metadata["chunk_id"], score) for doc, score in results)
+    # "avalanche" is in one chunk, "stocks" in two
+    assert scores["debt-0"] > scores["invest-0"] > 0
+    assert index.search("no such words here") == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    path = str(tmp_path / "lexical.npz")
+    index.save(path)
+    loaded = LexicalIndex.load_or_build(path, MemoryCorpus())
+    assert loaded.fingerprint == "test-corpus"
+    assert [(d.metadata["chunk_id"], round(s, 5)) for d, s in loaded.search_with_scores("snowball debt")] \
+        == [(d.metadata["chunk_id"], round(s, 5)) for d, s in index.search_with_scores("snowball debt")]
+
+
+def test_keyword_query_detection(index):
+    assert index.is_keyword_query("avalanche")
+    assert index.is_keyword_query("What is an index fund?") is False      # "fund" isn't in the corpus
+    assert index.is_keyword_query("index funds stocks")
+    assert not index.is_keyword_query("budget income expense stocks")      # more than three terms
+    assert not index.is_keyword_query("what is it")                         # only stopwords
+
+
+def test_fusion_with_equal_scores_gives_every_hit_full_weight():
+    vector = [(doc("a"), 0.4), (doc("b"), 0.4)]
+    lexical = [(doc("c"), 2.0)]
+    # Every normalised score is 1: a and b get alpha, c gets 1 - alpha
+    assert [d.metadata["chunk_id"] for d in fuse_results(vector, lexical, alpha=0.6)] == ["a", "b", "c"]
+    assert [d.metadata["chunk_id"] for d in fuse_results(vector, lexical, alpha=0.4)] == ["c", "a", "b"]
+
+
+@pytest.mark.parametrize("alpha, expected", [
+    (1.0, ["a", "b", "c"]),   # vector order only (smallest distance first)
+    (0.0, ["c", "b", "a"]),   # lexical order only (highest score first)
+])
+def test_alpha_picks_one_list(alpha, expected):
+    vector = [(doc("a"), 0.1), (doc("b"), 0.5), (doc("c"), 0.9)]
+    lexical = [(doc("c"), 9.0), (doc("b"), 5.0), (doc("a"), 1.0)]
+    assert [d.metadata["chunk_id"] for d in fuse_results(vector, lexical, k=3, alpha=alpha)] == expected
+
+
+def test_chunks_in_both_lists_are_merged():
+    vector = [(doc("a"), 0.1), (doc("b"), 0.9)]
+    lexical = [(doc("b"), 8.0), (doc("c"), 1.0)]
+    fused = fuse_results(vector, lexical, k=5, alpha=0.5)
+    assert sorted(d.metadata["chunk_id"] for d in fused) == ["a", "b", "c"]
+    # b scores 0 + 0.5 (vector) + 0.5 (lexical) = 0.5, tying a (vector only); c scores 0
+    assert fused[-1].metadata["chunk_id"] == "c"
+    assert fuse_results([], [], k=5) == []
+    assert [d.metadata["chunk_id"] for d in fuse_results(vector, lexical, k=1)] == ["a"]
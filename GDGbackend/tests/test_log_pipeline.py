@@ -0,0 +1,39 @@
+import os
+import glob
+import logging
+
+import log_pipeline
+
+
+def test_forked_children_write_their_own_files(tmp_path):
+    logger = logging.getLogger("finverse-test-fork")
+    logger.setLevel(logging.INFO)
+    pipeline = log_pipeline.configure(logger, str(tmp_path), "app", console=False)
+    logger.info("from the parent")
+
+    children = []
+    for idx in range(3):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for line in range(200):
+                    logger.info(f"child {idx} line {line}")
+                pipeline.stop()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    for pid in children:
+        assert os.waitpid(pid, 0)[1] == 0
+    pipeline.stop()
+
+    child_files = {os.path.basename(path).rsplit("-", 1)[1][:-len(".log")]: path
+                   for path in glob.glob(str(tmp_path / "app_*-*.log"))}
+    parent_files = sorted(set(glob.glob(str(tmp_path / "app_*.log"))) - set(child_files.values()))
+    assert len(parent_files) == 1
+    assert sorted(child_files) == sorted(map(str, children))
+    with open(parent_files[0], encoding="utf-8") as f:
+        assert [line.split("] ", 1)[1] for line in f.read().splitlines()] == ["from the parent"]
+    for idx, pid in enumerate(children):
+        with open(child_files[str(pid)], encoding="utf-8") as f:
+            lines = [line.split("] ", 1)[1] for line in f.read().splitlines()]
+        assert lines == [f"child {idx} line {line}" for line in range(200)]
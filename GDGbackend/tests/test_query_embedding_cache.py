@@ -0,0 +1,89 @@
+import multiprocessing
+
+import numpy as np
+
+from fakes import FakeRemoteEmbeddings
+from query_embedding_cache import CachedQueryEmbeddings
+
+WORDS = ["stock", "bond", "budget", "mortgage", "pension", "dividend", "inflation", "annuity"]
+
+
+def cached(path, **kwargs):
+    return CachedQueryEmbeddings(FakeRemoteEmbeddings(delay=0), disk_path=str(path), **kwargs)
+
+
+def fill(path, worker):
+    cache = cached(path)
+    for idx in range(40):
+        cache.embed_query(f"what is a {WORDS[(idx + worker) % len(WORDS)]} number {idx % 10}")
+
+
+def test_vectors_survive_a_restart(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    first = cached(path)
+    vector = first.embed_query("What is a stock?")
+
+    second = cached(path)
+    assert second.embed_query("what is a stock") == vector
+    assert second.embeddings.calls["queries"] == 0
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_concurrent_writers_keep_every_key_on_its_own_vector(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    # Open (and close) the file before forking; an open connection must not cross a fork
+    cached(path).close()
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=fill, args=(path, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    cache = cached(path)
+    reference = FakeRemoteEmbeddings(delay=0)
+    for word in WORDS:
+        for number in range(10):
+            query = f"what is a {word} number {number}"
+            assert np.allclose(cache.embed_query(query), reference.embed_query(query))
+    assert cache.embeddings.calls["queries"] == 0
+
+
+def test_disk_tier_is_capped_oldest_first(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    cache = cached(path, max_disk_entries=20)
+    cache.sweep_interval = 10
+    for idx in range(100):
+        cache.embed_query(f"question {idx}")
+    assert cache.stats()["disk_entries"] <= 20 + cache.sweep_interval
+
+    reopened = cached(path)
+    reopened.embed_query("question 99")
+    assert reopened.embeddings.calls["queries"] == 0
+    reopened.embed_query("question 0")
+    assert reopened.embeddings.calls["queries"] == 1
+
+
+def test_other_models_rows_are_dropped(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    cached(path).embed_query("What is a bond?")
+    other = CachedQueryEmbeddings(FakeRemoteEmbeddings(delay=0), disk_path=str(path), model_name="other/model")
+    assert other.stats()["disk_entries"] == 0
+
+
+def test_stats_read_no_rows(tmp_path):
+    cache = cached(tmp_path / "embeddings.sqlite3")
+    cache.embed_query("What is a bond?")
+    cache.embed_query("What is a stock?")
+
+    class NoQueries:
+        def execute(self, *args):
+            raise AssertionError("stats() queried the database")
+
+    db, cache._db = cache._db, NoQueries()
+    try:
+        stats = cache.stats()
+    finally:
+        cache._db = db
+    assert stats["disk_entries"] == 2 and stats["misses"] == 2
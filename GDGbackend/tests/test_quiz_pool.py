@@ -0,0 +1,89 @@
+import json
+import time
+import itertools
+
+from quiz_pool import QuizPool
+
+CATEGORIES = ["Budgeting", "Investing", "Credit"]
+DIFFICULTIES = ["Beginner"]
+
+
+class Generator:
+    """Quiz batches with distinct questions, counting the calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.serial = itertools.count(1)
+
+    def __call__(self, category, difficulty, count):
+        self.calls.append(time.monotonic())
+        questions = []
+        for _ in range(count):
+            serial = next(self.serial)
+            questions.append({"id": serial, "question": f"{category} question number {serial} alpha{serial} beta{serial}",
+                              "options": ["a", "b", "c", "d"], "correctAnswer": serial % 4})
+        return questions
+
+
+def validate(questions):
+    return None if all(len(q["options"]) == 4 for q in questions) else "bad"
+
+
+def make_pool(generator, path=None, **kwargs):
+    kwargs.setdefault("refills_per_minute", 0)
+    return QuizPool(generator, validate, CATEGORIES, DIFFICULTIES, path=path, target_size=4, low_watermark=1,
+                    batch_size=4, **kwargs)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_buckets_fill_lazily(tmp_path):
+    generator = Generator()
+    pool = make_pool(generator)
+    assert pool.take(3) is None
+    assert pool.stats()["misses"] == 1
+    wait_for(lambda: pool.stats()["pooled"] == 12 and not pool.stats()["refilling"])
+    assert len(generator.calls) == 3
+
+    questions = pool.take(3)
+    assert [q["id"] for q in questions] == [1, 2, 3]
+    assert pool.stats()["hits"] == 1
+
+
+def test_refills_are_rate_limited():
+    generator = Generator()
+    pool = make_pool(generator, refills_per_minute=600)
+    pool.warm()
+    wait_for(lambda: len(generator.calls) == 3 and not pool.stats()["refilling"])
+    gaps = [later - earlier for earlier, later in zip(generator.calls, generator.calls[1:])]
+    assert min(gaps) >= 0.09
+
+
+def test_only_the_lock_holder_uses_the_snapshot(tmp_path):
+    path = str(tmp_path / "quiz_pool.json")
+    owner = make_pool(Generator(), path=path)
+    other = make_pool(Generator(), path=path)
+    assert owner.owns_snapshot and not other.owns_snapshot
+
+    owner.warm()
+    wait_for(lambda: owner.stats()["pooled"] == 12 and not owner.stats()["refilling"])
+    other.warm()
+    wait_for(lambda: other.stats()["pooled"] == 12 and not other.stats()["refilling"])
+    served = owner.take(3)
+    wait_for(lambda: not owner._save_pending)
+
+    with open(path, encoding="utf-8") as f:
+        saved = [q["question"] for bucket in json.load(f)["buckets"] for q in bucket["questions"]]
+    assert len(saved) == 9
+    assert not {q["question"] for q in served} & set(saved)
+    assert not any(name.endswith(".tmp") for name in map(str, tmp_path.iterdir()))
+
+    # A restarted owner only gets back the questions that were never served
+    owner._lock_file.close()
+    restarted = make_pool(Generator(), path=path)
+    assert restarted.owns_snapshot and restarted.stats()["pooled"] == 9
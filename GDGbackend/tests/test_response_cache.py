@@ -0,0 +1,41 @@
+import sqlite3
+
+from response_cache import ResponseCache
+
+VECTOR = [1.0, 0.0, 0.0]
+
+
+def test_each_lookup_counts_one_outcome():
+    for threshold in (0.0, 0.9):
+        cache = ResponseCache(semantic_threshold=threshold)
+        assert cache.get("What is a bond?", "general", []) is None
+        cache.put("What is a bond?", "general", [], "A loan to an issuer.", VECTOR)
+        assert cache.get("what is a bond", "general", []) == "A loan to an issuer."
+        stats = cache.stats()
+        assert (stats["hits"], stats["semantic_hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_semantic_hit_replaces_the_exact_miss():
+    cache = ResponseCache(semantic_threshold=0.9)
+    cache.put("What is a bond?", "general", [], "A loan to an issuer.", VECTOR)
+
+    assert cache.get("Explain bonds", "general", []) is None
+    assert cache.get_similar([0.99, 0.1, 0.0], "general", []) == "A loan to an issuer."
+    assert cache.get("Explain stocks", "general", []) is None
+    assert cache.get_similar([0.0, 1.0, 0.0], "general", []) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["semantic_hits"], stats["misses"]) == (0, 1, 1)
+
+
+def test_disk_table_is_capped(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(disk_path=path, max_disk_entries=50)
+    cache.sweep_interval = 10
+    for idx in range(200):
+        cache.put(f"question {idx}", "general", [], f"answer {idx}")
+
+    with sqlite3.connect(path) as db:
+        kept = [row[0] for row in db.execute("SELECT response FROM responses")]
+    assert len(kept) <= 50 + cache.sweep_interval
+    assert "answer 199" in kept and "answer 0" not in kept
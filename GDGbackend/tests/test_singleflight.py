@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight, AsyncSingleFlight, CoalesceTimeout
+
+
+def run_together(flight, key, fn, callers):
+    """Call flight.do from several threads while the leader is still running."""
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, fn) for _ in range(callers)]
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_identical_requests_share_one_call():
+    flight = SingleFlight("test-share")
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return "answer"
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results = run_together(flight, "same question", compute, 5)
+
+    assert calls == [1]
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"answer"}
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "errors": 0, "timeouts": 0}
+
+    # Nothing is kept once the call finished
+    assert flight.do("same question", lambda: "fresh") == ("fresh", False)
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight("test-error")
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    results = run_together(flight, "key", fail, 4)
+
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
+    assert flight.stats()["errors"] == 1
+    assert flight.stats()["coalesced"] == 3
+    assert flight.do("key", lambda: "recovered") == ("recovered", False)
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test-keys")
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(lambda key: flight.do(key, lambda: (time.sleep(0.1), key)[1]), ["a", "b", "c"]))
+    assert results == [("a", False), ("b", False), ("c", False)]
+    assert flight.stats()["leaders"] == 3
+
+
+def test_follower_gives_up_after_wait_timeout():
+    flight = SingleFlight("test-timeout", wait_timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait(2)))
+    leader.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(CoalesceTimeout):
+            flight.do("key", lambda: "unused")
+    finally:
+        release.set()
+        leader.join()
+    assert flight.stats()["timeouts"] == 1
+
+
+def test_async_requests_share_one_task():
+    flight = AsyncSingleFlight("test-async")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        shared = await asyncio.gather(*(flight.do("key", compute) for _ in range(4)))
+        failed = await asyncio.gather(*(flight.do("bad", fail) for _ in range(3)), return_exceptions=True)
+        return shared, failed
+
+    shared, failed = asyncio.run(main())
+    assert calls == [1]
+    assert [result for result, _ in shared] == ["answer"] * 4
+    assert [was_shared for _, was_shared in shared] == [False, True, True, True]
+    assert all(isinstance(error, RuntimeError) for error in failed)
+    assert flight.stats() == {"leaders": 2, "coalesced": 5, "errors": 1, "timeouts": 0}
+
+
+def test_async_cancelled_follower_leaves_the_shared_task_running():
+    flight = AsyncSingleFlight("test-async-cancel", wait_timeout=0.02)
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        with pytest.raises(CoalesceTimeout):
+            await flight.do("key", compute)
+        return await leader
+
+    assert asyncio.run(main()) == ("answer", False)
+    assert flight.stats()["timeouts"] == 1
+
+
+def test_chat_coalesces_identical_questions(backend, monkeypatch):
+    calls = []
+    generate_chat = backend.generate_chat
+
+    def slow_generate_chat(user_input, session_id, start_time):
+        calls.append(session_id)
+        time.sleep(0.2)
+        return generate_chat(user_input, session_id, start_time)
+
+    monkeypatch.setattr(backend, "generate_chat", slow_generate_chat)
+    question = "What is the avalanche method for paying down debt?"
+    sessions = [f"coalesce-{idx}" for idx in range(4)]
+    with ThreadPoolExecutor(len(sessions)) as pool:
+        answers = list(pool.map(lambda session_id: backend.chat_with_ai(question, session_id), sessions))
+
+    assert len(calls) == 1
+    assert len(set(answers)) == 1 and answers[0] != backend.fallback_answer
+    # Every asker gets the turn in their own history
+    for session_id in sessions:
+        assert len(backend.history_store.recent(session_id, 10)) == 2
+
+
+def test_unsaved_answers_stay_out_of_every_history(backend, monkeypatch):
+    calls = []
+    generate_chat, agenerate_chat = backend.generate_chat, backend.agenerate_chat
+
+    def slow_generate_chat(user_input, session_id, start_time):
+        calls.append(session_id)
+        time.sleep(0.2)
+        return generate_chat(user_input, session_id, start_time)
+
+    async def slow_agenerate_chat(user_input, session_id, start_time):
+        calls.append(session_id)
+        await asyncio.sleep(0.2)
+        return await agenerate_chat(user_input, session_id, start_time)
+
+    monkeypatch.setattr(backend, "generate_chat", slow_generate_chat)
+    monkeypatch.setattr(backend, "agenerate_chat", slow_agenerate_chat)
+    question = "What is the loan payment on 20000 at 6% for 5 years?"
+    with ThreadPoolExecutor(2) as pool:
+        answers = list(pool.map(lambda session_id: backend.chat_with_ai(question, session_id),
+                                ["calc-0", "calc-1"]))
+
+    async def ask_together():
+        return await asyncio.gather(*(backend.achat_with_ai(question, session_id)
+                                      for session_id in ["acalc-0", "acalc-1"]))
+
+    answers += asyncio.run(ask_together())
+
+    assert len(calls) == 2
+    assert len(set(answers)) == 1 and answers[0].startswith("## Loan Payment Calculation")
+    for session_id in ["calc-0", "calc-1", "acalc-0", "acalc-1"]:
+        assert backend.history_store.recent(session_id, 10) == []
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from fakes import DEFAULT_FAKE_ANSWER
+
+
+def sse_tokens(response):
+    events = response.get_data(as_text=True).strip().split("\n\n")
+    assert events[-1] == "event: done\ndata: {}"
+    return [json.loads(event[len("data: "):])["token"] for event in events[:-1]]
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("How do I budget my monthly expenses?", "budgeting"),
+    ("Should I invest in index funds or stocks?", "investment_advice"),
+    ("How do I pay off my credit card debt?", "debt"),
+])
+def test_llm_answers_stream_token_by_token(backend, question, intent):
+    assert backend.detect_finance_intent(question) == intent
+    session_id = f"stream-{intent}"
+    response = backend.app.test_client().post("/chat/stream", json={"message": question, "session_id": session_id})
+
+    assert response.mimetype == "text/event-stream"
+    tokens = sse_tokens(response)
+    assert len(tokens) > 1
+    assert "".join(tokens) == DEFAULT_FAKE_ANSWER
+    # Saved once, after the stream finished
+    assert [msg.content for msg in backend.history_store.recent(session_id, 10)] == [question, DEFAULT_FAKE_ANSWER]
+    assert 'stage="first_token"' in backend.metrics.render()
+
+
+def test_calculator_questions_stream_the_result_in_one_event(backend):
+    question = "What is the compound interest on 1,000 at 5% for 10 years?"
+    response = backend.app.test_client().post("/chat/stream", json={"message": question, "session_id": "stream-calc"})
+
+    tokens = sse_tokens(response)
+    assert len(tokens) == 1 and "Compound Interest Calculation" in tokens[0]
+    assert "$1,628.89" in tokens[0]
+
+
+def test_disconnect_discards_the_partial_answer(backend):
+    stream = backend.stream_chat_with_ai("What is an emergency fund for?", "stream-disconnect")
+    first = next(stream)
+    stream.close()
+
+    assert first and first != DEFAULT_FAKE_ANSWER
+    assert backend.history_store.recent("stream-disconnect", 10) == []
+
+
+def test_empty_message_is_rejected(backend):
+    assert backend.app.test_client().post("/chat/stream", json={"message": ""}).status_code == 400
@@ -0,0 +1,31 @@
+import numpy as np
+
+from embedding_builder import LocalHashEmbeddings
+from vector_index import MmapVectorIndex, index_fingerprint
+
+from conftest import BOOK_PAGES
+
+
+def test_from_texts_builds_a_searchable_index(tmp_path):
+    embeddings = LocalHashEmbeddings(64)
+    directory = str(tmp_path / "index")
+    metadatas = [{"source": "basics.pdf", "page": idx} for idx in range(len(BOOK_PAGES))]
+    index = MmapVectorIndex.from_texts(BOOK_PAGES, embeddings, metadatas=metadatas,
+                                       ids=[f"basics-{idx}" for idx in range(len(BOOK_PAGES))],
+                                       directory=directory, fingerprint="v1")
+
+    assert len(index) == len(BOOK_PAGES)
+    assert index_fingerprint(directory) == "v1"
+    docs = index.similarity_search(BOOK_PAGES[2], k=2)
+    assert docs[0].page_content == BOOK_PAGES[2]
+    assert docs[0].metadata == {"source": "basics.pdf", "page": 2, "chunk_id": "basics-2"}
+
+    # Reopening (quantized) reads the same files
+    reopened = MmapVectorIndex(directory, embedding_function=embeddings, quantized=True)
+    rows, dists = reopened.search_batch(np.asarray(embeddings.embed_documents(BOOK_PAGES)), k=1)
+    assert rows[:, 0].tolist() == list(range(len(BOOK_PAGES)))
+
+
+def test_from_texts_with_no_texts(tmp_path):
+    index = MmapVectorIndex.from_texts([], LocalHashEmbeddings(64), directory=str(tmp_path / "empty"))
+    assert len(index) == 0
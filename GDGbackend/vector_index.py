@@ -0,0 +1,233 @@
+# ------------------------------------
+# Memory-mapped Vector Index
+# ------------------------------------
+# A read-only export of the Chroma store (export_chroma), or of texts
+# embedded directly (MmapVectorIndex.from_texts): the chunk embeddings as one
+# flat float32 matrix (vectors.f32), an int8 copy of it (vectors.i8), the
+# chunk texts back to back (texts.bin) and an index (index.npz) with the text
+# offsets, chunk IDs, metadata and squared vector norms. The data files are
+# opened with np.memmap, so every worker process searches the same
+# page-cached copy instead of loading its own HNSW index.
+#
+# Search is exact brute force: squared L2 distances (what Chroma reports)
+# from batched matrix products over blocks of rows. In quantized mode the
+# int8 matrix is scanned instead and the best candidates are re-ranked
+# exactly against the float32 rows.
+import os
+import json
+import time
+import logging
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger("finance_chatbot")
+
+EXPORT_BATCH = 5000
+
+
+def _replace(tmp_paths):
+    for tmp_path in tmp_paths:
+        os.replace(tmp_path, tmp_path.rsplit(".tmp", 1)[0])
+
+
+def write_index(batches, directory, fingerprint):
+    """Write (ids, embeddings, texts, metadatas) batches as a vector index.
+
+    Files are written under temporary names and renamed into place with the
+    index last, so a reader never sees a half-written export.
+    """
+    start_time = time.time()
+    os.makedirs(directory, exist_ok=True)
+    suffix = f".tmp{os.getpid()}"
+    vectors_tmp = os.path.join(directory, "vectors.f32" + suffix)
+    texts_tmp = os.path.join(directory, "texts.bin" + suffix)
+
+    chunk_ids, metadatas, text_offsets, position = [], [], [0], 0
+    sq_norms, abs_max, dim = [], None, 0
+    with open(vectors_tmp, "wb") as vectors_out, open(texts_tmp, "wb") as texts_out:
+        for batch_ids, embeddings, texts, batch_metadatas in batches:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if not len(vectors):
+                continue
+            if dim and vectors.shape[1] != dim:
+                raise ValueError(f"embedding size changed from {dim} to {vectors.shape[1]}")
+            dim = vectors.shape[1]
+            vectors_out.write(vectors.tobytes())
+            sq_norms.append(np.einsum("ij,ij->i", vectors, vectors))
+            batch_max = np.abs(vectors).max(axis=0)
+            abs_max = batch_max if abs_max is None else np.maximum(abs_max, batch_max)
+            for chunk_id, text, metadata in zip(batch_ids, texts, batch_metadatas):
+                data = (text or "").encode("utf-8")
+                texts_out.write(data)
+                position += len(data)
+                text_offsets.append(position)
+                chunk_ids.append(chunk_id)
+                metadatas.append(json.dumps(metadata or {}))
+
+    # Symmetric per-dimension int8 quantization
+    scales = np.where(abs_max > 0, abs_max / 127, 1).astype(np.float32) if abs_max is not None \
+        else np.ones(dim, dtype=np.float32)
+    quantized_tmp = os.path.join(directory, "vectors.i8" + suffix)
+    rows = len(chunk_ids)
+    if rows:
+        vectors = np.memmap(vectors_tmp, dtype=np.float32, mode="r", shape=(rows, dim))
+        quantized = np.memmap(quantized_tmp, dtype=np.int8, mode="w+", shape=(rows, dim))
+        for start in range(0, rows, EXPORT_BATCH):
+            block = vectors[start:start + EXPORT_BATCH] / scales
+            quantized[start:start + EXPORT_BATCH] = np.clip(np.rint(block), -127, 127)
+        quantized.flush()
+        del vectors, quantized
+    else:
+        open(quantized_tmp, "wb").close()
+
+    index_tmp = os.path.join(directory, "index.npz" + suffix)
+    with open(index_tmp, "wb") as f:
+        np.savez(f, chunk_ids=np.array(chunk_ids, dtype=str), metadatas=np.array(metadatas, dtype=str),
+                 text_offsets=np.array(text_offsets, dtype=np.int64),
+                 sq_norms=np.concatenate(sq_norms) if sq_norms else np.zeros(0, dtype=np.float32),
+                 scales=scales, dim=np.array([dim]), fingerprint=np.array([fingerprint]))
+    _replace([vectors_tmp, quantized_tmp, texts_tmp, index_tmp])
+    logger.info(f"Wrote {rows} vectors ({dim} dims) to '{directory}' in {time.time() - start_time:.2f}s")
+
+
+def export_chroma(vectorstore, directory, fingerprint):
+    """Write the store's embeddings, texts and metadata as a vector index."""
+    def batches():
+        total = vectorstore._collection.count()
+        for offset in range(0, total, EXPORT_BATCH):
+            batch = vectorstore.get(include=["embeddings", "documents", "metadatas"],
+                                    limit=EXPORT_BATCH, offset=offset)
+            if not len(batch["ids"]):
+                break
+            yield batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"]
+
+    write_index(batches(), directory, fingerprint)
+
+
+def index_fingerprint(directory):
+    """Fingerprint of the exported index, or None if there is none."""
+    try:
+        with np.load(os.path.join(directory, "index.npz"), allow_pickle=False) as index:
+            return str(index["fingerprint"][0])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class MmapVectorIndex(VectorStore):
+    """Brute-force vector search over a memory-mapped export of the Chroma store.
+
+    Drop-in for the Chroma methods the chat path uses; scores are squared
+    L2 distances, lower is better. quantized=True scans the int8 matrix and
+    re-ranks rerank * k candidates exactly.
+    """
+
+    def __init__(self, directory, embedding_function=None, quantized=False, rerank=4, block_rows=16384):
+        with np.load(os.path.join(directory, "index.npz"), allow_pickle=False) as index:
+            for name in index.files:
+                setattr(self, name, index[name])
+        self.fingerprint = str(self.fingerprint[0])
+        self.dim = int(self.dim[0])
+        self.rows = len(self.chunk_ids)
+        self.embedding_function = embedding_function
+        self.quantized = quantized
+        self.rerank = rerank
+        self.block_rows = block_rows
+
+        shape = (self.rows, self.dim)
+        self.vectors = self._map(os.path.join(directory, "vectors.f32"), np.float32, shape)
+        self.quantized_vectors = self._map(os.path.join(directory, "vectors.i8"), np.int8, shape) if quantized else None
+        texts_path = os.path.join(directory, "texts.bin")
+        self.texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else b""
+
+    @staticmethod
+    def _map(path, dtype, shape):
+        expected = shape[0] * shape[1] * np.dtype(dtype).itemsize
+        size = os.path.getsize(path)
+        if size != expected:
+            raise ValueError(f"{os.path.basename(path)} is {size} bytes, index expects {expected}")
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape) if expected else np.zeros(shape, dtype)
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return self.rows
+
+    # Search ----------------------------------------------------------------
+    def distances(self, queries, rows=None):
+        """Squared L2 distances from each query to every row (or the given rows)."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        if rows is not None:
+            return q_norms - 2 * queries @ self.vectors[rows].T + self.sq_norms[rows]
+
+        matrix, scaled = self.vectors, queries
+        if self.quantized:
+            # x ~ x8 * scales, so q.x ~ (q * scales).x8
+            matrix, scaled = self.quantized_vectors, queries * self.scales
+        out = np.empty((len(queries), self.rows), dtype=np.float32)
+        for start in range(0, self.rows, self.block_rows):
+            block = np.asarray(matrix[start:start + self.block_rows], dtype=np.float32)
+            out[:, start:start + len(block)] = scaled @ block.T
+        out *= -2
+        out += q_norms
+        out += self.sq_norms
+        return out
+
+    def search_batch(self, queries, k=5):
+        """Return (row indices, distances), each of shape (queries, k), best first."""
+        dists = self.distances(queries)
+        k = min(k, self.rows)
+        candidates = min(self.rows, k * self.rerank) if self.quantized else k
+        if not k:
+            empty = np.zeros((len(dists), 0))
+            return empty.astype(np.int64), empty
+        top = np.argpartition(dists, candidates - 1, axis=1)[:, :candidates]
+        if self.quantized:
+            # Re-rank the candidates on the exact vectors (sorted rows read the memmap in order)
+            top = np.sort(top, axis=1)
+            dists = np.concatenate([self.distances(query, rows)
+                                    for query, rows in zip(np.atleast_2d(queries), top)])
+        else:
+            dists = np.take_along_axis(dists, top, axis=1)
+        order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(dists, order, axis=1)
+
+    def document(self, row):
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        metadata = json.loads(str(self.metadatas[row]))
+        metadata.setdefault("chunk_id", str(self.chunk_ids[row]))
+        return Document(page_content=bytes(self.texts[start:end]).decode("utf-8"), metadata=metadata)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, **kwargs):
+        rows, dists = self.search_batch(embedding, k)
+        return [(self.document(row), float(dist)) for row, dist in zip(rows[0], dists[0])]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory="vector_index", fingerprint="",
+                   **kwargs):
+        """Embed the texts, write them as an index in `directory` and open it.
+
+        Texts are embedded EXPORT_BATCH at a time; any other keyword
+        arguments are passed to the constructor.
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(idx) for idx in range(len(texts))]
+
+        def batches():
+            for start in range(0, len(texts), EXPORT_BATCH):
+                end = start + EXPORT_BATCH
+                yield ids[start:end], embedding.embed_documents(texts[start:end]), texts[start:end], metadatas[start:end]
+
+        write_index(batches(), directory, fingerprint)
+        return cls(directory, embedding_function=embedding, **kwargs)
@@ -4,6 +4,16 @@ import axios from 'axios';
 import { Send, Zap, Radio, Cpu, Trash2, Calculator, BarChart4, Download, History, Lightbulb } from 'lucide-react';
 import Header from '../components/Header';
 
+// Keep one chat session per browser so the backend can keep separate histories
+const getSessionId = () => {
+  let sessionId = localStorage.getItem('finverse_session_id');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    localStorage.setItem('finverse_session_id', sessionId);
+  }
+  return sessionId;
+};
+
 const Chatbot = () => {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
@@ -12,6 +22,7 @@ const Chatbot = () => {
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
   const [loadingHistory, setLoadingHistory] = useState(true);
+  const sessionId = useRef(getSessionId());
 
   // Sample suggestions for quick queries
   const suggestions = [
@@ -51,7 +62,7 @@ const Chatbot = () => {
     if (window.confirm("Are you sure you want to clear the chat history?")) {
       try {
         const apiUrl = import.meta.env.VITE_CHATBOT_API_URL || 'http://localhost:5000';
-        await axios.post(`${apiUrl}/clear_history`);
+        await axios.post(`${apiUrl}/clear_history`, { session_id: sessionId.current });
         
         // Reset UI to initial state
         const initialMessage = {
@@ -89,7 +100,7 @@ const Chatbot = () => {
     try {
       // Use the API URL from your .env file (Vite requires prefix VITE_)
       const apiUrl = import.meta.env.VITE_CHATBOT_API_URL || 'http://localhost:5000';
-      const response = await axios.post(`${apiUrl}/chat`, { message: message });
+      const response = await axios.post(`${apiUrl}/chat`, { message: message, session_id: sessionId.current });
       const botMessage = {
         id: messages.length + 2,
         text: response.data.message, // Assumed to be in Markdown format